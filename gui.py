@@ -1,189 +1,21 @@
 import os
-import math
 import threading
 import time
-from queue import Queue
-from collections import Counter
+from collections import deque
 import tkinter as tk
 from tkinter import filedialog, messagebox
 from tkinter.scrolledtext import ScrolledText
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from database_logger import DatabaseLogger
-
-# === Backend logic classes (same as file_monitor.py) ===
-
-class HeuristicScanner:
-    ''' A class for scanning files using simple heuristic checks'''
-    def __init__(self):
-        self.suspicious_strings = ["powershell", "cmd.exe", "eval", "exec"]
-        self.bad_ext = [".exe", ".bat", ".js"]
-
-
-    @staticmethod
-    def check_entropy(data):
-        '''
-        Calculates the Shannon entropy of file content.
-        '''
-        if not data:
-            return 0
-        counter = Counter(data)
-        total = len(data)
-        entropy = -sum((count / total) * math.log2(count / total) for count in counter.values())
-        return entropy
-
-    def check_strings(self, data):
-        #check file content for suspicious string and return list of found pre-set keywords
-        if isinstance(data, bytes):
-            try:
-                data = data.decode(errors='ignore')
-            except:
-                return []
-        return [s for s in self.suspicious_strings if s in data]
-
-    def risk_score(self, file_path):
-        ''' Calculate risk score based on extension, entropy, suspicius strings
-        Returns tuple: (score, list of reasons)
-        '''
-        score = 0
-        reasons = []
-        try:
-            safe_path = os.path.abspath(file_path)
-            #open file in read mode, binary
-            with open(safe_path, 'rb') as f:
-                data = f.read()
-
-            if os.path.splitext(safe_path)[1] in self.bad_ext:
-            #check extension 
-                score += 1
-                reasons.append("Bad file extension")
-
-            #check entropy
-            entropy = self.check_entropy(data)
-            if entropy > 7.5:
-                score += 2
-                reasons.append(f"High entropy: {entropy:.2f}")
-                
-            #check suspicious strings
-            found = self.check_strings(data)
-            if found:
-                score += 2
-                reasons.append("Suspicious strings: " + ", ".join(found))
-        except Exception as e:
-            reasons.append(f"Error scanning: {e}")
-        return score, reasons
-
-class ReportManager:
-    ''' Manages logging, quarantine and report export.'''
-    def __init__(self):
-        self.results = []
-        os.makedirs("quarantine", exist_ok=True)
-
-    def log_result(self, file_path, reasons):
-        '''log flagged file details and move it to quarantine '''
-        timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-        log = f"[{timestamp}] {file_path} flagged: {' | '.join(reasons)}"
-        self.results.append(log)
-
-        try:
-            filename = os.path.basename(file_path)
-            unique_name = time.strftime("%Y%m%d%H%M%S") + "_" + filename
-            quarantine_path = os.path.join("quarantine", unique_name)
-            os.rename(file_path, quarantine_path)
-        except Exception as e:
-            self.results.append(f"Failed to quarantine {file_path}: {e}")
-
-    #return the list of logged scan results
-    def get_results(self):
-        return self.results
-
-
-    def export_report_pdf(self, export_path):
-        try:
-            c = canvas.Canvas(export_path, pagesize=letter)
-            width, height = letter
-            c.setFont("Helvetica-Bold", 14)
-            c.drawString(30, height - 40, "=== Smart File Behavior Analyzer Report ===")
-            c.setFont("Helvetica", 10)
-            c.drawString(30, height - 60, f"Exported at: {time.strftime('%Y-%m-%d %H:%M:%S')}")
-
-            y = height - 80
-            c.setFont("Helvetica", 9)
-            line_height = 14
-
-            for entry in self.results:
-                if y < 50:
-                    c.showPage()
-                    c.setFont("Helvetica", 9)
-                    y = height - 50
-                c.drawString(30, y, entry)
-                y -= line_height
-
-            c.save()
-            return True, "PDF report exported successfully."
-        except Exception as e:
-            return False, f"Failed to export PDF report: {e}"
-
-#monitor folder, scan files, log results
-class FileMonitor:
-    def __init__(self, folder):
-        self.folder = folder
-        self.queue = Queue()
-        self.scanner = HeuristicScanner()
-        self.report = ReportManager()
-        self.db_logger = DatabaseLogger()
-        self.running = False
-
-    def watch_folder(self):
-        seen = set(os.path.abspath(os.path.join(self.folder, f))
-                   for f in os.listdir(self.folder)
-                   if os.path.isfile(os.path.join(self.folder, f)))
-        for path in seen:
-            self.queue.put(path)
-
-        while self.running:
-            for f in os.listdir(self.folder):
-                path = os.path.abspath(os.path.join(self.folder, f))
-                if path not in seen and os.path.isfile(path):
-                    seen.add(path)
-                    self.queue.put(path)
-            time.sleep(2)
-
-    def process_queue(self):
-        #scan files in queue, log results, update DB. 
-     while self.running:
-        if not self.queue.empty():
-            file_path = self.queue.get()
-            try:
-                with open(file_path, 'rb') as f:
-                    data = f.read()
-
-                score, reasons = self.scanner.risk_score(file_path)
-                entropy = self.scanner.check_entropy(data)
-                found = self.scanner.check_strings(data)
-
-                # Insert into database
-                self.db_logger.insert_log(file_path, score, entropy, found, reasons)
-
-                log_entry = f"Scanned: {file_path} | Score: {score} | Reasons: {', '.join(reasons)}"
-                self.report.results.append(log_entry)
-                print(log_entry)
-
-                if score >= 4:
-                    self.report.log_result(file_path, reasons)
-
-            except Exception as e:
-                print(f"Error processing {file_path}: {e}")
-
-    def start(self):
-        '''start watcher and processor threads'''
-        self.running = True
-        threading.Thread(target=self.watch_folder, daemon=True).start()
-        threading.Thread(target=self.process_queue, daemon=True).start()
+from safescan.metrics import STAGES
+from safescan.monitor import FileMonitor
 
 # === GUI ===
 
 class FileMonitorGUI:
+    POLL_MS = 500            # how often new log lines are pulled from the monitor
+    BATCH_LINES = 500        # most lines appended per poll, keeps each update short
+    MAX_LINES = 2000         # lines kept in the log panel while following new output
+    HISTORY_PAGE = 200       # rows loaded from the database per scroll to the top
+
     def __init__(self, root):
         self.root = root
         self.root.title("Smart File Behavior Analyzer")
@@ -192,6 +24,17 @@ class FileMonitorGUI:
 
         self.monitor = None
         self.folder_path = tk.StringVar()
+        self.stopping = None
+        self.last_seq = 0
+        # one key per line in the log panel: ("db", row id) for history
+        # pulled from the database, ("live", epoch time) for monitor output
+        self.line_keys = deque()
+        self.history_done = False
+        self.loading_older = None  # thread fetching a page of older logs
+        self.poll_job = None
+        self.session_start = None
+        self.exporting = None
+        self.last_rate_sample = None  # (time, files scanned) at the previous stats update
 
         self.setup_ui()
 
@@ -211,11 +54,17 @@ class FileMonitorGUI:
 
 
         tk.Label(self.root, text="Scan Logs:").pack()
-        self.log_text = ScrolledText(self.root, width=80, height=20, state='disabled')
+        self.log_text = ScrolledText(self.root, width=80, height=15, state='disabled')
+        self.log_text.configure(yscrollcommand=self.on_log_scroll)
         self.log_text.pack(padx=10, pady=5)
 
         self.status_label = tk.Label(self.root, text="Status: Idle", fg="blue")
         self.status_label.pack(pady=5)
+        # live pipeline stats, see FileMonitor.metrics_snapshot
+        self.stats_label = tk.Label(self.root, text="", font=("Courier", 9), justify=tk.LEFT, anchor="w")
+        self.stats_label.pack(fill=tk.X, padx=10)
+        self.export_label = tk.Label(self.root, text="", fg="gray")
+        self.export_label.pack()
 
     def browse_folder(self):
         folder = filedialog.askdirectory()
@@ -227,34 +76,143 @@ class FileMonitorGUI:
         if not folder or not os.path.isdir(folder):
             messagebox.showerror("Error", "Please select a valid folder.")
             return
+        if self.monitor and (self.monitor.running or self.stopping):
+            messagebox.showwarning("Warning", "Monitoring is already running.")
+            return
 
         self.monitor = FileMonitor(folder)
-        self.monitor.running = True
+        self.session_start = time.time()
         self.monitor.start()
 
-        self.status_label.config(text="Status: Monitoring... Scanned files: 0", fg="green")
-        threading.Thread(target=self.update_logs, daemon=True).start()
+        self.last_seq = 0
+        self.line_keys.clear()
+        self.history_done = False
+        self.log_text.config(state='normal')
+        self.log_text.delete(1.0, tk.END)
+        self.log_text.config(state='disabled')
 
-    def stop_monitoring(self):
-        if self.monitor:
-            self.monitor.running = False
-            self.status_label.config(text="Status: Stopped", fg="red")
+        self.last_rate_sample = None
+        self.status_label.config(text="Status: Monitoring...", fg="green")
+        self.update_stats()
+        self.schedule_poll()
 
-    def update_logs(self):
-        while self.monitor and self.monitor.running:
-            logs = self.monitor.report.get_results()
+    def stop_monitoring(self):
+        if self.monitor and self.monitor.running:
+            # stop() waits for queued files, keep the Tk loop responsive meanwhile
+            self.stopping = threading.Thread(target=self.monitor.stop, daemon=True)
+            self.stopping.start()
+            self.status_label.config(text="Status: Stopping...", fg="orange")
+
+    def schedule_poll(self):
+        if self.poll_job is None:
+            self.poll_job = self.root.after(self.POLL_MS, self.poll_logs)
+
+    def poll_logs(self):
+        '''append log lines logged since the last poll; runs on the Tk main loop'''
+        self.poll_job = None
+        if not self.monitor:
+            return
+        records = self.monitor.report.results_since(self.last_seq, self.BATCH_LINES)
+        if records:
+            following = self.log_text.yview()[1] >= 1.0
             self.log_text.config(state='normal')
-            self.log_text.delete(1.0, tk.END)
-            for line in logs:
-                self.log_text.insert(tk.END, line + "\n")
+            if records[0].seq > self.last_seq + 1:
+                skipped = records[0].seq - self.last_seq - 1
+                self.log_text.insert(tk.END, f"... {skipped} lines not shown, see exported logs ...\n")
+                self.line_keys.append(("live", records[0].created))
+            self.log_text.insert(tk.END, "".join(record.message + "\n" for record in records))
+            self.line_keys.extend(("live", record.created) for record in records)
+            if following:
+                self.trim_lines(len(self.line_keys) - self.MAX_LINES)
+                self.log_text.see(tk.END)
             self.log_text.config(state='disabled')
+            self.last_seq = records[-1].seq
 
-            self.status_label.config(text=f"Status: Monitoring... Scanned files: {len(logs)}", fg="green")
-            time.sleep(2)
-
-        if self.monitor and not self.monitor.running:
+        if self.stopping is not None and not self.stopping.is_alive():
+            self.stopping = None
+        self.update_stats()
+        if self.monitor.running or self.stopping or records:
+            self.schedule_poll()
+        else:
             self.status_label.config(text="Status: Stopped", fg="red")
 
+    def update_stats(self):
+        '''refresh the stats panel from the monitor's metrics'''
+        snapshot = self.monitor.metrics_snapshot()
+        counters, stages, gauges = snapshot["counters"], snapshot["stages"], snapshot["gauges"]
+        now = time.monotonic()
+        rate = 0.0
+        if self.last_rate_sample is not None:
+            then, scanned = self.last_rate_sample
+            rate = (counters["files_scanned"] - scanned) / max(now - then, 1e-6)
+        self.last_rate_sample = (now, counters["files_scanned"])
+        timings = "  ".join(f"{stage} {stages[stage]['avg_ms']:.1f}" for stage in STAGES if stages[stage]["count"])
+        self.stats_label.config(text=(
+            f"Scanned {counters['files_scanned']} ({rate:.1f}/s)  cached {counters['files_cached']}  "
+            f"flagged {counters['files_flagged']}  quarantined {counters['quarantined']}  errors {counters['errors']}\n"
+            f"Waiting: queue {gauges['queue_depth']}  database {gauges['db_pending']}  "
+            f"quarantine {gauges['quarantine_pending']}\n"
+            f"Avg ms: {timings or '-'}"))
+
+    def trim_lines(self, count):
+        # drop the oldest lines from the top of the panel
+        if count <= 0:
+            return
+        self.log_text.delete(1.0, f"{count + 1}.0")
+        for _ in range(count):
+            self.line_keys.popleft()
+
+    def on_log_scroll(self, first, last):
+        self.log_text.vbar.set(first, last)
+        if float(first) <= 0.0 and float(last) < 1.0:
+            self.root.after_idle(self.load_older)
+
+    def load_older(self):
+        '''fetch a page of older scan logs from the database on a worker thread'''
+        if not self.monitor or self.history_done or not self.line_keys or self.loading_older:
+            return
+        if len(self.line_keys) >= 2 * self.MAX_LINES:
+            return  # keep the panel bounded; older logs are in the CSV export
+        # fetch_logs flushes pending rows and waits on the database writer
+        db_logger, top = self.monitor.db_logger, self.line_keys[0]
+        kind, key = top
+        state = {"done": False, "rows": None}
+
+        def worker():
+            try:
+                if kind == "db":
+                    state["rows"] = db_logger.fetch_logs(before_id=key, limit=self.HISTORY_PAGE)
+                else:
+                    state["rows"] = db_logger.fetch_logs(before_time=key, limit=self.HISTORY_PAGE)
+            except Exception as e:
+                print(f"Error loading older logs: {e}")
+            state["done"] = True
+
+        self.loading_older = threading.Thread(target=worker, daemon=True)
+        self.loading_older.start()
+        self.check_older(top, state)
+
+    def check_older(self, top, state):
+        '''prepend the fetched page once the worker has it'''
+        if not state["done"]:
+            self.root.after(50, self.check_older, top, state)
+            return
+        self.loading_older = None
+        rows = state["rows"]
+        if rows is None or not self.line_keys or self.line_keys[0] != top:
+            return  # the panel changed meanwhile; the next scroll fetches again
+        if not rows:
+            self.history_done = True
+            return
+        lines = "".join(f"[{row[6]}] Scanned: {row[1]} | Score: {row[2]} | Reasons: {row[5]}\n"
+                        for row in reversed(rows))
+        self.log_text.config(state='normal')
+        self.log_text.insert(1.0, lines)
+        self.log_text.config(state='disabled')
+        self.line_keys.extendleft(("db", row[0]) for row in rows)
+        # keep the line that was at the top in view
+        self.log_text.yview(f"{len(rows) + 1}.0")
+
     def export_report(self):
         if not self.monitor:
             messagebox.showwarning("Warning", "Monitoring has not been started yet.")
@@ -266,11 +224,10 @@ class FileMonitorGUI:
             title="Save Report As PDF"
         )
         if export_path:
-            success, msg = self.monitor.report.export_report_pdf(export_path)
-            if success:
-                messagebox.showinfo("Success", msg)
-            else:
-                messagebox.showerror("Error", msg)
+            # report every scan of this monitoring session, streamed from the database
+            report, db_logger, start = self.monitor.report, self.monitor.db_logger, self.session_start
+            self.run_export("Exporting report", lambda progress: report.export_report_pdf(
+                export_path, db_logger, start=start, progress=progress))
                 
     def export_logs_csv(self):
      if not self.monitor or not self.monitor.db_logger:
@@ -284,7 +241,36 @@ class FileMonitorGUI:
     )
     
      if export_path:
-        success, msg = self.monitor.db_logger.export_to_csv(export_path)
+        db_logger = self.monitor.db_logger
+        self.run_export("Exporting logs", lambda progress: db_logger.export_to_csv(export_path, progress=progress))
+
+    def run_export(self, description, export):
+        '''run an export on a worker thread and show its progress without blocking Tk'''
+        if self.exporting:
+            messagebox.showwarning("Warning", "An export is already running.")
+            return
+        state = {"done": 0, "total": 0, "result": None}
+
+        def progress(done, total):
+            state["done"], state["total"] = done, total
+
+        def worker():
+            state["result"] = export(progress)
+
+        self.exporting = threading.Thread(target=worker, daemon=True)
+        self.exporting.start()
+        self.check_export(description, state)
+
+    def check_export(self, description, state):
+        if state["result"] is None:
+            total = state["total"]
+            percent = f" {100 * state['done'] // total}%" if total else ""
+            self.export_label.config(text=f"{description}...{percent}")
+            self.root.after(200, self.check_export, description, state)
+            return
+        self.exporting = None
+        self.export_label.config(text="")
+        success, msg = state["result"]
         if success:
             messagebox.showinfo("Success", msg)
         else:
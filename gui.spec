@@ -6,7 +6,8 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[],
-    hiddenimports=[],
+    # the scanning engine loads its PDF writer lazily
+    hiddenimports=['safescan.pdf_report'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -0,0 +1,38 @@
+"""
+SafeScan scanning engine, shared by the headless monitor (file_monitor.py)
+and the Tk GUI (gui.py).
+
+Submodules are imported on first use, so importing the package is cheap
+and a headless scan never loads the GUI or PDF export code.
+"""
+import importlib
+
+_EXPORTS = {
+    "HeuristicScanner": "scanner",
+    "ScanResult": "scanner",
+    "ReportManager": "report",
+    "ResultStore": "report",
+    "LogRecord": "report",
+    "Quarantine": "quarantine",
+    "FileMonitor": "monitor",
+    "AsyncFileMonitor": "aio",
+    "Metrics": "metrics",
+    "DatabaseLogger": "database",
+    "ScanCache": "cache",
+    "SeenIndex": "seen",
+    "Retention": "retention",
+    "RuleSet": "rules",
+    "PatternMatcher": "matcher",
+    "ByteHistogram": "entropy",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module 'safescan' has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,283 @@
+"""
+asyncio front end to the scan pipeline, for embedding SafeScan in an
+async service:
+
+    async with AsyncFileMonitor("uploads") as monitor:
+        result = await monitor.scan_file("uploads/new.bin")
+        async for result in monitor.results():
+            ...
+
+Scans run on an executor, at most max_concurrent at a time, and the
+blocking parts around them (watcher reads, stat calls, SQLite lookups
+and result logging) run on executor threads too, so the event loop only
+schedules work and no thread is held per file.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .cache import ScanCache
+from .database import DatabaseLogger
+from .metrics import Metrics
+from .monitor import forget_removed, record_result
+from .report import ReportManager
+from .scanner import HeuristicScanner, init_worker, scan_in_worker
+from .scheduling import Debouncer
+from .seen import SeenIndex
+from .watcher import create_watcher
+
+POLL_INTERVAL = 0.5  # longest a watcher read blocks, so stop() is prompt
+
+
+class AsyncFileMonitor:
+    """
+    Scans files for coroutines, and optionally watches a folder.
+
+    Results are logged, cached and quarantined exactly as by FileMonitor,
+    on one writer thread, and nothing is printed: scan_file returns its
+    ScanResult, and results() yields those of the watched folder.
+
+    Args:
+        folder (str): Folder watched between start() and stop(); None
+            only scans the files passed to scan_file.
+        workers (int): Size of the scan executor; defaults to the number
+            of CPUs.
+        pool (str): "thread" (the default) or "process" for CPU-bound
+            scanning.
+        max_concurrent (int): Scans submitted to the executor at once,
+            from scan_file callers and the watcher together; the rest wait
+            on a semaphore.
+        max_backlog (int): Watched files queued for a scan slot before the
+            watcher waits, so a burst of uploads cannot pile up tasks.
+        max_results (int): Results buffered for results() before the
+            watcher waits for the consumer.
+        recursive, cache, resume, rules, settle, retention: As for
+            FileMonitor.
+    """
+
+    def __init__(self, folder=None, workers=None, pool="thread", max_concurrent=64, max_backlog=1024,
+                 max_results=1000, recursive=False, cache=True, resume=True, rules=None, settle=2.0,
+                 retention=None):
+        if pool not in ("process", "thread"):
+            raise ValueError(f"Unknown pool type: {pool}")
+        self.folder = folder
+        self.recursive = recursive
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = pool
+        self.metrics = Metrics()
+        self.scanner = HeuristicScanner(rules_path=rules)
+        self.report = ReportManager(metrics=self.metrics)
+        self.db_logger = DatabaseLogger(metrics=self.metrics, retention=retention)
+        self.cache = ScanCache(self.db_logger.db_name) if cache else None
+        self.seen = SeenIndex(self.db_logger.db_name) if resume and folder is not None else None
+        self.debouncer = Debouncer(quiet=settle, metrics=self.metrics) if settle else None
+        self._removed = deque()  # see forget_removed
+        self.running = False
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._backlog = asyncio.Semaphore(max_backlog)
+        self._results = asyncio.Queue(max_results)
+        self._consumers = 0
+        self._executor = None
+        self._writer = None
+        self._drain = True
+        self._watch_task = None
+        self._tasks = set()
+        self.metrics.gauge("scans_pending", lambda: len(self._tasks))
+        self.metrics.gauge("results_pending", lambda: self._results.qsize())
+        self.metrics.gauge("settling", lambda: len(self.debouncer) if self.debouncer is not None else 0)
+        self.metrics.gauge("db_pending", lambda: self.db_logger.pending)
+        self.metrics.gauge("quarantine_pending", lambda: self.report.quarantine.pending)
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    def metrics_snapshot(self):
+        """
+        Returns:
+            dict: Counters, per-stage timings and gauges, see Metrics.snapshot.
+        """
+        return self.metrics.snapshot()
+
+    def _scan_executor(self):
+        if self._executor is None:
+            if self.pool == "thread":
+                self._executor = ThreadPoolExecutor(self.workers)
+            else:
+                self._executor = ProcessPoolExecutor(self.workers, initializer=init_worker,
+                                                     initargs=(self.scanner, self.cache))
+        return self._executor
+
+    def _result_writer(self):
+        # one thread, as the cache, seen index and report expect a single writer
+        if self._writer is None:
+            self._writer = ThreadPoolExecutor(1)
+        return self._writer
+
+    def _scan(self, file_path):
+        return self.scanner.scan(file_path, self.cache)
+
+    async def scan_file(self, file_path):
+        """
+        Scans file_path on the executor once a slot is free, then logs,
+        caches and quarantines the result like that of a watched file.
+
+        Returns:
+            ScanResult: The result; a file that could not be read has its
+            error set.
+        """
+        loop = asyncio.get_running_loop()
+        scan = self._scan if self.pool == "thread" else scan_in_worker
+        waiting = time.perf_counter()
+        async with self._slots:
+            self.metrics.observe("queue_wait", time.perf_counter() - waiting)
+            result = await loop.run_in_executor(self._scan_executor(), scan, file_path)
+        await loop.run_in_executor(self._result_writer(), record_result, self, file_path, result)
+        return result
+
+    async def results(self):
+        """
+        Yields the ScanResult of each watched file as its scan completes,
+        until stop(). Results are only kept while some coroutine is
+        iterating, and a consumer that falls max_results behind holds the
+        watcher back.
+        """
+        if self._watch_task is None:
+            return  # not watching
+        self._consumers += 1
+        try:
+            while True:
+                result = await self._results.get()
+                if result is None:
+                    self._results.put_nowait(None)  # for any other consumer
+                    return
+                yield result
+        finally:
+            self._consumers -= 1
+
+    async def start(self):
+        """
+        Starts watching the folder, if there is one; returns once the
+        watcher is set up.
+        """
+        if self.folder is None or self._watch_task is not None:
+            return
+        self.running = True
+        while not self._results.empty():
+            self._results.get_nowait()  # the end marker of an earlier stop()
+        watcher = await asyncio.to_thread(create_watcher, self.folder, self.recursive)
+        self._watch_task = asyncio.create_task(self._watch(watcher))
+
+    def _existing_files(self, watcher):
+        existing = watcher.existing_files()
+        if self.seen is not None:
+            existing = self.seen.reconcile(self.folder, existing, self.recursive)
+        return self._settle(existing, closed=False)
+
+    def _settle(self, paths, closed):
+        # Runs on a worker thread; returns the files ready to scan
+        if self.debouncer is None:
+            return self._unseen([(path, None) for path in paths])
+        for path in paths:
+            self.debouncer.add(path, closed)
+        return self._unseen(self.debouncer.ready())
+
+    def _unseen(self, files):
+        if self.seen is None:
+            return [path for path, _ in files]
+        return [path for path, st in files if self.seen.check(path, st)]
+
+    def _poll(self, watcher):
+        # One round of the watch loop, off the event loop
+        timeout = POLL_INTERVAL
+        if self.debouncer is not None:
+            due = self.debouncer.next_due()
+            if due is not None:
+                timeout = min(timeout, due)
+        ready = self._settle(watcher.read_events(timeout=timeout), watcher.reports_closed)
+        ready += self._settle(watcher.pop_listed(), closed=False)
+        forget_removed(self, watcher.pop_removed())
+        return ready
+
+    async def _watch(self, watcher):
+        try:
+            ready = await asyncio.to_thread(self._existing_files, watcher)
+            while True:
+                for path in ready:
+                    await self._backlog.acquire()
+                    self.metrics.incr("files_queued")
+                    task = asyncio.create_task(self._scan_watched(path))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+                if not self.running:
+                    break
+                ready = await asyncio.to_thread(self._poll, watcher)
+                if not self.running and self.debouncer is not None:
+                    # files still settling are scanned as they are, when draining
+                    settling = self.debouncer.flush()
+                    if self._drain:
+                        ready += await asyncio.to_thread(self._unseen, settling)
+        finally:
+            watcher.close()
+
+    async def _scan_watched(self, file_path):
+        try:
+            result = await self.scan_file(file_path)
+            if self._consumers:
+                await self._results.put(result)
+        except Exception:
+            self.metrics.incr("errors")
+        finally:
+            self._backlog.release()
+
+    async def stop(self, drain=True, timeout=10.0):
+        """
+        Stops watching, waits for the scans in progress and flushes the
+        database, cache and quarantine; results() ends afterwards.
+
+        Args:
+            drain (bool): Finish the watched files already found; if False
+                their scans are cancelled. scan_file callers still get
+                their results.
+            timeout (float): Seconds to wait for the scans.
+        Returns:
+            bool: True if every scan finished before the deadline.
+        """
+        deadline = time.monotonic() + timeout
+        self.running = False
+        self._drain = drain
+        pending = set()
+        if self._watch_task is not None:
+            # the watcher exits within POLL_INTERVAL
+            _, pending = await asyncio.wait([self._watch_task], timeout=max(0, deadline - time.monotonic()))
+            for task in pending:
+                task.cancel()
+        tasks = list(self._tasks)
+        if not drain:
+            for task in tasks:
+                task.cancel()
+        if tasks:
+            _, unfinished = await asyncio.wait(tasks, timeout=max(0, deadline - time.monotonic()))
+            pending |= unfinished
+        if self._consumers:
+            await self._results.put(None)
+        self._watch_task = None
+        await asyncio.to_thread(self._close, not drain, max(0, deadline - time.monotonic()))
+        return not pending
+
+    def _close(self, cancel, timeout):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=cancel)
+            self._executor = None
+        if self._writer is not None:
+            self._writer.shutdown(wait=True)
+            self._writer = None
+        self.db_logger.close(timeout)
+        self.report.close(timeout)
+        if self.seen is not None:
+            self.seen.flush()
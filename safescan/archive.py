@@ -0,0 +1,341 @@
+"""
+Scanning inside archives.
+
+zip, tar, gzip, bz2 and xz containers are recognised by their magic
+bytes and unpacked with the standard library, streaming each member
+through HeuristicScanner.scan_stream without writing anything to disk.
+Containers inside containers are unpacked in turn, up to a depth limit.
+"""
+import bz2
+import gzip
+import io
+import lzma
+import os
+import tarfile
+import threading
+import time
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+MAX_DEPTH = 4  # container layers unpacked, a .tar.gz counting as two
+MAX_MEMBERS = 10000  # members scanned per archive, at all depths
+MAX_RATIO = 100  # unpacked bytes allowed per byte of archive...
+MIN_EXPANSION = 64 * 1024 * 1024  # ...but always at least this many
+NESTED_ZIP_LIMIT = 64 * 1024 * 1024  # a zip inside an archive is read into memory up to this size
+PARALLEL_LIMIT = 4 * 1024 * 1024  # tar members up to this size are read and scanned on the pool
+HEAD_SIZE = 512  # enough to see a tar header
+READ_SIZE = 1024 * 1024
+MEMBER_SEPARATOR = "!"  # between the archive's path and a member's name in ScanResult.path
+
+# errors of a corrupt or unsupported container
+UNPACK_ERRORS = (OSError, EOFError, zipfile.BadZipFile, tarfile.TarError, lzma.LZMAError, zlib.error,
+                 NotImplementedError, RuntimeError)
+
+
+class ArchiveLimit(Exception):
+    """An archive exceeded one of the unpacking limits."""
+
+
+def detect(head):
+    """
+    Returns:
+        str: "zip", "tar", "gzip", "bz2" or "xz" for data starting with
+        head, or None.
+    """
+    if head[:4] in (b"PK\x03\x04", b"PK\x05\x06"):
+        return "zip"
+    if head[:2] == b"\x1f\x8b":
+        return "gzip"
+    if head[:3] == b"BZh" and head[3:4].isdigit() and head[3:4] != b"0":
+        return "bz2"
+    if head[:6] == b"\xfd7zXZ\x00":
+        return "xz"
+    if head[257:262] == b"ustar":
+        return "tar"
+    return None
+
+
+def _read_upto(f, size):
+    parts = []
+    while size > 0:
+        data = f.read(min(size, READ_SIZE))
+        if not data:
+            break
+        parts.append(data)
+        size -= len(data)
+    return b"".join(parts)
+
+
+class _Budget:
+    # Members and unpacked bytes of one archive, shared by its threads
+    def __init__(self, max_members, max_bytes):
+        self.max_members = max_members
+        self.max_bytes = max_bytes
+        self.members = 0
+        self.bytes = 0
+        self.exceeded = None
+        self._lock = threading.Lock()
+
+    def add_member(self):
+        with self._lock:
+            self.members += 1
+            if self.members > self.max_members:
+                self.exceeded = self.exceeded or f"more than {self.max_members} members"
+            if self.exceeded:
+                raise ArchiveLimit(self.exceeded)
+
+    def add_bytes(self, n):
+        with self._lock:
+            self.bytes += n
+            if self.bytes > self.max_bytes:
+                self.exceeded = self.exceeded or f"unpacks to more than {self.max_bytes} bytes"
+            if self.exceeded:
+                raise ArchiveLimit(self.exceeded)
+
+
+class _Unpacked(io.RawIOBase):
+    # Output of a decompressor, charged to the budget as it is read
+    def __init__(self, raw, budget):
+        self.raw = raw
+        self.budget = budget
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = READ_SIZE
+        data = self.raw.read(size)
+        self.budget.add_bytes(len(data))
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+class _Prefixed(io.RawIOBase):
+    # A stream whose first bytes were already read to look at them
+    def __init__(self, head, raw):
+        self.head = head
+        self.raw = raw
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        if self.head:
+            if size is None or size < 0 or size >= len(self.head):
+                data, self.head = self.head, b""
+            else:
+                data, self.head = self.head[:size], self.head[size:]
+            return data
+        return self.raw.read(size)
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+class _Unpacking:
+    # State of one top-level archive being unpacked
+    def __init__(self, scanner, path, budget, pool):
+        self.scanner = scanner
+        self.path = path
+        self.budget = budget
+        self.pool = pool
+        self.members = []
+        self.errors = []
+        self.unreadable = 0
+        self._lock = threading.Lock()
+
+    def add(self, result):
+        with self._lock:
+            self.members.append(result)
+
+    def error(self, name, e):
+        with self._lock:
+            self.errors.append(f"Cannot unpack {name}: {e}")
+
+    def skip(self, name, e):
+        # A member that is encrypted or corrupt, so was not scanned
+        with self._lock:
+            self.errors.append(f"Cannot unpack {name}: {e}")
+            self.unreadable += 1
+
+
+def scan_archive(scanner, result):
+    """
+    Scans the members of result.path if it is an archive: sets
+    result.container, result.members (one ScanResult per member, at any
+    depth, named <archive>!<member>), result.archive_limit and
+    result.unreadable, and rescores result.
+
+    A file that only looks like an archive, and fails to unpack, keeps
+    container None and is scored as the opaque blob it is, entropy rules
+    included.
+
+    Members of a zip are scanned in parallel on scanner.archive_workers
+    threads; those of a tar stream are read in order and, if small,
+    scanned on the same threads. Unpacking stops at the first limit
+    exceeded: scanner.archive_members members, or archive_ratio times
+    the archive's size (at least MIN_EXPANSION) of unpacked data.
+    Containers nested deeper than archive_depth are scanned as they are.
+    """
+    started = time.perf_counter()
+    try:
+        f = open(result.path, 'rb')
+    except OSError:
+        return  # gone since it was scanned
+    budget = _Budget(scanner.archive_members, max(scanner.archive_ratio * result.size, MIN_EXPANSION))
+    with f:
+        kind = detect(f.read(HEAD_SIZE))
+        if kind is None:
+            return
+        f.seek(0)
+        unpacked = True
+        workers = scanner.archive_workers
+        with ThreadPoolExecutor(workers) if workers > 1 else nullcontext() as pool:
+            unpacking = _Unpacking(scanner, result.path, budget, pool)
+            try:
+                _unpack(unpacking, f, kind, "", 1, pool is not None)
+            except ArchiveLimit as e:
+                result.archive_limit = str(e)
+            except UNPACK_ERRORS as e:
+                unpacking.error(os.path.basename(result.path), e)
+                unpacked = False
+    if unpacked:
+        result.container = kind
+    result.unreadable = unpacking.unreadable
+    result.members = sorted(unpacking.members, key=lambda m: m.member)
+    scanner.evaluate(result)
+    result.reasons.extend(unpacking.errors)
+    result.timings['archive'] = time.perf_counter() - started
+
+
+def _unpack(unpacking, f, kind, name, depth, parallel):
+    # Scans the members of container f (of the given kind) found at
+    # member name of the archive, depth containers deep; parallel is
+    # False on the pool's own threads
+    if kind == "zip":
+        _unpack_zip(unpacking, f, name, depth, parallel)
+    elif kind == "tar":
+        _unpack_tar(unpacking, f, name, depth, parallel)
+    else:
+        # a single compressed stream, named like the file without its suffix
+        opener = {"gzip": lambda raw: gzip.GzipFile(fileobj=raw, mode='rb'), "bz2": bz2.BZ2File,
+                  "xz": lzma.LZMAFile}[kind]
+        base = os.path.basename(name or unpacking.path)
+        inner = os.path.splitext(base)[0] + (".tar" if base.lower().endswith(".tgz") else "")
+        _member(unpacking, _Unpacked(opener(f), unpacking.budget), _join(name, inner),
+                None, depth, parallel)
+
+
+def _join(parent, child):
+    return f"{parent}/{child}" if parent else child
+
+
+def _unpack_zip(unpacking, f, name, depth, parallel):
+    budget = unpacking.budget
+    if not f.seekable():
+        data = _read_upto(f, NESTED_ZIP_LIMIT + 1)
+        if len(data) > NESTED_ZIP_LIMIT:
+            raise _Opaque(data, f)
+        f = io.BytesIO(data)
+    with zipfile.ZipFile(f) as zf:
+        infos = [info for info in zf.infolist() if not info.is_dir()]
+        futures = []
+        futures_used = parallel and len(infos) > 1
+        for info in infos:
+            budget.add_member()
+            member = _join(name, info.filename)
+            if info.flag_bits & 0x1:
+                unpacking.skip(member, "encrypted")
+                continue
+
+            def scan(info=info, member=member):
+                try:
+                    with zf.open(info) as raw:
+                        _member(unpacking, _Unpacked(raw, budget), member, info.file_size, depth,
+                                parallel=not futures_used)
+                except UNPACK_ERRORS as e:
+                    unpacking.skip(member, e)
+
+            if futures_used:
+                futures.append(unpacking.pool.submit(scan))
+            else:
+                scan()
+        _wait(futures)
+
+
+def _unpack_tar(unpacking, f, name, depth, parallel):
+    budget = unpacking.budget
+    futures = []
+    try:
+        with tarfile.open(fileobj=f, mode="r|") as tf:
+            for info in tf:
+                if not info.isfile():
+                    continue
+                budget.add_member()
+                member = _join(name, info.name)
+                raw = tf.extractfile(info)
+                if parallel and info.size <= PARALLEL_LIMIT:
+                    data = _read_upto(raw, info.size)
+                    futures.append(unpacking.pool.submit(_member, unpacking, io.BytesIO(data), member,
+                                                         info.size, depth, False))
+                else:
+                    _member(unpacking, raw, member, info.size, depth, parallel)
+    finally:
+        _wait(futures)
+
+
+def _wait(futures):
+    # Waits for every member scan and re-raises the first limit hit
+    limit = None
+    for future in futures:
+        try:
+            future.result()
+        except ArchiveLimit as e:
+            limit = limit or e
+    if limit is not None:
+        raise limit
+
+
+class _Opaque(Exception):
+    # A nested container that cannot be unpacked; carries what was read
+    # of it so it can be scanned as it is
+    def __init__(self, head, rest):
+        self.head = head
+        self.rest = rest
+
+
+def _member(unpacking, raw, name, size, depth, parallel):
+    # Unpacks member name if it is a container and the depth allows,
+    # scans it otherwise
+    head = _read_upto(raw, HEAD_SIZE)
+    kind = detect(head)
+    stream = _Prefixed(head, raw)
+    if kind is not None:
+        if depth >= unpacking.scanner.archive_depth:
+            unpacking.error(name, f"nested deeper than {unpacking.scanner.archive_depth} levels")
+        else:
+            try:
+                _unpack(unpacking, stream, kind, name, depth + 1, parallel)
+                return
+            except _Opaque as e:
+                unpacking.error(name, f"nested zip larger than {NESTED_ZIP_LIMIT} bytes")
+                stream = _Prefixed(e.head, e.rest)
+            except UNPACK_ERRORS as e:
+                unpacking.skip(name, e)
+                return
+    result = unpacking.scanner.scan_stream(stream, unpacking.path + MEMBER_SEPARATOR + name, size or 0)
+    if isinstance(result.error, ArchiveLimit):
+        raise result.error
+    if result.error is not None:
+        unpacking.skip(name, result.error)  # corrupt past its first bytes
+    result.member = name
+    unpacking.add(result)
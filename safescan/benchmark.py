@@ -0,0 +1,398 @@
+"""
+Benchmark suite for the scan pipeline: python -m safescan.benchmark
+
+Generates reproducible synthetic corpora (text, random, compressed,
+PE-like and a mix of many small and a few huge files), times each stage
+of the pipeline over them and writes the numbers as JSON, so runs on
+different commits or machines can be compared:
+
+    python -m safescan.benchmark --out before.json
+    python -m safescan.benchmark --out after.json --compare before.json
+
+Every (benchmark, corpus) case runs in a fresh process by default, so
+its peak RSS (including FileMonitor's pool workers) is its own and not
+a leftover of an earlier case.
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:  # not available on Windows, peak RSS is then reported as None
+    resource = None
+
+from . import entropy
+from .database import DatabaseLogger
+from .monitor import FileMonitor
+from .scanner import SCANNER_VERSION, HeuristicScanner
+from .scheduling import ScanQueue
+
+KiB = 1024
+MiB = 1024 * KiB
+
+# corpus name -> [(kind, file count, file size)]; counts are multiplied by --scale
+CORPORA = {
+    "text": [("text", 500, 32 * KiB)],
+    "random": [("random", 64, 256 * KiB)],
+    "compressed": [("compressed", 64, 256 * KiB)],
+    "pe": [("pe", 128, 128 * KiB)],
+    "mixed": [("text", 2000, 2 * KiB), ("pe", 200, 8 * KiB), ("random", 2, 64 * MiB)],
+}
+
+BENCHMARKS = ("check_entropy", "check_strings", "risk_score", "insert_log", "file_monitor")
+
+WORDS = ("the", "scan", "file", "report", "quarterly", "invoice", "meeting", "project", "data",
+         "network", "server", "update", "please", "review", "attached", "thanks", "system",
+         "account", "schedule", "budget", "eval", "config", "user", "folder", "backup")
+
+# byte frequencies loosely modelled on x86-64 code sections
+OPCODES = (0x00, 0x48, 0x89, 0x8B, 0xE8, 0xFF, 0x0F, 0x85, 0x84, 0x74, 0x75, 0xC3, 0x83, 0x4C, 0x24, 0x8D)
+CODE_BYTES = OPCODES + tuple(range(256))
+CODE_WEIGHTS = list(itertools.accumulate([0.7 / len(OPCODES)] * len(OPCODES) + [0.3 / 256] * 256))
+IMPORTS = (b"KERNEL32.dll", b"VirtualAlloc", b"CreateProcessA", b"GetProcAddress", b"LoadLibraryA",
+           b"WriteFile", b"ReadFile", b"CloseHandle", b"cmd.exe", b"powershell")
+
+
+def _text_bytes(rng, size):
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words).encode()[:size].ljust(size, b" ")
+
+
+def _compressed_bytes(rng, size):
+    out = bytearray()
+    while len(out) < size:
+        out += zlib.compress(_text_bytes(rng, 256 * KiB), 9)
+    return bytes(out[:size])
+
+
+def _pe_bytes(rng, size):
+    header = bytearray(1024)
+    header[:2] = b"MZ"
+    struct.pack_into("<I", header, 0x3C, 0x80)
+    header[0x80:0x84] = b"PE\0\0"
+    for i, name in enumerate((b".text", b".rdata", b".data")):
+        header[0x188 + 40 * i:0x188 + 40 * i + len(name)] = name
+    code_size = max(0, (size - len(header)) * 3 // 4)
+    code = bytes(rng.choices(CODE_BYTES, cum_weights=CODE_WEIGHTS, k=code_size))
+    rdata = bytearray()
+    while len(header) + len(code) + len(rdata) < size:
+        rdata += rng.choice(IMPORTS) + b"\0"
+    return (bytes(header) + code + bytes(rdata))[:size]
+
+
+GENERATORS = {
+    "text": _text_bytes,
+    "random": lambda rng, size: rng.randbytes(size),
+    "compressed": _compressed_bytes,
+    "pe": _pe_bytes,
+}
+
+
+def generate_corpus(directory, name, seed=0, scale=1.0):
+    """
+    Writes corpus name under directory/name, reusing it if an identical
+    one (same seed and scale) is already there.
+
+    Returns:
+        str: The corpus directory.
+    """
+    target = os.path.join(directory, name)
+    manifest = {"corpus": name, "seed": seed, "scale": scale, "spec": CORPORA[name]}
+    manifest_path = os.path.join(target, "manifest.json")
+    try:
+        with open(manifest_path) as f:
+            if json.load(f) == json.loads(json.dumps(manifest)):
+                return target
+    except (OSError, ValueError):
+        pass
+    shutil.rmtree(target, ignore_errors=True)
+    files = os.path.join(target, "files")
+    os.makedirs(files)
+    rng = random.Random(f"{seed}:{name}")
+    for kind, count, size in CORPORA[name]:
+        extension = ".exe" if kind == "pe" else ".bin" if kind in ("random", "compressed") else ".txt"
+        for i in range(max(1, round(count * scale))):
+            with open(os.path.join(files, f"{kind}_{size}_{i}{extension}"), "wb") as f:
+                f.write(GENERATORS[kind](rng, size))
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f)
+    return target
+
+
+def percentile(values, q):
+    """
+    Nearest-rank percentile of values (0 <= q <= 100).
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))  # ceil
+    return ordered[int(rank) - 1]
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    # the largest of this process and its pool workers
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (MiB if sys.platform == "darwin" else KiB), 1)
+
+
+def _corpus_files(corpus_dir):
+    files = os.path.join(corpus_dir, "files")
+    return sorted(os.path.join(files, name) for name in os.listdir(files))
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _bench_check_entropy(paths, workdir, options):
+    scanner = HeuristicScanner()
+    latencies = []
+    for path in paths:
+        data = _read(path)
+        started = time.perf_counter()
+        scanner.check_entropy(data)
+        latencies.append(time.perf_counter() - started)
+    return latencies, sum(latencies)
+
+
+def _bench_check_strings(paths, workdir, options):
+    scanner = HeuristicScanner()
+    scanner.check_strings(b"")  # compile the matcher outside the timing
+    latencies = []
+    for path in paths:
+        data = _read(path)
+        started = time.perf_counter()
+        scanner.check_strings(data)
+        latencies.append(time.perf_counter() - started)
+    return latencies, sum(latencies)
+
+
+def _bench_risk_score(paths, workdir, options):
+    scanner = HeuristicScanner()
+    latencies = []
+    for path in paths:
+        started = time.perf_counter()
+        scanner.risk_score(path)
+        latencies.append(time.perf_counter() - started)
+    return latencies, sum(latencies)
+
+
+def _bench_insert_log(paths, workdir, options):
+    # Latency is the cost to the caller (queueing); the total includes
+    # the flush, so files/s is the rate rows actually reach the disk.
+    db_logger = DatabaseLogger(os.path.join(workdir, "bench.db"))
+    latencies = []
+    started = time.perf_counter()
+    for path in paths:
+        call = time.perf_counter()
+        db_logger.insert_log(path, 2, 5.5, ["eval"], ["Suspicious strings: eval"])
+        latencies.append(time.perf_counter() - call)
+    db_logger.close()
+    return latencies, time.perf_counter() - started
+
+
+class _TimedQueue(ScanQueue):
+    # remembers when each path was queued, for per-file pipeline latency
+    def __init__(self, maxsize=0):
+        super().__init__(maxsize)
+        self.queued_at = {}
+
+    def put(self, item, block=True, timeout=None, size=None):
+        if isinstance(item, str):
+            self.queued_at[item] = time.perf_counter()
+        super().put(item, block, timeout, size)
+
+
+def _bench_file_monitor(paths, workdir, options):
+    # Runs FileMonitor over the corpus directory from start to the last
+    # result. Caching, resuming and the settle delay are off and nothing
+    # is quarantined, so the corpus is left as it was, every file is
+    # really scanned, and the pipeline is measured rather than the wait.
+    expected = len(paths)
+    done = threading.Event()
+    latencies = []
+
+    monitor = FileMonitor(os.path.dirname(paths[0]), workers=options["workers"], pool=options["pool"], cache=False,
+                          resume=False, settle=0)
+    monitor.queue = _TimedQueue(monitor.queue.maxsize)
+    monitor.scanner.quarantine_score = float("inf")
+    handle_result = monitor.handle_result
+
+    def timed_handle_result(file_path, result):
+        handle_result(file_path, result)
+        latencies.append(time.perf_counter() - monitor.queue.queued_at.pop(file_path))
+        if len(latencies) >= expected:
+            done.set()
+
+    monitor.handle_result = timed_handle_result
+    with open(os.devnull, "w") as devnull:
+        stdout, sys.stdout = sys.stdout, devnull  # the monitor prints a line per file
+        try:
+            started = time.perf_counter()
+            monitor.start()
+            finished = done.wait(options["timeout"])
+            elapsed = time.perf_counter() - started
+            monitor.stop()
+        finally:
+            sys.stdout = stdout
+    if not finished:
+        raise RuntimeError(f"FileMonitor scanned {len(latencies)} of {expected} files within {options['timeout']}s")
+    return latencies, elapsed
+
+
+def run_case(benchmark, corpus_dir, options):
+    """
+    Runs one benchmark over one generated corpus.
+
+    Returns:
+        dict: files, bytes, seconds, files_per_s, mb_per_s, latency_ms
+        (p50, p99, max) and peak_rss_mb of the process.
+    """
+    paths = _corpus_files(corpus_dir)
+    size = sum(os.path.getsize(path) for path in paths)
+    workdir = tempfile.mkdtemp(prefix="safescan-bench-")
+    cwd = os.getcwd()
+    os.chdir(workdir)  # FileMonitor keeps its database and quarantine in the working directory
+    try:
+        latencies, elapsed = globals()[f"_bench_{benchmark}"](paths, workdir, options)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    latencies_ms = [value * 1000 for value in latencies]
+    return {
+        "benchmark": benchmark,
+        "corpus": os.path.basename(corpus_dir),
+        "files": len(paths),
+        "bytes": size,
+        "seconds": round(elapsed, 4),
+        "files_per_s": round(len(paths) / elapsed, 1) if elapsed else None,
+        "mb_per_s": round(size / MiB / elapsed, 2) if elapsed else None,
+        "latency_ms": {
+            "p50": round(percentile(latencies_ms, 50), 4),
+            "p99": round(percentile(latencies_ms, 99), 4),
+            "max": round(max(latencies_ms), 4),
+        },
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def _call(isolated, function, *args):
+    if not isolated:
+        return function(*args)
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(function, *args).result()
+
+
+def compare(current, baseline, tolerance=0.1):
+    """
+    Compares files_per_s of the cases present in both runs.
+
+    Returns:
+        list: (benchmark, corpus, baseline, current, ratio) of every case
+        that got slower by more than tolerance.
+    """
+    before = {(r["benchmark"], r["corpus"]): r["files_per_s"] for r in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        old = before.get((result["benchmark"], result["corpus"]))
+        if old and result["files_per_s"] is not None:
+            ratio = result["files_per_s"] / old
+            if ratio < 1 - tolerance:
+                regressions.append((result["benchmark"], result["corpus"], old, result["files_per_s"], ratio))
+    return regressions
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m safescan.benchmark",
+                                     description="Benchmark the SafeScan pipeline on synthetic corpora.")
+    parser.add_argument("--out", default="benchmark.json", help="JSON results file (default: benchmark.json)")
+    parser.add_argument("--benchmark", action="append", choices=BENCHMARKS, help="run only these (repeatable)")
+    parser.add_argument("--corpus", action="append", choices=sorted(CORPORA), help="use only these (repeatable)")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply the file counts of every corpus")
+    parser.add_argument("--seed", type=int, default=0, help="corpus generator seed")
+    parser.add_argument("--corpus-dir", help="keep generated corpora here and reuse them on later runs")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="FileMonitor pool size")
+    parser.add_argument("--pool", choices=("process", "thread"), default="process", help="FileMonitor pool type")
+    parser.add_argument("--timeout", type=float, default=600.0, help="seconds allowed per FileMonitor run")
+    parser.add_argument("--in-process", action="store_true",
+                        help="run every case in this process (faster, but peak RSS is shared)")
+    parser.add_argument("--compare", metavar="BASELINE", help="exit with 1 if slower than this earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed slowdown for --compare (default 0.1)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    benchmarks = args.benchmark or list(BENCHMARKS)
+    corpora = args.corpus or list(CORPORA)
+    options = {"workers": args.workers, "pool": args.pool, "timeout": args.timeout}
+    corpus_root = args.corpus_dir or tempfile.mkdtemp(prefix="safescan-corpus-")
+    report = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "scanner_version": SCANNER_VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": entropy.np is not None,
+        "seed": args.seed,
+        "scale": args.scale,
+        "isolated": not args.in_process,
+        "options": options,
+        "results": [],
+    }
+    try:
+        for corpus in corpora:
+            print(f"Generating corpus {corpus}...", file=sys.stderr)
+            # generated in a child too: Linux carries the peak RSS of a
+            # parent over into the processes it starts
+            corpus_dir = _call(not args.in_process, generate_corpus, corpus_root, corpus, args.seed, args.scale)
+            for benchmark in benchmarks:
+                result = _call(not args.in_process, run_case, benchmark, corpus_dir, options)
+                report["results"].append(result)
+                print(f"{benchmark:>14} {corpus:<10} {result['files_per_s']:>10} files/s "
+                      f"{result['mb_per_s']:>9} MB/s  p50 {result['latency_ms']['p50']:.3f} ms  "
+                      f"p99 {result['latency_ms']['p99']:.3f} ms  peak RSS {result['peak_rss_mb']} MB",
+                      file=sys.stderr)
+    finally:
+        if not args.corpus_dir:
+            shutil.rmtree(corpus_root, ignore_errors=True)
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.out}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for benchmark, corpus, old, new, ratio in regressions:
+            print(f"Regression: {benchmark} on {corpus}: {old} -> {new} files/s ({ratio:.0%})", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
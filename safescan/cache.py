@@ -0,0 +1,214 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+PREHASH_LIMIT = 16 * 1024 * 1024  # files up to this size are read into memory and hashed before scanning
+
+
+def new_hasher():
+    return hashlib.blake2b(digest_size=20)
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    hasher = new_hasher()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class ScanCache:
+    """
+    Persistent cache of scan verdicts, kept in the scan_logs database.
+
+    Results are keyed by the BLAKE2 digest of the file content, so a
+    payload dropped again under another name is not rescanned. A second
+    table maps each path to its (inode, size, mtime) and digest, so a
+    file that has not changed since it was scanned is recognised from a
+    stat call alone, without reading it.
+
+    Every entry records the fingerprint of the scanner rules that
+    produced it; entries from other rule sets are never returned and
+    are purged once the new rules store a result. The cache holds at
+    most max_entries digests and max_files paths (by default as many),
+    and evicts the least recently used of each.
+
+    Lookups may run on any thread or worker process (each gets its own
+    read connection); store() is meant for the single result writer.
+    """
+
+    def __init__(self, db_name="scan_logs.db", max_entries=100000, prehash_limit=PREHASH_LIMIT, max_files=None):
+        self.db_name = db_name
+        self.max_entries = max_entries
+        self.max_files = max_entries if max_files is None else max_files
+        self.prehash_limit = prehash_limit
+        self._local = threading.local()
+        self._purged_rules = None
+        conn = self._conn()
+        with conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS scan_cache (
+                    digest TEXT PRIMARY KEY,
+                    rules TEXT,
+                    size INTEGER,
+                    entropy REAL,
+                    matches TEXT,
+                    last_used REAL,
+                    profile TEXT
+                )
+            """)
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(scan_cache)")]
+            if 'profile' not in columns:  # caches created before entropy profiles
+                conn.execute("ALTER TABLE scan_cache ADD COLUMN profile TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_scan_cache_last_used ON scan_cache (last_used)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS scan_cache_files (
+                    path TEXT PRIMARY KEY,
+                    inode INTEGER,
+                    size INTEGER,
+                    mtime_ns INTEGER,
+                    digest TEXT,
+                    last_used REAL
+                )
+            """)
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(scan_cache_files)")]
+            if 'last_used' not in columns:  # caches created before paths were pruned
+                conn.execute("ALTER TABLE scan_cache_files ADD COLUMN last_used REAL")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_scan_cache_files_last_used ON scan_cache_files (last_used)")
+        self._entries = conn.execute("SELECT COUNT(*) FROM scan_cache").fetchone()[0]
+        self._files = conn.execute("SELECT COUNT(*) FROM scan_cache_files").fetchone()[0]
+
+    def __getstate__(self):
+        # connections stay with the thread that opened them
+        state = self.__dict__.copy()
+        del state['_local']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_name, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def lookup_file(self, path, st, rules):
+        """
+        Returns the cached entry for path if the file still has the
+        inode, size and mtime it had when it was scanned.
+
+        Returns:
+            dict or None: digest, size, entropy, matches and profile.
+        """
+        row = self._conn().execute("""
+            SELECT c.digest, c.size, c.entropy, c.matches, c.profile
+            FROM scan_cache_files f JOIN scan_cache c ON c.digest = f.digest
+            WHERE f.path = ? AND f.inode = ? AND f.size = ? AND f.mtime_ns = ? AND c.rules = ?
+        """, (path, st.st_ino, st.st_size, st.st_mtime_ns, rules)).fetchone()
+        return self._entry(row)
+
+    def lookup_digest(self, digest, rules):
+        row = self._conn().execute("""
+            SELECT digest, size, entropy, matches, profile FROM scan_cache WHERE digest = ? AND rules = ?
+        """, (digest, rules)).fetchone()
+        return self._entry(row)
+
+    @staticmethod
+    def _entry(row):
+        if row is None:
+            return None
+        return {
+            'digest': row[0],
+            'size': row[1],
+            'entropy': row[2],
+            'matches': json.loads(row[3]),
+            'profile': json.loads(row[4]) if row[4] else None,
+        }
+
+    def store(self, result, rules):
+        """
+        Records a scan result, or refreshes its LRU position on a cache hit.
+        Results without a digest or inode (failed or partial scans) and
+        archives, or files that failed to unpack part way, whose members
+        are not kept, are ignored.
+        """
+        if (result.error is not None or result.digest is None or result.inode is None or result.container
+                or result.members):
+            return
+        conn = self._conn()
+        with conn:
+            if self._purged_rules != rules:
+                deleted = conn.execute("DELETE FROM scan_cache WHERE rules != ?", (rules,)).rowcount
+                self._entries -= deleted
+                self._purged_rules = rules
+            matches = json.dumps([[m.label, m.offset, m.count] for m in result.matches])
+            added = conn.execute("""
+                INSERT OR IGNORE INTO scan_cache (digest, rules, size, entropy, matches, last_used, profile)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (result.digest, rules, result.size, result.entropy, matches, time.time(),
+                  json.dumps(result.profile))).rowcount
+            if not added:
+                conn.execute("UPDATE scan_cache SET last_used = ? WHERE digest = ?", (time.time(), result.digest))
+            self._entries += added
+            conn.execute("""
+                INSERT OR REPLACE INTO scan_cache_files (path, inode, size, mtime_ns, digest, last_used)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (result.path, result.inode, result.size, result.mtime_ns, result.digest, time.time()))
+            self._files += 1  # an upper bound: the path may have been there already
+            if self._entries > self.max_entries:
+                self._evict(conn)
+            if self._files > self.max_files:
+                self._prune_files(conn)
+
+    def touch(self, result):
+        """
+        Refreshes the LRU position of a result answered from the cache by
+        its path, which store() is not called for.
+        """
+        if result.digest is None:
+            return
+        conn = self._conn()
+        now = time.time()
+        with conn:
+            conn.execute("UPDATE scan_cache SET last_used = ? WHERE digest = ?", (now, result.digest))
+            conn.execute("UPDATE scan_cache_files SET last_used = ? WHERE path = ?", (now, result.path))
+
+    def _evict(self, conn):
+        # drop a tenth of the cap at once so eviction does not run on every store
+        excess = self._entries - int(self.max_entries * 0.9)
+        conn.execute("""
+            DELETE FROM scan_cache WHERE digest IN
+            (SELECT digest FROM scan_cache ORDER BY last_used LIMIT ?)
+        """, (excess,))
+        conn.execute("DELETE FROM scan_cache_files WHERE digest NOT IN (SELECT digest FROM scan_cache)")
+        self._entries = conn.execute("SELECT COUNT(*) FROM scan_cache").fetchone()[0]
+        self._files = conn.execute("SELECT COUNT(*) FROM scan_cache_files").fetchone()[0]
+
+    def _prune_files(self, conn):
+        # paths of deleted or long unchanged files would otherwise pile up
+        # for as long as their digest stays cached
+        self._files = conn.execute("SELECT COUNT(*) FROM scan_cache_files").fetchone()[0]
+        if self._files <= self.max_files:
+            return
+        excess = self._files - int(self.max_files * 0.9)
+        conn.execute("""
+            DELETE FROM scan_cache_files WHERE path IN
+            (SELECT path FROM scan_cache_files ORDER BY last_used LIMIT ?)
+        """, (excess,))
+        self._files -= excess
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,261 @@
+"""
+Headless batch scanner: python -m safescan [options] PATH...
+
+Walks the given trees, scans every matching file on a pool of workers,
+logs results to the scan database and prints one JSON object per file
+on stdout. Exits with 1 if any file was flagged, 0 otherwise.
+"""
+import argparse
+import fnmatch
+import json
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from .cache import ScanCache
+from .database import DatabaseLogger
+from .retention import Retention
+from .rules import RuleError
+from .scanner import HeuristicScanner, init_worker, scan_in_worker
+
+
+def _matches(rel_path, patterns):
+    name = rel_path.rsplit("/", 1)[-1]
+    return any(fnmatch.fnmatch(rel_path, p) or fnmatch.fnmatch(name, p) for p in patterns)
+
+
+def _list_dir(root, directory):
+    # one directory level: ([(path, rel_path, size)], [subdirectories])
+    files = []
+    subdirs = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    rel_path = os.path.relpath(entry.path, root).replace(os.sep, "/")
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append((entry.path, rel_path))
+                    elif entry.is_file(follow_symlinks=False):
+                        files.append((os.path.abspath(entry.path), rel_path,
+                                      entry.stat(follow_symlinks=False).st_size))
+                except OSError:
+                    continue
+    except OSError as e:
+        print(f"Cannot list {directory}: {e}", file=sys.stderr)
+    return files, subdirs
+
+
+def walk_tree(roots, include=(), exclude=(), min_size=None, max_size=None, walkers=4):
+    """
+    Yields the absolute paths of regular files under roots, listing
+    directories in parallel on walkers threads (directory listing is
+    I/O bound, so this pays off most on network shares).
+
+    Args:
+        roots (list): Directories or individual files.
+        include (list): Globs a file must match (basename or path
+            relative to its root); empty means everything.
+        exclude (list): Globs for files or directories to skip; an
+            excluded directory is not descended into.
+        min_size, max_size (int): Size limits in bytes.
+    """
+    def wanted(rel_path, size):
+        if include and not _matches(rel_path, include):
+            return False
+        if exclude and _matches(rel_path, exclude):
+            return False
+        if min_size is not None and size < min_size:
+            return False
+        return max_size is None or size <= max_size
+
+    with ThreadPoolExecutor(walkers) as pool:
+        pending = set()
+        roots_of = {}  # listing future -> the root its paths are relative to
+        for root in roots:
+            if os.path.isdir(root):
+                future = pool.submit(_list_dir, root, root)
+                roots_of[future] = root
+                pending.add(future)
+            elif os.path.isfile(root) and wanted(os.path.basename(root), os.path.getsize(root)):
+                yield os.path.abspath(root)
+            else:
+                print(f"Skipping {root}: not a file or directory", file=sys.stderr)
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                root = roots_of.pop(future)
+                files, subdirs = future.result()
+                for directory, rel_path in subdirs:
+                    if exclude and _matches(rel_path, exclude):
+                        continue
+                    sub = pool.submit(_list_dir, root, directory)
+                    roots_of[sub] = root
+                    pending.add(sub)
+                for path, rel_path, size in files:
+                    if wanted(rel_path, size):
+                        yield path
+
+
+class Checkpoint:
+    """
+    Set of finished paths in a small SQLite file, so an interrupted sweep
+    can resume without keeping millions of paths in memory. Marks are
+    committed every commit_every paths and on close().
+    """
+
+    def __init__(self, path, commit_every=500):
+        self.path = path
+        self.commit_every = commit_every
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS done (path TEXT PRIMARY KEY)")
+        self._uncommitted = 0
+
+    def __contains__(self, path):
+        return self.conn.execute("SELECT 1 FROM done WHERE path = ?", (path,)).fetchone() is not None
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM done").fetchone()[0]
+
+    def mark(self, path):
+        self.conn.execute("INSERT OR IGNORE INTO done (path) VALUES (?)", (path,))
+        self._uncommitted += 1
+        if self._uncommitted >= self.commit_every:
+            self.conn.commit()
+            self._uncommitted = 0
+
+    def close(self, remove=False):
+        self.conn.commit()
+        self.conn.close()
+        if remove:
+            os.remove(self.path)
+
+
+def result_record(result):
+    return {
+        "path": result.path,
+        "size": result.size,
+        "score": result.score,
+        "entropy": round(result.entropy, 4),
+        "found": result.found,
+        "reasons": result.reasons,
+        "digest": result.digest,
+        "profile": result.profile,
+        "hot_regions": [{"offset": offset, "length": length, "entropy": round(entropy, 4)}
+                        for offset, length, entropy in result.hot_regions],
+        "cached": result.cached,
+        "partial": result.partial,
+        "container": result.container,
+        "archive_limit": result.archive_limit,
+        "unreadable": result.unreadable,
+        "members": [result_record(member) for member in result.members],
+        "error": str(result.error) if result.error is not None else None,
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="safescan", description="Scan directory trees for suspicious files.")
+    parser.add_argument("paths", nargs="+", help="directories or files to scan")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="parallel scan workers")
+    parser.add_argument("--pool", choices=("process", "thread"), default="process",
+                        help="worker type; threads suit slow network storage")
+    parser.add_argument("--walkers", type=int, default=4, help="threads listing directories")
+    parser.add_argument("--include", action="append", default=[], metavar="GLOB", help="only scan matching files")
+    parser.add_argument("--exclude", action="append", default=[], metavar="GLOB",
+                        help="skip matching files and directories")
+    parser.add_argument("--min-size", type=int, help="skip files smaller than this many bytes")
+    parser.add_argument("--max-size", type=int, help="skip files larger than this many bytes")
+    parser.add_argument("--rules", metavar="FILE", help="score with this rule file (JSON, TOML or YAML)")
+    parser.add_argument("--db", default="scan_logs.db", help="scan database (default: scan_logs.db)")
+    parser.add_argument("--no-db", action="store_true", help="do not log to the database")
+    parser.add_argument("--no-cache", action="store_true", help="rescan files even if unchanged")
+    parser.add_argument("--keep-days", type=float, help="remove scan logs older than this from the database")
+    parser.add_argument("--keep-rows", type=int, help="keep at most this many scan logs in the database")
+    parser.add_argument("--archive-dir", metavar="DIR",
+                        help="move removed scan logs to monthly .jsonl.gz files here instead of deleting them")
+    parser.add_argument("--checkpoint", metavar="FILE",
+                        help="record finished files here and skip them when resuming; removed when the sweep completes")
+    return parser
+
+
+def main(argv=None, out=None):
+    args = build_parser().parse_args(argv)
+    out = out or sys.stdout
+    try:
+        scanner = HeuristicScanner(rules_path=args.rules)
+    except RuleError as e:
+        print(e, file=sys.stderr)
+        return 2
+    retention = None
+    if args.keep_days is not None or args.keep_rows is not None:
+        retention = Retention(args.keep_days * 86400 if args.keep_days is not None else None, args.keep_rows,
+                              args.archive_dir)
+    db_logger = None if args.no_db else DatabaseLogger(args.db, retention=retention)
+    cache = None if args.no_db or args.no_cache else ScanCache(args.db)
+    checkpoint = Checkpoint(args.checkpoint) if args.checkpoint else None
+    rules = scanner.rules_fingerprint()
+
+    if args.pool == "thread":
+        executor = ThreadPoolExecutor(args.workers)
+        scan = lambda path: scanner.scan(path, cache)
+    else:
+        executor = ProcessPoolExecutor(args.workers, initializer=init_worker, initargs=(scanner, cache))
+        scan = scan_in_worker
+    max_in_flight = args.workers * 4
+
+    stats = {"scanned": 0, "flagged": 0, "errors": 0, "skipped": 0}
+    started = time.monotonic()
+
+    def finish(future, path):
+        result = future.result()
+        out.write(json.dumps(result_record(result)) + "\n")
+        stats["scanned"] += 1
+        if result.error is not None:
+            stats["errors"] += 1
+        elif result.score >= scanner.quarantine_score:
+            stats["flagged"] += 1
+        if cache is not None:
+            cache.store(result, rules)
+        if db_logger is not None and result.cached != "file":
+            db_logger.insert_result(result)
+        if checkpoint is not None:
+            checkpoint.mark(path)
+
+    in_flight = {}
+    completed = False
+    try:
+        for path in walk_tree(args.paths, args.include, args.exclude, args.min_size, args.max_size, args.walkers):
+            if checkpoint is not None and path in checkpoint:
+                stats["skipped"] += 1
+                continue
+            if len(in_flight) >= max_in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    finish(future, in_flight.pop(future))
+            in_flight[executor.submit(scan, path)] = path
+        for future in list(in_flight):
+            future.result()
+            finish(future, in_flight.pop(future))
+        completed = True
+    except KeyboardInterrupt:
+        print("Interrupted; rerun with the same --checkpoint to resume.", file=sys.stderr)
+    finally:
+        executor.shutdown(wait=completed, cancel_futures=not completed)
+        if db_logger is not None:
+            if completed:
+                db_logger.apply_retention()
+            db_logger.close()
+        if cache is not None:
+            cache.close()
+        if checkpoint is not None:
+            checkpoint.close(remove=completed)
+        out.flush()
+
+    elapsed = time.monotonic() - started
+    print(f"Scanned {stats['scanned']} files in {elapsed:.1f}s: {stats['flagged']} flagged, "
+          f"{stats['errors']} errors, {stats['skipped']} skipped from checkpoint", file=sys.stderr)
+    if not completed:
+        return 130
+    return 1 if stats["flagged"] else 0
@@ -0,0 +1,646 @@
+import sqlite3
+import os
+import time
+import csv
+import atexit
+import threading
+from queue import Queue, Empty
+
+# Queue marker that stops the writer thread
+_CLOSE = object()
+
+LOG_COLUMNS = ("id", "filename", "score", "entropy", "suspicious_strings", "reasons", "timestamp",
+               "entropy_blocks", "entropy_max", "entropy_mean", "entropy_variance", "high_entropy_blocks",
+               "parent_id", "member", "path", "digest", "size", "extension", "scanned_at")
+
+# Entropy profile columns added after the original table, with their types
+PROFILE_COLUMNS = (("entropy_blocks", "INTEGER"), ("entropy_max", "REAL"), ("entropy_mean", "REAL"),
+                   ("entropy_variance", "REAL"), ("high_entropy_blocks", "INTEGER"))
+
+# Archive member columns: the id of the archive's row and the member's name inside it
+ARCHIVE_COLUMNS = (("parent_id", "INTEGER"), ("member", "TEXT"))
+
+# Columns of schema version 1: the full path, content hash and size, the
+# lowercased extension, and the scan time as epoch seconds
+FILE_COLUMNS = (("path", "TEXT"), ("digest", "TEXT"), ("size", "INTEGER"), ("extension", "TEXT"),
+                ("scanned_at", "REAL"))
+
+SCHEMA_VERSION = 1  # kept in PRAGMA user_version
+
+MATCH_COLUMNS = ("log_id", "label", "offset", "count")
+
+# Rollup tables by period, with the length of their buckets in seconds
+ROLLUPS = {"hour": ("scan_rollup_hourly", 3600), "day": ("scan_rollup_daily", 86400)}
+ROLLUP_KEYS = ("bucket", "extension", "score")
+
+INSERT_LOG = f"""
+    INSERT INTO scan_logs ({', '.join(LOG_COLUMNS[1:])})
+    VALUES ({', '.join('?' * (len(LOG_COLUMNS) - 1))})
+"""
+_PARENT = LOG_COLUMNS.index("parent_id") - 1  # in a row without its id
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def _extension(name):
+    return os.path.splitext(name or "")[1].lower()
+
+
+def to_epoch(value):
+    # accepts epoch seconds or a local "%Y-%m-%d %H:%M:%S" string
+    if isinstance(value, (int, float)):
+        return value
+    return time.mktime(time.strptime(value, TIME_FORMAT))
+
+
+class _Entry:
+    # One queued scan log: the row without its id, its (label, offset,
+    # count) matches, and for an archive the entries of its members,
+    # which are written after it so they can point at its id
+    __slots__ = ("row", "matches", "members")
+
+    def __init__(self, row, matches, members=()):
+        self.row = row
+        self.matches = matches
+        self.members = members
+
+    def __len__(self):
+        return 1 + len(self.members)
+
+
+class DatabaseLogger:
+    """
+    Handles logging of scan results to a local SQLite database.
+
+    Inserts are queued and written by one long-lived writer thread that
+    owns a single connection and commits them in batches of up to
+    batch_size rows, or every flush_interval seconds, whichever comes
+    first. The database runs in WAL mode with synchronous=NORMAL, so a
+    batch costs one fsync instead of one per file.
+
+    Besides the scan_logs rows, each batch writes the matched patterns to
+    scan_matches and adds its top-level files (not archive members) to
+    the hourly and daily rollup tables, per extension and score, so
+    dashboards read a few rows per bucket instead of the whole log.
+    Buckets start at whole UTC hours and days, in epoch seconds.
+
+    With metrics (a Metrics instance), each batch is timed as the
+    db_write stage and counted in db_rows or db_errors.
+
+    With retention (a safescan.retention.Retention), old rows are archived
+    and deleted in the background while the writer runs, see
+    apply_retention.
+    """
+
+    def __init__(self, db_name="scan_logs.db", batch_size=500, flush_interval=1.0, metrics=None, retention=None):
+        self.db_name = db_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.metrics = metrics
+        self.retention = retention
+        self._pending = Queue()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        self._create_table()
+
+    def _create_table(self):
+        """
+        Creates the logs table if it doesn't already exist.
+        """
+        conn = sqlite3.connect(self.db_name)
+        cursor = conn.cursor()
+        # only takes effect on a new database, before its first table
+        cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS scan_logs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                filename TEXT,
+                score INTEGER,
+                entropy REAL,
+                suspicious_strings TEXT,
+                reasons TEXT,
+                timestamp TEXT
+            )
+        """)
+        existing = [row[1] for row in cursor.execute("PRAGMA table_info(scan_logs)")]
+        for name, kind in PROFILE_COLUMNS + ARCHIVE_COLUMNS + FILE_COLUMNS:
+            if name not in existing:
+                cursor.execute(f"ALTER TABLE scan_logs ADD COLUMN {name} {kind}")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS scan_matches (
+                log_id INTEGER NOT NULL,
+                label TEXT NOT NULL,
+                offset INTEGER,
+                count INTEGER
+            )
+        """)
+        for table, _ in ROLLUPS.values():
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    bucket INTEGER NOT NULL,
+                    extension TEXT NOT NULL,
+                    score INTEGER NOT NULL,
+                    files INTEGER NOT NULL,
+                    bytes INTEGER NOT NULL,
+                    PRIMARY KEY (bucket, extension, score)
+                )
+            """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_scan_logs_filename ON scan_logs (filename)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_scan_logs_timestamp ON scan_logs (timestamp)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_scan_logs_score ON scan_logs (score)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_scan_logs_parent_id ON scan_logs (parent_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_scan_logs_scanned_at ON scan_logs (scanned_at)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_scan_logs_path ON scan_logs (path)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_scan_logs_digest ON scan_logs (digest)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_scan_matches_log_id ON scan_matches (log_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_scan_matches_label ON scan_matches (label)")
+        conn.commit()
+        if cursor.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            self._migrate(conn)
+        cursor.execute("PRAGMA journal_mode=WAL")
+        conn.commit()
+        conn.close()
+
+    @staticmethod
+    def _migrate(conn):
+        """
+        Brings rows logged before schema version 1 up to date: fills in
+        scanned_at from the timestamp text, the extension, scan_matches
+        from suspicious_strings, and the rollups. Their path, digest and
+        size were never recorded and stay NULL.
+        """
+        conn.create_function("file_extension", 1, _extension)
+        with conn:
+            conn.execute("""
+                UPDATE scan_logs
+                SET scanned_at = CAST(strftime('%s', timestamp, 'utc') AS REAL),
+                    extension = file_extension(coalesce(member, filename))
+                WHERE scanned_at IS NULL
+            """)
+            cursor = conn.execute("""
+                SELECT id, suspicious_strings FROM scan_logs
+                WHERE suspicious_strings <> '' AND id NOT IN (SELECT log_id FROM scan_matches)
+            """)
+            while True:
+                rows = cursor.fetchmany(1000)
+                if not rows:
+                    break
+                conn.executemany("INSERT INTO scan_matches (log_id, label) VALUES (?, ?)",
+                                 [(log_id, label) for log_id, found in rows for label in found.split(", ")])
+            for table, seconds in ROLLUPS.values():
+                conn.execute(f"DELETE FROM {table}")
+                conn.execute(f"""
+                    INSERT INTO {table} (bucket, extension, score, files, bytes)
+                    SELECT CAST(scanned_at / {seconds} AS INTEGER) * {seconds}, coalesce(extension, ''),
+                           coalesce(score, 0), COUNT(*), coalesce(SUM(size), 0)
+                    FROM scan_logs
+                    WHERE parent_id IS NULL AND scanned_at IS NOT NULL
+                    GROUP BY 1, 2, 3
+                """)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_name, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _ensure_writer(self):
+        with self._writer_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_loop, daemon=True)
+                self._writer.start()
+                atexit.register(self.close)
+        if self.retention is not None:
+            self.retention.start(self.db_name, self.metrics)
+
+    def _write_loop(self):
+        conn = self._connect()
+        batch = []
+        markers = []
+        closing = False
+        try:
+            while not closing:
+                try:
+                    item = self._pending.get(timeout=self.flush_interval)
+                except Empty:
+                    continue
+                deadline = time.monotonic() + self.flush_interval
+                # gather a batch until it is full, the interval is up, or
+                # somebody asked for a flush
+                while True:
+                    if item is _CLOSE:
+                        closing = True
+                    elif isinstance(item, threading.Event):  # flush request
+                        markers.append(item)
+                    else:
+                        batch.append(item)
+                    if closing or markers or len(batch) >= self.batch_size:
+                        break
+                    try:
+                        item = self._pending.get(timeout=max(0, deadline - time.monotonic()))
+                    except Empty:
+                        break
+                self._write_batch(conn, batch)
+                batch = []
+                for event in markers:
+                    event.set()
+                markers = []
+        finally:
+            conn.close()
+
+    def _write_batch(self, conn, entries):
+        if not entries:
+            return
+        started = time.perf_counter()
+        count = sum(len(entry) for entry in entries)
+        matches = []
+        buckets = {}  # (hour, extension, score) -> [files, bytes]
+        for entry in entries:
+            row = entry.row
+            key = (int(row[-1] // 3600) * 3600, row[-2], row[1] or 0)
+            totals = buckets.setdefault(key, [0, 0])
+            totals[0] += 1
+            totals[1] += row[-3] or 0
+        try:
+            with conn:
+                for entry in entries:
+                    log_id = conn.execute(INSERT_LOG, entry.row).lastrowid
+                    matches.extend((log_id,) + match for match in entry.matches)
+                    for member in entry.members:
+                        row = list(member.row)
+                        row[_PARENT] = log_id
+                        member_id = conn.execute(INSERT_LOG, row).lastrowid
+                        matches.extend((member_id,) + match for match in member.matches)
+                conn.executemany(f"INSERT INTO scan_matches ({', '.join(MATCH_COLUMNS)}) VALUES (?, ?, ?, ?)",
+                                 matches)
+                for table, seconds in ROLLUPS.values():
+                    rollup = {}
+                    for (hour, extension, score), (files, size) in buckets.items():
+                        totals = rollup.setdefault((hour // seconds * seconds, extension, score), [0, 0])
+                        totals[0] += files
+                        totals[1] += size
+                    conn.executemany(f"""
+                        INSERT INTO {table} (bucket, extension, score, files, bytes) VALUES (?, ?, ?, ?, ?)
+                        ON CONFLICT (bucket, extension, score)
+                        DO UPDATE SET files = files + excluded.files, bytes = bytes + excluded.bytes
+                    """, [key + tuple(totals) for key, totals in rollup.items()])
+        except sqlite3.Error as e:
+            print(f"Failed to write {count} scan logs: {e}")
+            if self.metrics is not None:
+                self.metrics.incr("db_errors", count)
+            return
+        if self.metrics is not None:
+            self.metrics.observe("db_write", time.perf_counter() - started)
+            self.metrics.incr("db_rows", count)
+
+    @property
+    def pending(self):
+        """Inserts queued but not yet committed (approximate)."""
+        return self._pending.qsize()
+
+    def flush(self, timeout=None):
+        """
+        Blocks until every insert queued so far has been committed.
+
+        Returns:
+            bool: False if the timeout expired first.
+        """
+        if self._writer is None or not self._writer.is_alive():
+            return True
+        done = threading.Event()
+        self._pending.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=None):
+        """
+        Commits any queued inserts and stops the writer thread and any
+        retention thread. A later insert starts them again.
+        """
+        if self.retention is not None:
+            self.retention.stop(timeout)
+        with self._writer_lock:
+            writer, self._writer = self._writer, None
+        if writer is None or not writer.is_alive():
+            return
+        self._pending.put(_CLOSE)
+        writer.join(timeout)
+        atexit.unregister(self.close)
+
+    def apply_retention(self):
+        """
+        Commits queued inserts, then archives and deletes the rows outside
+        the retention policy now, on this thread.
+
+        Returns:
+            int: Rows removed.
+        """
+        if self.retention is None:
+            return 0
+        self.flush()
+        return self.retention.run(self.db_name, self.metrics)
+
+    def insert_log(self, file_path, score, entropy, found_strings, reasons, profile=None):
+        """
+        Queues a scan result for the database writer.
+
+        Args:
+            file_path (str): Full path of the scanned file.
+            score (int): Risk score.
+            entropy (float): Entropy value.
+            found_strings (list): List of suspicious strings.
+            reasons (list): List of reasons the file was flagged.
+            profile (dict): Entropy profile summary (EntropyProfile.summary).
+        """
+        self._ensure_writer()
+        self._pending.put(_Entry(self._row(file_path, score, entropy, found_strings, reasons, profile),
+                                 [(label, None, None) for label in found_strings]))
+
+    @staticmethod
+    def _row(file_path, score, entropy, found_strings, reasons, profile=None, member=None, digest=None, size=None):
+        profile = profile or {}
+        now = time.time()
+        return (
+            os.path.basename(member or file_path),
+            score,
+            entropy,
+            ", ".join(found_strings),
+            " | ".join(reasons),
+            time.strftime(TIME_FORMAT, time.localtime(now)),
+            profile.get('blocks'),
+            profile.get('max'),
+            profile.get('mean'),
+            profile.get('variance'),
+            profile.get('high_blocks'),
+            None,
+            member,
+            file_path,
+            digest,
+            size,
+            _extension(member or file_path),
+            now
+        )
+
+    def _entry(self, result):
+        row = self._row(result.path, result.score, result.entropy, result.found, result.reasons, result.profile,
+                        result.member, result.digest, result.size)
+        matches = [(match.label, match.offset, match.count) for match in result.matches]
+        return _Entry(row, matches, [self._entry(member) for member in result.members])
+
+    def insert_result(self, result):
+        """
+        Inserts a ScanResult produced by HeuristicScanner.scan_file,
+        with its full path, digest, size and the offset and count of each
+        pattern matched.
+
+        The members of an archive get a row each, with parent_id set to
+        the archive's row id and member to their name inside it.
+
+        Args:
+            result (ScanResult): Result of a single-pass file scan.
+        """
+        self._ensure_writer()
+        self._pending.put(self._entry(result))
+
+    def _filters(self, start=None, end=None, min_score=None, max_score=None, path=None, digest=None,
+                 extension=None, label=None, members=True):
+        """
+        Builds the WHERE clause shared by the readers, see query.
+        """
+        clauses = []
+        params = []
+        if start is not None:
+            clauses.append("scanned_at >= ?")
+            params.append(to_epoch(start))
+        if end is not None:
+            clauses.append("scanned_at < ?")
+            params.append(to_epoch(end))
+        if min_score is not None:
+            clauses.append("score >= ?")
+            params.append(min_score)
+        if max_score is not None:
+            clauses.append("score <= ?")
+            params.append(max_score)
+        if path is not None:
+            clauses.append("path = ?")
+            params.append(path)
+        if digest is not None:
+            clauses.append("digest = ?")
+            params.append(digest)
+        if extension is not None:
+            clauses.append("extension = ?")
+            params.append(extension.lower())
+        if label is not None:
+            clauses.append("id IN (SELECT log_id FROM scan_matches WHERE label = ?)")
+            params.append(label)
+        if not members:
+            clauses.append("parent_id IS NULL")
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        return where, params
+
+    def fetch_logs(self, before_id=None, limit=100, before_time=None):
+        """
+        Returns one page of scan logs, newest first, for browsing history
+        older than what is kept in memory.
+
+        Args:
+            before_id (int): Only rows with a smaller id; None starts at the newest.
+            limit (int): Maximum number of rows.
+            before_time (float): Only rows logged before this epoch time.
+        Returns:
+            list: Tuples of LOG_COLUMNS.
+        """
+        return self.query(before_id=before_id, limit=limit, end=before_time)
+
+    def fetch_members(self, parent_id):
+        """
+        Returns:
+            list: Tuples of LOG_COLUMNS for the members of the archive
+            logged in row parent_id, by member name.
+        """
+        self.flush()
+        conn = sqlite3.connect(self.db_name)
+        try:
+            return conn.execute(f"SELECT {', '.join(LOG_COLUMNS)} FROM scan_logs WHERE parent_id = ? ORDER BY member",
+                                (parent_id,)).fetchall()
+        finally:
+            conn.close()
+
+    def query(self, before_id=None, limit=100, **filters):
+        """
+        Returns one page of the scan logs matching every filter given,
+        newest first. Pass the id of the last row as before_id to get the
+        next page.
+
+        Args:
+            before_id (int): Only rows with a smaller id.
+            limit (int): Maximum number of rows.
+            start, end: Time range as epoch seconds or local
+                "%Y-%m-%d %H:%M:%S" strings; start inclusive, end exclusive.
+            min_score, max_score (int): Inclusive score range.
+            path (str): Full path of the file.
+            digest (str): Content hash.
+            extension (str): Extension with its dot, such as ".exe".
+            label (str): A pattern matched in the file (see fetch_matches).
+            members (bool): Include the members of archives.
+        Returns:
+            list: Tuples of LOG_COLUMNS.
+        """
+        self.flush()
+        where, params = self._filters(**filters)
+        if before_id is not None:
+            where += (" AND" if where else " WHERE") + " id < ?"
+            params.append(before_id)
+        conn = sqlite3.connect(self.db_name)
+        try:
+            return conn.execute(f"SELECT {', '.join(LOG_COLUMNS)} FROM scan_logs{where} ORDER BY id DESC LIMIT ?",
+                                params + [limit]).fetchall()
+        finally:
+            conn.close()
+
+    def fetch_matches(self, log_id):
+        """
+        Returns:
+            list: (label, offset, count) of the patterns matched in the
+            file logged in row log_id, first seen first. Rows logged
+            through insert_log, or before the matches table existed, have
+            no offset or count.
+        """
+        self.flush()
+        conn = sqlite3.connect(self.db_name)
+        try:
+            return conn.execute("SELECT label, offset, count FROM scan_matches WHERE log_id = ? ORDER BY offset, rowid",
+                                (log_id,)).fetchall()
+        finally:
+            conn.close()
+
+    def rollup(self, period="hour", by=("bucket",), start=None, end=None, min_score=None, max_score=None,
+               extension=None, limit=None):
+        """
+        Aggregates scan counts from the rollup tables, without reading
+        scan_logs. The most flagged extensions of the last week are
+        rollup("day", ("extension",), start=time.time() - 7 * 86400,
+        min_score=4, limit=10), and the score distribution per hour is
+        rollup("hour", ("bucket", "score")).
+
+        Args:
+            period (str): "hour" or "day".
+            by (tuple): Any of "bucket", "extension" and "score".
+            start, end: Time range as for query; start is rounded down to
+                the start of its bucket.
+            min_score, max_score (int): Inclusive score range.
+            extension (str): Only this extension.
+            limit (int): Maximum number of rows.
+        Returns:
+            list: Tuples of the by values, then the number of files and
+            their total size; by bucket if grouped by it, then most files
+            first.
+        """
+        if period not in ROLLUPS:
+            raise ValueError(f"Unknown rollup period: {period}")
+        unknown = set(by) - set(ROLLUP_KEYS)
+        if unknown:
+            raise ValueError(f"Cannot group rollups by {', '.join(sorted(unknown))}")
+        table, seconds = ROLLUPS[period]
+        clauses = []
+        params = []
+        if start is not None:
+            clauses.append("bucket >= ?")
+            params.append(int(to_epoch(start)) // seconds * seconds)
+        if end is not None:
+            clauses.append("bucket < ?")
+            params.append(to_epoch(end))
+        if min_score is not None:
+            clauses.append("score >= ?")
+            params.append(min_score)
+        if max_score is not None:
+            clauses.append("score <= ?")
+            params.append(max_score)
+        if extension is not None:
+            clauses.append("extension = ?")
+            params.append(extension.lower())
+        sql = f"SELECT {''.join(key + ', ' for key in by)}SUM(files), SUM(bytes) FROM {table}"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        if by:
+            sql += f" GROUP BY {', '.join(by)}"
+        # SUM(files) is the column after the by values
+        sql += " ORDER BY " + ("bucket, " if "bucket" in by else "") + f"{len(by) + 1} DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        self.flush()
+        conn = sqlite3.connect(self.db_name)
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    def count_logs(self, start=None, end=None, min_score=None, max_score=None, **filters):
+        self.flush()
+        where, params = self._filters(start, end, min_score, max_score, **filters)
+        conn = sqlite3.connect(self.db_name)
+        try:
+            return conn.execute(f"SELECT COUNT(*) FROM scan_logs{where}", params).fetchone()[0]
+        finally:
+            conn.close()
+
+    def iter_logs(self, start=None, end=None, min_score=None, max_score=None, batch_size=1000, **filters):
+        """
+        Yields scan log rows oldest first, fetching batch_size rows at a
+        time so memory use does not depend on the size of the table.
+
+        Args:
+            start, end: Time range as epoch seconds or "%Y-%m-%d %H:%M:%S"
+                strings; start inclusive, end exclusive.
+            min_score, max_score (int): Inclusive score range.
+            filters: Any other filter of query.
+        Yields:
+            tuple: Values of LOG_COLUMNS.
+        """
+        self.flush()
+        where, params = self._filters(start, end, min_score, max_score, **filters)
+        conn = sqlite3.connect(self.db_name)
+        try:
+            cursor = conn.execute(f"SELECT {', '.join(LOG_COLUMNS)} FROM scan_logs{where} ORDER BY id", params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            conn.close()
+
+    def export_to_csv(self, export_path, start=None, end=None, min_score=None, max_score=None, progress=None):
+     """
+    Exports scan logs to a CSV file, streaming rows from the database.
+
+    Args:
+        export_path (str): Path to save the exported CSV.
+        start, end, min_score, max_score: Optional filters, see iter_logs.
+        progress (callable): Called as progress(done, total) after each batch.
+    Returns:
+        tuple: (bool success, str message)
+    """
+     try:
+        total = self.count_logs(start, end, min_score, max_score)
+        done = 0
+        with open(export_path, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(LOG_COLUMNS)
+            rows = self.iter_logs(start, end, min_score, max_score)
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= 1000:
+                    writer.writerows(batch)
+                    done += len(batch)
+                    batch = []
+                    if progress:
+                        progress(done, total)
+            writer.writerows(batch)
+            done += len(batch)
+        if progress:
+            progress(done, total)
+        return True, f"{done} logs exported to CSV successfully."
+     except Exception as e:
+        return False, f"Failed to export logs: {e}"
@@ -0,0 +1,260 @@
+import heapq
+import math
+from collections import Counter
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, fall back to pure Python counting
+    np = None
+
+BLOCK_SIZE = 4096  # bytes per block of an entropy profile
+HIGH_ENTROPY = 7.2  # blocks above this look compressed or encrypted
+HOT_REGIONS = 5  # highest-entropy blocks kept per profile
+BINCOUNT_SLICE = 4 * 1024 * 1024  # bytes counted per NumPy bincount call
+
+
+def shannon_entropy(counts, total):
+    """
+    Computes Shannon entropy (bits per symbol) from symbol counts.
+
+    Args:
+        counts (iterable): Occurrence count of each symbol.
+        total (int): Sum of all counts.
+    Returns:
+        float: Entropy, 0 for empty input.
+    """
+    if not total:
+        return 0
+    return -sum((count / total) * math.log2(count / total) for count in counts if count)
+
+
+class ByteHistogram:
+    """
+    256-bin byte histogram that can be fed one chunk at a time.
+
+    With NumPy the counting is a single vectorized bincount over a
+    zero-copy view of the buffer; without it, Counter does the work.
+    Histograms of separate chunks can be merged, so the entropy of a
+    whole file never requires holding the whole file.
+    """
+
+    def __init__(self):
+        self.total = 0
+        if np is not None:
+            self.counts = np.zeros(256, dtype=np.int64)
+        else:
+            self.counts = [0] * 256
+
+    @classmethod
+    def from_bytes(cls, data):
+        histogram = cls()
+        histogram.update(data)
+        return histogram
+
+    def update(self, data):
+        """
+        Adds the bytes of a buffer (bytes, bytearray, memoryview, mmap).
+        """
+        view = memoryview(data).cast('B')
+        if not len(view):
+            return
+        if np is not None and isinstance(self.counts, np.ndarray):
+            # bincount widens its input to intp, so count large buffers in
+            # slices rather than allocating eight times their size
+            for start in range(0, len(view), BINCOUNT_SLICE):
+                data = np.frombuffer(view[start:start + BINCOUNT_SLICE], dtype=np.uint8)
+                self.counts += np.bincount(data, minlength=256)
+        else:
+            counts = self.counts
+            for byte, count in Counter(view).items():
+                counts[byte] += count
+        self.total += len(view)
+
+    def clear(self):
+        if np is not None and isinstance(self.counts, np.ndarray):
+            self.counts[:] = 0
+        else:
+            self.counts = [0] * 256
+        self.total = 0
+
+    def merge(self, other):
+        """
+        Adds the counts of another histogram into this one.
+        """
+        if np is not None and isinstance(self.counts, np.ndarray):
+            self.counts += np.asarray(other.counts, dtype=np.int64)
+        else:
+            counts = self.counts
+            for byte, count in enumerate(other.counts):
+                counts[byte] += int(count)
+        self.total += other.total
+        return self
+
+    def entropy(self):
+        if not self.total:
+            return 0
+        if np is not None and isinstance(self.counts, np.ndarray):
+            p = self.counts[self.counts > 0] / self.total
+            return float(-(p * np.log2(p)).sum())
+        return shannon_entropy(self.counts, self.total)
+
+
+class EntropyProfile:
+    """
+    Entropy of every fixed-size block of a byte stream, built in the
+    same pass as the whole-stream histogram.
+
+    A single global entropy value hides a small encrypted payload
+    appended to a large text file; the per-block maximum and the number
+    of high-entropy blocks expose it. Chunks may be any size: a block
+    straddling two chunks is completed from the next one, and the
+    whole-stream histogram is the sum of the block histograms, so every
+    byte is counted exactly once. With NumPy, runs of whole blocks are
+    counted with one bincount per batch instead of one per block.
+
+    The blocks at or below high_threshold are summarised on their own
+    too: a payload hidden in text sits among blocks of nearly the same
+    entropy, while an executable's compressed sections sit among code,
+    tables and padding that vary widely.
+
+    Attributes:
+        histogram (ByteHistogram): Counts of the whole stream so far.
+        blocks (int): Number of finished blocks.
+        max (float): Highest block entropy.
+        high_blocks (int): Blocks with entropy above high_threshold.
+    """
+
+    def __init__(self, block_size=BLOCK_SIZE, high_threshold=HIGH_ENTROPY, keep=HOT_REGIONS):
+        self.block_size = block_size
+        self.high_threshold = high_threshold
+        self.keep = keep
+        self.histogram = ByteHistogram()
+        self.blocks = 0
+        self.max = 0.0
+        self.high_blocks = 0
+        self._sum = 0.0
+        self._sum_sq = 0.0
+        self._high_sum = 0.0
+        self._high_sum_sq = 0.0
+        self._offset = 0  # stream offset of the next block to be recorded
+        self._block = ByteHistogram()  # the block still being filled
+        self._hottest = []  # min-heap of (entropy, offset, length)
+
+    def update(self, data):
+        """
+        Adds the bytes of a buffer (bytes, bytearray, memoryview, mmap).
+        """
+        view = memoryview(data).cast('B')
+        size = self.block_size
+        pos = 0
+        if self._block.total:
+            pos = min(len(view), size - self._block.total)
+            self._block.update(view[:pos])
+            if self._block.total == size:
+                self._close_block()
+        whole = (len(view) - pos) // size
+        if whole:
+            self._add_blocks(view[pos:pos + whole * size], whole)
+            pos += whole * size
+        if pos < len(view):
+            self._block.update(view[pos:])
+
+    def finish(self):
+        """
+        Records the trailing partial block, if any. Returns self.
+        """
+        if self._block.total:
+            self._close_block()
+        return self
+
+    def _close_block(self):
+        block = self._block
+        self.histogram.merge(block)
+        self._record(block.entropy(), block.total)
+        block.clear()
+
+    def _add_blocks(self, view, count):
+        size = self.block_size
+        if np is None:
+            for i in range(count):
+                block = ByteHistogram.from_bytes(view[i * size:(i + 1) * size])
+                self.histogram.merge(block)
+                self._record(block.entropy(), size)
+            return
+        # 256 blocks per batch keep every (block, byte) bin index within uint16
+        for first in range(0, count, 256):
+            n = min(256, count - first)
+            data = np.frombuffer(view[first * size:(first + n) * size], dtype=np.uint8).reshape(n, size)
+            bins = data + (np.arange(n, dtype=np.uint16) * 256)[:, None]
+            counts = np.bincount(bins.ravel(), minlength=n * 256).reshape(n, 256)
+            self.histogram.counts += counts.sum(axis=0)
+            self.histogram.total += n * size
+            p = counts / size
+            with np.errstate(divide='ignore', invalid='ignore'):
+                entropies = -np.where(counts > 0, p * np.log2(p), 0).sum(axis=1)
+            for entropy in entropies.tolist():
+                self._record(entropy, size)
+
+    def _record(self, entropy, length):
+        self.blocks += 1
+        self._sum += entropy
+        self._sum_sq += entropy * entropy
+        if entropy > self.max:
+            self.max = entropy
+        if entropy > self.high_threshold:
+            self.high_blocks += 1
+            self._high_sum += entropy
+            self._high_sum_sq += entropy * entropy
+        entry = (entropy, self._offset, length)
+        if len(self._hottest) < self.keep:
+            heapq.heappush(self._hottest, entry)
+        elif entropy > self._hottest[0][0]:
+            heapq.heapreplace(self._hottest, entry)
+        self._offset += length
+
+    @property
+    def mean(self):
+        return self._sum / self.blocks if self.blocks else 0.0
+
+    @property
+    def variance(self):
+        if not self.blocks:
+            return 0.0
+        return max(0.0, self._sum_sq / self.blocks - self.mean ** 2)
+
+    @property
+    def low_mean(self):
+        low = self.blocks - self.high_blocks
+        return (self._sum - self._high_sum) / low if low else 0.0
+
+    @property
+    def low_variance(self):
+        # of the blocks at or below high_threshold
+        low = self.blocks - self.high_blocks
+        if not low:
+            return 0.0
+        return max(0.0, (self._sum_sq - self._high_sum_sq) / low - self.low_mean ** 2)
+
+    def hot_regions(self):
+        """
+        Returns:
+            list: (offset, length, entropy) of the highest-entropy
+            blocks, highest first.
+        """
+        return [(offset, length, entropy) for entropy, offset, length in sorted(self._hottest, reverse=True)]
+
+    def summary(self):
+        """
+        Returns:
+            dict: blocks, max, mean, variance, high_blocks, and low_mean
+            and low_variance of the other blocks.
+        """
+        return {
+            'blocks': self.blocks,
+            'max': self.max,
+            'mean': self.mean,
+            'variance': self.variance,
+            'high_blocks': self.high_blocks,
+            'low_mean': self.low_mean,
+            'low_variance': self.low_variance,
+        }
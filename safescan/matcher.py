@@ -0,0 +1,231 @@
+import re
+from collections import deque
+
+# Up to this many byte patterns, one C-level bytes.find pass per pattern is
+# faster than walking a Python-level automaton byte by byte.
+FIND_THRESHOLD = 16
+
+
+class Match:
+    """
+    Where a pattern was first seen and how often it occurred.
+    """
+
+    def __init__(self, label, offset):
+        self.label = label
+        self.offset = offset
+        self.count = 0
+
+    def __repr__(self):
+        return f"Match({self.label!r}, offset={self.offset}, count={self.count})"
+
+
+class PatternMatcher:
+    """
+    Compiled multi-pattern matcher over raw bytes.
+
+    All patterns are compiled once into an Aho–Corasick automaton, so a
+    scan costs one pass over the data however many patterns are loaded.
+    Small rule sets use per-pattern bytes.find instead, which is faster
+    when there are only a handful of keywords.
+
+    Args:
+        patterns (iterable): str or bytes patterns; str ones are UTF-8 encoded.
+            A (label, pattern) pair matches pattern but reports label.
+        case_insensitive (bool): Match ASCII letters regardless of case.
+        utf16 (bool): Also match the UTF-16LE encoding of str patterns.
+        automaton (bool): Force (True) or disable (False) the automaton;
+            by default it is used above FIND_THRESHOLD patterns.
+    """
+
+    def __init__(self, patterns, case_insensitive=False, utf16=False, automaton=None):
+        self.labels = []
+        self.case_insensitive = case_insensitive
+        self.utf16 = utf16
+        self.variants = []  # (pattern bytes, label index)
+        seen = set()
+        for item in patterns:
+            label, pattern = item if isinstance(item, tuple) else (item, item)
+            if label in self.labels:
+                continue
+            index = len(self.labels)
+            self.labels.append(label)
+            forms = [pattern.encode() if isinstance(pattern, str) else bytes(pattern)]
+            if utf16 and isinstance(pattern, str):
+                forms.append(pattern.encode("utf-16-le"))
+            for form in forms:
+                if case_insensitive:
+                    form = form.lower()
+                if form and (form, index) not in seen:
+                    seen.add((form, index))
+                    self.variants.append((form, index))
+
+        self.max_len = max((len(p) for p, _ in self.variants), default=0)
+        # case-insensitive search runs on the data as it is: find through
+        # an IGNORECASE regex per pattern, the automaton through a table
+        # folding each byte to lower case
+        flags = re.IGNORECASE if case_insensitive else 0
+        self._finders = [(pattern, index, re.compile(re.escape(pattern), flags) if case_insensitive else None)
+                         for pattern, index in self.variants]
+        self._fold = bytes(range(256)).lower() if case_insensitive else None
+        if automaton is None:
+            automaton = len(self.variants) > FIND_THRESHOLD
+        self.use_automaton = automaton
+        if automaton:
+            self._build()
+
+    def _build(self):
+        goto = [{}]
+        out = [[]]
+        for pattern, index in self.variants:
+            state = 0
+            for byte in pattern:
+                nxt = goto[state].get(byte)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][byte] = nxt
+                    goto.append({})
+                    out.append([])
+                state = nxt
+            out[state].append((index, len(pattern)))
+
+        fail = [0] * len(goto)
+        pending = deque(goto[0].values())
+        while pending:
+            state = pending.popleft()
+            for byte, nxt in goto[state].items():
+                pending.append(nxt)
+                f = fail[state]
+                while f and byte not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(byte, 0)
+                out[nxt] = out[nxt] + out[fail[nxt]]
+
+        self._goto = goto
+        self._fail = fail
+        self._out = out
+        # while at the root, jump straight to the next byte that can start a match
+        self._starts = re.compile(b"[" + b"".join(re.escape(bytes([b])) for b in sorted(goto[0])) + b"]",
+                                  re.IGNORECASE if self.case_insensitive else 0)
+
+    def stream(self):
+        """
+        Returns a MatchStream that accepts the data in consecutive chunks.
+        """
+        return MatchStream(self)
+
+    def search(self, data):
+        """
+        Matches a complete buffer.
+
+        Returns:
+            list: Match objects in pattern order.
+        """
+        stream = self.stream()
+        stream.feed(data)
+        return stream.matches()
+
+    def found(self, data):
+        return [m.label for m in self.search(data)]
+
+
+def _find(data, pattern, regex, start, end):
+    """Index of the next match of pattern in data[start:end], or -1."""
+    if regex is None:
+        return data.find(pattern, start, end)
+    match = regex.search(data, start, end)
+    return match.start() if match else -1
+
+
+class MatchStream:
+    """
+    Incremental matching state for one scan.
+
+    Matches that straddle chunk boundaries are found: the automaton
+    state, or for the find path a short tail of the previous chunk, is
+    carried from one feed() to the next. Offsets are absolute positions
+    in the concatenated stream.
+    """
+
+    def __init__(self, matcher):
+        self.matcher = matcher
+        self.position = 0
+        self._state = 0
+        self._tail = b""
+        self._hits = {}
+
+    def _record(self, index, offset):
+        hit = self._hits.get(index)
+        if hit is None:
+            hit = self._hits[index] = Match(self.matcher.labels[index], offset)
+        elif offset < hit.offset:
+            hit.offset = offset
+        hit.count += 1
+
+    def feed(self, data, start=0, end=None):
+        """
+        Matches data[start:end], the next bytes of the stream. bytes and
+        mmap objects are searched in place, without a copy; only the few
+        bytes around the boundary with the previous chunk are copied.
+        """
+        if end is None:
+            end = len(data)
+        matcher = self.matcher
+        if not matcher.variants or end <= start:
+            self.position += max(0, end - start)
+            return
+        if not hasattr(data, "find"):
+            data, start, end = bytes(data[start:end]), 0, end - start  # a memoryview
+        if matcher.use_automaton:
+            self._feed_automaton(data, start, end)
+        else:
+            self._feed_find(data, start, end)
+        self.position += end - start
+
+    def _feed_find(self, data, start, end):
+        tail = self._tail
+        keep = self.matcher.max_len - 1
+        if tail:
+            # matches starting in the tail of the previous chunk and ending in this one
+            edge = tail + data[start:start + keep]
+            base = self.position - len(tail)
+            for pattern, index, regex in self.matcher._finders:
+                i = _find(edge, pattern, regex, max(0, len(tail) - len(pattern) + 1), len(edge))
+                while i != -1 and i < len(tail):
+                    self._record(index, base + i)
+                    i = _find(edge, pattern, regex, i + 1, len(edge))
+        base = self.position - start
+        for pattern, index, regex in self.matcher._finders:
+            i = _find(data, pattern, regex, start, end)
+            while i != -1:
+                self._record(index, base + i)
+                i = _find(data, pattern, regex, i + 1, end)
+        self._tail = (tail + data[max(start, end - keep):end])[-keep:] if keep else b""
+
+    def _feed_automaton(self, data, start, end):
+        matcher = self.matcher
+        goto, fail, out, starts, fold = matcher._goto, matcher._fail, matcher._out, matcher._starts, matcher._fold
+        state = self._state
+        base = self.position - start
+        i = start
+        while i < end:
+            if not state:
+                m = starts.search(data, i, end)
+                if m is None:
+                    break
+                i = m.start()
+            byte = data[i] if fold is None else fold[data[i]]
+            while state and byte not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(byte, 0)
+            if out[state]:
+                for index, length in out[state]:
+                    self._record(index, base + i - length + 1)
+            i += 1
+        self._state = state
+
+    def matches(self):
+        return [self._hits[i] for i in sorted(self._hits)]
+
+    def found(self):
+        return [m.label for m in self.matches()]
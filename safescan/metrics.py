@@ -0,0 +1,178 @@
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Stages timed by the pipeline, in the order a file passes through them
+STAGES = ("queue_wait", "scan", "read", "entropy", "strings", "hash", "archive", "db_write", "quarantine")
+
+# Help text for the Prometheus endpoint
+COUNTER_HELP = {
+    "files_queued": "Files queued for scanning",
+    "events_coalesced": "Watcher events merged into a file still settling",
+    "files_scanned": "Files scanned (cache hits included)",
+    "files_cached": "Scans answered from the cache",
+    "files_flagged": "Files scored at or above the quarantine score",
+    "bytes_scanned": "Bytes read by fresh scans",
+    "archive_members": "Archive members scanned",
+    "errors": "Files that could not be scanned or processed",
+    "db_rows": "Scan log rows committed",
+    "db_errors": "Scan log rows that failed to commit",
+    "logs_expired": "Scan log rows archived or deleted by retention",
+    "quarantined": "Files moved into quarantine",
+    "quarantine_failures": "Failed quarantine attempts",
+}
+
+
+class Metrics:
+    """
+    Counters and per-stage timers for the scan pipeline.
+
+    Every thread updates a shard of its own, a plain dict no other
+    thread writes to, so recording a number takes no lock and threads
+    never contend. snapshot() sums the shards. Shards outlive their
+    threads, so counts from finished worker threads are kept.
+
+    Gauges are callables evaluated at snapshot time, e.g. queue depth.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()  # only taken when a thread creates its shard
+        self._gauges = {}
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+
+    def incr(self, name, value=1):
+        shard = self._shard()
+        shard[name] = shard.get(name, 0) + value
+
+    def observe(self, stage, seconds):
+        """
+        Records one pass through a stage that took seconds.
+        """
+        shard = self._shard()
+        key = ("stage", stage)
+        count, total, longest = shard.get(key, (0, 0.0, 0.0))
+        shard[key] = (count + 1, total + seconds, max(longest, seconds))
+
+    @contextmanager
+    def timer(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def gauge(self, name, function):
+        """
+        Registers a gauge, read by calling function() on every snapshot.
+        """
+        self._gauges[name] = function
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: uptime (seconds), counters {name: value}, stages
+            {stage: {count, seconds, avg_ms, max_ms}} and gauges {name: value}.
+        """
+        with self._shards_lock:
+            # dict() copies each shard in one step, even while its thread writes
+            shards = [dict(shard) for shard in self._shards]
+        counters = dict.fromkeys(COUNTER_HELP, 0)
+        timed = {}
+        for shard in shards:
+            for key, value in shard.items():
+                if isinstance(key, tuple):
+                    count, total, longest = timed.get(key[1], (0, 0.0, 0.0))
+                    timed[key[1]] = (count + value[0], total + value[1], max(longest, value[2]))
+                else:
+                    counters[key] = counters.get(key, 0) + value
+        stages = {}
+        for stage in list(STAGES) + sorted(set(timed) - set(STAGES)):
+            count, total, longest = timed.get(stage, (0, 0.0, 0.0))
+            stages[stage] = {
+                "count": count,
+                "seconds": total,
+                "avg_ms": total / count * 1000 if count else 0.0,
+                "max_ms": longest * 1000,
+            }
+        gauges = {}
+        for name, function in list(self._gauges.items()):
+            try:
+                gauges[name] = function()
+            except Exception:
+                gauges[name] = None
+        return {"uptime": time.time() - self.started, "counters": counters, "stages": stages, "gauges": gauges}
+
+    def prometheus(self, prefix="safescan"):
+        """
+        Returns the snapshot in the Prometheus text exposition format.
+        """
+        snapshot = self.snapshot()
+        lines = [f"# HELP {prefix}_uptime_seconds Seconds since the metrics were created",
+                 f"# TYPE {prefix}_uptime_seconds gauge",
+                 f"{prefix}_uptime_seconds {snapshot['uptime']:.3f}"]
+        for name, value in snapshot["counters"].items():
+            metric = f"{prefix}_{name}_total"
+            lines.append(f"# HELP {metric} {COUNTER_HELP.get(name, name.replace('_', ' ').capitalize())}")
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+        metric = f"{prefix}_stage_seconds"
+        lines.append(f"# HELP {metric} Time spent in each pipeline stage")
+        lines.append(f"# TYPE {metric} summary")
+        for stage, values in snapshot["stages"].items():
+            lines.append(f'{metric}_sum{{stage="{stage}"}} {values["seconds"]:.6f}')
+            lines.append(f'{metric}_count{{stage="{stage}"}} {values["count"]}')
+        for name, value in snapshot["gauges"].items():
+            if value is None:
+                continue
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            lines.append(f"{prefix}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """
+    Serves Metrics.prometheus() at http://host:port/metrics from a
+    background thread. Binds to localhost by default; port 0 picks a
+    free port, see the port attribute.
+    """
+
+    def __init__(self, metrics, port=9464, host="127.0.0.1"):
+        self.metrics = metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                if handler.path.split("?")[0] != "/metrics":
+                    handler.send_error(404)
+                    return
+                body = metrics.prometheus().encode()
+                handler.send_response(200)
+                handler.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                handler.send_header("Content-Length", str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, format, *args):
+                pass  # scrapes every few seconds would flood the console
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
@@ -0,0 +1,362 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from queue import Queue, Empty, Full
+from .cache import ScanCache
+from .database import DatabaseLogger
+from .metrics import Metrics, MetricsServer
+from .report import ReportManager
+from .scanner import HeuristicScanner, init_worker, scan_in_worker
+from .scheduling import Debouncer, ScanQueue
+from .seen import SeenIndex
+from .watcher import create_watcher
+
+
+# Shutdown sentinel put on the queue by FileMonitor.stop
+_STOP = object()
+
+
+def record_result(monitor, file_path, result):
+    """
+    Records a finished scan for FileMonitor or AsyncFileMonitor: counts it
+    in monitor.metrics, marks it in the seen index, stores it in the
+    cache, logs it to the database and the report, and queues it for
+    quarantine if flagged. Meant for the monitor's single result writer.
+
+    Returns:
+        str: The report's log entry, or None for a file that was scanned
+        and logged before and is unchanged since.
+    """
+    metrics = monitor.metrics
+    metrics.incr("files_scanned")
+    for stage, seconds in result.timings.items():
+        metrics.observe(stage, seconds)
+    if result.cached:
+        metrics.incr("files_cached")
+    else:
+        metrics.incr("bytes_scanned", result.size)
+    if result.members:
+        metrics.incr("archive_members", len(result.members))
+    if result.error is not None:
+        metrics.incr("errors")
+    elif result.score >= monitor.scanner.quarantine_score:
+        metrics.incr("files_flagged")
+    if monitor.seen is not None and result.error is None and result.inode is not None:
+        monitor.seen.mark(result.path, result.inode, result.size, result.mtime_ns)
+    if result.cached == "file":
+        if monitor.cache is not None:
+            monitor.cache.touch(result)
+        return None
+    if monitor.cache is not None:
+        monitor.cache.store(result, monitor.scanner.rules_fingerprint())
+    monitor.db_logger.insert_result(result)
+
+    score, reasons = result.score, result.reasons
+    log_entry = f"Scanned: {file_path} | Score: {score} | Reasons: {', '.join(reasons)}"
+    monitor.report.results.append(log_entry)
+    if score >= monitor.scanner.quarantine_score:
+        monitor.report.log_result(file_path, reasons, score)
+    return log_entry
+
+
+def forget_removed(monitor, removed):
+    """
+    Drops the seen-index rows of the paths the watcher reported removed,
+    for FileMonitor or AsyncFileMonitor, once every file that was settling
+    at the time has been released. A file moved within the folder is
+    reported removed while its new name still settles, and the old row is
+    what lets SeenIndex.check recognise the rename when it is released.
+    """
+    seen, debouncer = monitor.seen, monitor.debouncer
+    if seen is None:
+        return
+    if debouncer is None:
+        seen.forget(removed)
+        return
+    if removed:
+        monitor._removed.append((debouncer.checkpoint(), removed))
+    while monitor._removed and debouncer.passed(monitor._removed[0][0]):
+        seen.forget(monitor._removed.popleft()[1])
+
+
+class FileMonitor:
+    """
+    Watches a folder and scans new files.
+
+    Args:
+        folder (str): Folder to watch.
+        workers (int): 0 scans on a single thread; N > 0 fans scans out to
+            a pool of N workers while one writer thread does DB logging
+            and queues flagged files for quarantine.
+        pool (str): "process" for CPU-bound scanning, "thread" when I/O bound.
+        max_in_flight (int): Scans submitted to the pool at once; further
+            files wait in the queue, which is bounded in pool mode so the
+            watcher blocks instead of piling up paths. The queue hands out
+            small files first, see ScanQueue.
+        recursive (bool): Also watch subdirectories.
+        cache (bool): Keep a ScanCache in the scan database so unchanged
+            and duplicate files are not rescanned.
+        metrics_port (int): Serve self.metrics in the Prometheus text
+            format on http://127.0.0.1:<port>/metrics while running;
+            None disables the endpoint, 0 picks a free port.
+        resume (bool): Keep a SeenIndex in the scan database, so a
+            restarted monitor only scans files that are new or changed
+            since it last ran, and renamed files are not rescanned.
+        rules (str): Rule file to score with instead of the built-in
+            heuristics, see safescan.rules. Edits to it are picked up
+            within a second, by the pool workers too, without a restart.
+        settle (float): Seconds a file's size and mtime must hold still
+            before it is queued, so files being copied in are not scanned
+            half-written, see Debouncer; 0 queues files as soon as the
+            watcher reports them.
+        retention (Retention): Archive and delete old scan logs in the
+            background, see safescan.retention.
+
+    Per-stage timings and counters are always collected in self.metrics,
+    see metrics_snapshot().
+    """
+
+    def __init__(self, folder, workers=0, pool="process", max_in_flight=None, recursive=False, cache=True,
+                 metrics_port=None, resume=True, rules=None, settle=2.0, retention=None):
+        if pool not in ("process", "thread"):
+            raise ValueError(f"Unknown pool type: {pool}")
+        self.folder = folder
+        self.recursive = recursive
+        self.workers = workers
+        self.pool = pool
+        self.max_in_flight = max_in_flight or workers * 2
+        self.queue = ScanQueue(maxsize=self.max_in_flight * 4)
+        self.results = Queue()
+        self.metrics = Metrics()
+        self.scanner = HeuristicScanner(rules_path=rules)
+        self.report = ReportManager(metrics=self.metrics)
+        self.db_logger = DatabaseLogger(metrics=self.metrics, retention=retention)
+        self.cache = ScanCache(self.db_logger.db_name) if cache else None
+        self.seen = SeenIndex(self.db_logger.db_name) if resume else None
+        self.debouncer = Debouncer(quiet=settle, metrics=self.metrics) if settle else None
+        self._removed = deque()  # (debouncer checkpoint, paths) not yet forgotten, see forget_removed
+        self.running = False
+        self.threads = []
+        self._cancel = threading.Event()
+        self._queued_at = {}  # path -> perf_counter() when it was queued
+        self.metrics_port = metrics_port
+        self.metrics_server = None
+        self.metrics.gauge("queue_depth", lambda: self.queue.qsize())
+        self.metrics.gauge("settling", lambda: len(self.debouncer) if self.debouncer is not None else 0)
+        self.metrics.gauge("results_pending", lambda: self.results.qsize())
+        self.metrics.gauge("db_pending", lambda: self.db_logger.pending)
+        self.metrics.gauge("quarantine_pending", lambda: self.report.quarantine.pending)
+
+    def metrics_snapshot(self):
+        """
+        Returns:
+            dict: Counters, per-stage timings and gauges, see Metrics.snapshot.
+        """
+        return self.metrics.snapshot()
+
+    def _enqueue(self, file_path, size=None):
+        self._queued_at[file_path] = time.perf_counter()
+        self.metrics.incr("files_queued")
+        self.queue.put(file_path, size=size)
+
+    def _settle(self, file_path, closed=False):
+        if self.debouncer is None:
+            self._release([(file_path, None)])
+        else:
+            self.debouncer.add(file_path, closed)
+
+    def _release(self, files):
+        # Queues files that have finished settling, given as (path, stat)
+        for path, st in files:
+            if self.seen is not None and not self.seen.check(path, st):
+                continue  # unchanged, or renamed from a scanned file
+            self._enqueue(path, st.st_size if st is not None else None)
+            print(f"File queued: {path}")
+
+    def watch_folder(self):
+        watcher = create_watcher(self.folder, self.recursive)
+        debouncer = self.debouncer
+        try:
+            # Queue existing files on start
+            existing = watcher.existing_files()
+            if self.seen is not None:
+                # only what changed while the monitor was not running
+                existing = self.seen.reconcile(self.folder, existing, self.recursive)
+            for path in existing:
+                self._settle(path)
+            print(f"Initial files to scan: {len(existing)}")
+
+            while self.running:
+                timeout = 1.0
+                if debouncer is not None:
+                    due = debouncer.next_due()
+                    if due is not None:
+                        timeout = min(timeout, due)
+                for path in watcher.read_events(timeout=timeout):
+                    self._settle(path, watcher.reports_closed)
+                for path in watcher.pop_listed():
+                    self._settle(path)  # listed, not closed: the writer may not be done
+                if debouncer is not None:
+                    self._release(debouncer.ready())
+                forget_removed(self, watcher.pop_removed())
+        finally:
+            if debouncer is not None:
+                # files still settling are queued as they are; stop() drops
+                # them again unless it drains the queue
+                self._release(debouncer.flush())
+            watcher.close()
+
+    def handle_result(self, file_path, result):
+        log_entry = record_result(self, file_path, result)
+        if log_entry is not None:
+            print(log_entry)
+
+    def _next_path(self):
+        # Blocks until a path is queued. Returns _STOP on the shutdown
+        # sentinel, or once running was cleared and the queue has drained.
+        while True:
+            try:
+                file_path = self.queue.get(timeout=1.0)
+            except Empty:
+                if not self.running:
+                    return _STOP
+                continue
+            if file_path is _STOP:
+                self.queue.task_done()
+            else:
+                queued_at = self._queued_at.pop(file_path, None)
+                if queued_at is not None:
+                    self.metrics.observe("queue_wait", time.perf_counter() - queued_at)
+            return file_path
+
+    def process_queue(self):
+        while True:
+            file_path = self._next_path()
+            if file_path is _STOP:
+                break
+            try:
+                result = self.scanner.scan(file_path, self.cache)
+                self.handle_result(file_path, result)
+            except Exception as e:
+                self.metrics.incr("errors")
+                print(f"Error processing {file_path}: {e}")
+            finally:
+                self.queue.task_done()
+
+    def _create_executor(self):
+        if self.pool == "thread":
+            return ThreadPoolExecutor(self.workers)
+        return ProcessPoolExecutor(self.workers, initializer=init_worker, initargs=(self.scanner, self.cache))
+
+    def dispatch_queue(self):
+        """
+        Feeds queued paths to the worker pool, at most max_in_flight at once.
+        Finished scans are handed to write_results through self.results,
+        which calls task_done once each one is logged.
+        """
+        slots = threading.BoundedSemaphore(self.max_in_flight)
+        executor = self._create_executor()
+        if self.pool == "thread":
+            scan = lambda file_path: self.scanner.scan(file_path, self.cache)
+        else:
+            scan = scan_in_worker
+
+        def done(future, file_path):
+            slots.release()
+            self.results.put((file_path, future))
+
+        try:
+            while True:
+                file_path = self._next_path()
+                if file_path is _STOP:
+                    break
+                slots.acquire()
+                future = executor.submit(scan, file_path)
+                future.add_done_callback(lambda f, p=file_path: done(f, p))
+        finally:
+            executor.shutdown(wait=True, cancel_futures=self._cancel.is_set())
+            self.results.put(None)
+
+    def write_results(self):
+        """
+        Single writer for pool mode: DB logging, report and quarantine
+        requests all happen here, in the order scans complete.
+        """
+        while True:
+            item = self.results.get()
+            if item is None:
+                break
+            file_path, future = item
+            try:
+                if not future.cancelled():
+                    self.handle_result(file_path, future.result())
+            except Exception as e:
+                self.metrics.incr("errors")
+                print(f"Error processing {file_path}: {e}")
+            finally:
+                self.queue.task_done()
+
+    def start(self):
+        self.running = True
+        self._cancel.clear()
+        if self.metrics_port is not None and self.metrics_server is None:
+            self.metrics_server = MetricsServer(self.metrics, self.metrics_port)
+        self.threads = [threading.Thread(target=self.watch_folder, daemon=True)]
+        if self.workers > 0:
+            self.threads.append(threading.Thread(target=self.dispatch_queue, daemon=True))
+            self.threads.append(threading.Thread(target=self.write_results, daemon=True))
+        else:
+            self.threads.append(threading.Thread(target=self.process_queue, daemon=True))
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self, timeout=10.0, drain=True):
+        """
+        Stops watching and shuts the scanning threads down.
+
+        Args:
+            timeout (float): Seconds to wait for all threads in total.
+            drain (bool): Finish the files already queued; if False they
+                are dropped and scans not yet started in the pool are cancelled.
+        Returns:
+            bool: True if every thread exited before the deadline.
+        """
+        deadline = time.monotonic() + timeout
+        self.running = False
+        if not self.threads:
+            return True
+        if not drain:
+            self._cancel.set()
+            self._discard_pending()
+
+        watcher, consumers = self.threads[0], self.threads[1:]
+        watcher.join(max(0, deadline - time.monotonic()))
+        if not drain:
+            self._discard_pending()  # anything the watcher added while stopping
+        try:
+            self.queue.put(_STOP, timeout=max(0, deadline - time.monotonic()))
+        except Full:
+            pass  # consumers still exit once the queue drains with running cleared
+        for thread in consumers:
+            thread.join(max(0, deadline - time.monotonic()))
+        if not any(thread.is_alive() for thread in consumers):
+            # a consumer may have seen running cleared and exited before the sentinel arrived
+            self._discard_pending()
+        self.db_logger.close(max(0, deadline - time.monotonic()))
+        self.report.close(max(0, deadline - time.monotonic()))
+        if self.seen is not None:
+            self.seen.flush()
+        if self.metrics_server is not None:
+            self.metrics_server.close()
+            self.metrics_server = None
+        return not any(thread.is_alive() for thread in self.threads)
+
+    def _discard_pending(self):
+        while True:
+            try:
+                file_path = self.queue.get_nowait()
+            except Empty:
+                return
+            self._queued_at.pop(file_path, None)
+            self.queue.task_done()
@@ -0,0 +1,109 @@
+import zlib
+
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792  # US letter in points
+
+
+class PDFReportWriter:
+    """
+    Writes a plain-text PDF report one page at a time.
+
+    Each page is compressed and written to the file as soon as it is
+    full, so memory use stays constant however many lines the report
+    has; only the byte offsets of the written objects are kept for the
+    cross-reference table at the end. Uses the built-in Helvetica fonts,
+    so nothing is embedded.
+
+    Usage:
+        with PDFReportWriter(path, "Title", "Subtitle") as pdf:
+            pdf.add_line("...")
+    """
+
+    FONT_SIZE = 9
+    LINE_HEIGHT = 14
+    MARGIN_LEFT = 30
+    MARGIN_BOTTOM = 50
+    TOP = PAGE_HEIGHT - 50
+
+    def __init__(self, path, title=None, subtitle=None):
+        self.f = open(path, 'wb')
+        self.offsets = {}
+        self.page_ids = []
+        self.next_id = 5  # 1 catalog, 2 pages, 3 and 4 fonts
+        self.lines = []
+        self.y = None
+        self.lines_written = 0
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self._object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        self._object(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+        self._object(4, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>")
+
+        self._new_page()
+        if title:
+            self._text(title, PAGE_HEIGHT - 40, font=b"/F2", size=14)
+        if subtitle:
+            self._text(subtitle, PAGE_HEIGHT - 60, size=10)
+        if title or subtitle:
+            self.y = PAGE_HEIGHT - 80
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.f.close()
+
+    def _write(self, data):
+        self.f.write(data)
+
+    def _object(self, obj_id, body):
+        self.offsets[obj_id] = self.f.tell()
+        self._write(b"%d 0 obj\n" % obj_id + body + b"\nendobj\n")
+
+    @staticmethod
+    def _escape(text):
+        data = text.encode('cp1252', errors='replace')
+        return data.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+    def _text(self, text, y, font=b"/F1", size=None):
+        size = size or self.FONT_SIZE
+        self.lines.append(b"BT %s %d Tf %d %d Td (%s) Tj ET" % (font, size, self.MARGIN_LEFT, y, self._escape(text)))
+
+    def _new_page(self):
+        self.lines = []
+        self.y = self.TOP
+
+    def _flush_page(self):
+        content = zlib.compress(b"\n".join(self.lines))
+        content_id, page_id = self.next_id, self.next_id + 1
+        self.next_id += 2
+        self._object(content_id, b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(content)
+                     + content + b"\nendstream")
+        self._object(page_id, b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] "
+                              b"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents %d 0 R >>"
+                     % (PAGE_WIDTH, PAGE_HEIGHT, content_id))
+        self.page_ids.append(page_id)
+
+    def add_line(self, text):
+        if self.y < self.MARGIN_BOTTOM:
+            self._flush_page()
+            self._new_page()
+        self._text(text, self.y)
+        self.y -= self.LINE_HEIGHT
+        self.lines_written += 1
+
+    def close(self):
+        if self.f.closed:
+            return
+        self._flush_page()
+        kids = b" ".join(b"%d 0 R" % page_id for page_id in self.page_ids)
+        self._object(2, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self.page_ids)))
+
+        xref = self.f.tell()
+        size = self.next_id
+        self._write(b"xref\n0 %d\n0000000000 65535 f \n" % size)
+        for obj_id in range(1, size):
+            self._write(b"%010d 00000 n \n" % self.offsets[obj_id])
+        self._write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, xref))
+        self.f.close()
@@ -0,0 +1,239 @@
+import atexit
+import errno
+import json
+import os
+import threading
+import time
+import uuid
+from queue import Queue, Empty
+from .cache import new_hasher, hash_file
+
+# Queue markers for the quarantine worker
+_CLOSE = object()
+_RETRY = object()
+
+
+class QuarantineRequest:
+    """
+    A flagged file waiting to be moved into quarantine.
+    """
+    __slots__ = ("path", "reasons", "score", "attempts")
+
+    def __init__(self, path, reasons, score=None):
+        self.path = path
+        self.reasons = list(reasons)
+        self.score = score
+        self.attempts = 0
+
+
+class Quarantine:
+    """
+    Moves flagged files into a quarantine directory on a worker thread of
+    its own, so the scanner only ever queues a request and never waits on
+    file I/O.
+
+    Files are stored under their BLAKE2 content digest, next to a
+    <digest>.json sidecar listing where each copy came from, why it was
+    flagged and when. Dropping the same payload twice keeps one copy and
+    adds a source to the sidecar. A move across filesystems, where
+    rename fails with EXDEV, falls back to copying, fsyncing and then
+    unlinking the original.
+
+    Moves that fail (file locked, permission denied, volume gone) are
+    kept and retried together every retry_interval seconds, or when
+    retry_failed() is called, up to max_attempts times each.
+
+    Args:
+        directory (str): Quarantine directory, created if missing.
+        log (callable): Receives one message per quarantined or failed file.
+        metrics (Metrics): Times every attempt as the quarantine stage.
+    """
+
+    def __init__(self, directory="quarantine", log=print, retry_interval=30.0, max_attempts=5, metrics=None):
+        self.directory = os.path.abspath(directory)
+        self.log = log
+        self.metrics = metrics
+        self.retry_interval = retry_interval
+        self.max_attempts = max_attempts
+        self._pending = Queue()
+        self._failed = []
+        self._next_retry = None
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    @property
+    def failed_count(self):
+        """Number of files waiting for a retry."""
+        return len(self._failed)
+
+    @property
+    def pending(self):
+        """Requests queued or waiting for a retry (approximate)."""
+        return self._pending.qsize() + len(self._failed)
+
+    def submit(self, file_path, reasons, score=None):
+        """
+        Queues a file for quarantine and returns immediately.
+        """
+        self._ensure_worker()
+        self._pending.put(QuarantineRequest(os.path.abspath(file_path), reasons, score))
+
+    def retry_failed(self):
+        """
+        Asks the worker to retry every failed move now.
+        """
+        self._ensure_worker()
+        self._pending.put(_RETRY)
+
+    def flush(self, timeout=None):
+        """
+        Blocks until every request queued so far has been attempted.
+
+        Returns:
+            bool: False if the timeout expired first.
+        """
+        if self._worker is None or not self._worker.is_alive():
+            return True
+        done = threading.Event()
+        self._pending.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=None):
+        """
+        Finishes the queued requests and stops the worker. Failed moves
+        not yet retried are reported and dropped.
+        """
+        with self._worker_lock:
+            worker, self._worker = self._worker, None
+        if worker is None or not worker.is_alive():
+            return
+        self._pending.put(_CLOSE)
+        worker.join(timeout)
+        atexit.unregister(self.close)
+
+    def _ensure_worker(self):
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._work_loop, daemon=True)
+                self._worker.start()
+                atexit.register(self.close)
+
+    def _work_loop(self):
+        while True:
+            timeout = None
+            if self._failed:
+                timeout = max(0, self._next_retry - time.monotonic())
+            try:
+                item = self._pending.get(timeout=timeout)
+            except Empty:
+                self._retry_all()
+                continue
+            if item is _CLOSE:
+                for request in self._failed:
+                    self.log(f"Gave up quarantining {request.path} after {request.attempts} attempts")
+                self._failed = []
+                return
+            if item is _RETRY:
+                self._retry_all()
+            elif isinstance(item, threading.Event):  # flush request
+                item.set()
+            else:
+                self._process(item)
+                if self._failed and time.monotonic() >= self._next_retry:
+                    self._retry_all()
+
+    def _retry_all(self):
+        requests, self._failed = self._failed, []
+        for request in requests:
+            if os.path.lexists(request.path):
+                self._process(request)
+            else:
+                self.log(f"Not quarantining {request.path}: file no longer exists")
+
+    def _process(self, request):
+        started = time.perf_counter()
+        try:
+            digest = self._quarantine(request)
+        except Exception as e:
+            self._record(started, "quarantine_failures")
+            request.attempts += 1
+            if request.attempts >= self.max_attempts:
+                self.log(f"Failed to quarantine {request.path}: {e}; giving up")
+                return
+            self.log(f"Failed to quarantine {request.path}: {e}; will retry")
+            if not self._failed:
+                self._next_retry = time.monotonic() + self.retry_interval
+            self._failed.append(request)
+            return
+        self._record(started, "quarantined")
+        self.log(f"Quarantined {request.path} as {digest}")
+
+    def _record(self, started, counter):
+        if self.metrics is not None:
+            self.metrics.observe("quarantine", time.perf_counter() - started)
+            self.metrics.incr(counter)
+
+    def _quarantine(self, request):
+        # Moves one file into quarantine, updates its sidecar and returns
+        # the digest it is stored under.
+        staged = os.path.join(self.directory, f".incoming-{uuid.uuid4().hex}")
+        digest = self._move(request.path, staged)
+        stored = os.path.join(self.directory, digest)
+        size = os.path.getsize(staged)
+        if os.path.exists(stored):
+            os.remove(staged)  # same content was quarantined before
+        else:
+            os.replace(staged, stored)
+        self._update_sidecar(digest, size, request)
+        return digest
+
+    def _move(self, src, staged):
+        # Returns the digest of the moved content.
+        try:
+            os.rename(src, staged)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            return self._copy_and_unlink(src, staged)
+        return hash_file(staged)
+
+    @staticmethod
+    def _copy_and_unlink(src, staged, chunk_size=1024 * 1024):
+        # Cross-device move: the copy is fsynced before the original is
+        # removed, so a crash in between leaves a duplicate, never nothing.
+        hasher = new_hasher()
+        try:
+            with open(src, 'rb') as fin, open(staged, 'wb') as fout:
+                while True:
+                    chunk = fin.read(chunk_size)
+                    if not chunk:
+                        break
+                    hasher.update(chunk)
+                    fout.write(chunk)
+                fout.flush()
+                os.fsync(fout.fileno())
+        except BaseException:
+            if os.path.exists(staged):
+                os.remove(staged)
+            raise
+        os.unlink(src)
+        return hasher.hexdigest()
+
+    def _update_sidecar(self, digest, size, request):
+        path = os.path.join(self.directory, digest + ".json")
+        try:
+            with open(path, encoding='utf-8') as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            metadata = {"digest": digest, "size": size, "sources": []}
+        metadata["sources"].append({
+            "path": request.path,
+            "reasons": request.reasons,
+            "score": request.score,
+            "quarantined_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        })
+        tmp = path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, indent=2)
+        os.replace(tmp, path)
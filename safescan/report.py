@@ -0,0 +1,144 @@
+import threading
+import time
+from collections import deque
+from itertools import islice
+from .quarantine import Quarantine
+
+
+class LogRecord:
+    """
+    One line of the scan log, numbered so readers can ask for what is new.
+    """
+    __slots__ = ("seq", "created", "message")
+
+    def __init__(self, seq, message):
+        self.seq = seq
+        self.created = time.time()
+        self.message = message
+
+    def __str__(self):
+        return self.message
+
+
+class ResultStore:
+    """
+    Thread-safe ring buffer holding the newest capacity log lines.
+
+    Each appended line gets the next sequence number; since(seq) returns
+    only the lines after seq, so a reader polling for updates copies just
+    the new ones. Older lines drop off the front. Every scan also has its
+    row in scan_logs, where the full history stays available
+    (DatabaseLogger.fetch_logs).
+    """
+
+    def __init__(self, capacity=10000):
+        self._records = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._next_seq = 1
+
+    @property
+    def capacity(self):
+        return self._records.maxlen
+
+    @property
+    def last_seq(self):
+        """Sequence number of the newest line, 0 if nothing was logged yet."""
+        return self._next_seq - 1
+
+    def append(self, message):
+        with self._lock:
+            record = LogRecord(self._next_seq, message)
+            self._next_seq += 1
+            self._records.append(record)
+        return record
+
+    def since(self, seq=0, limit=None):
+        """
+        Returns the records newer than seq, oldest first, at most limit of
+        them (the oldest ones if limited). Lines already evicted are skipped.
+        """
+        with self._lock:
+            if not self._records or seq >= self._records[-1].seq:
+                return []
+            start = max(0, seq - self._records[0].seq + 1)
+            stop = start + limit if limit is not None else None
+            return list(islice(self._records, start, stop))
+
+    def __iter__(self):
+        return iter(self.since(0))
+
+    def __len__(self):
+        return len(self._records)
+
+
+class ReportManager:
+    def __init__(self, capacity=10000, quarantine_dir="quarantine", metrics=None):
+        self.results = ResultStore(capacity)
+        self.quarantine = Quarantine(quarantine_dir, log=self.results.append, metrics=metrics)
+
+    def log_result(self, file_path, reasons, score=None):
+        """
+        Logs a flagged file and queues it for quarantine; the move itself
+        happens on the quarantine worker, see Quarantine.
+        """
+        timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+        log = f"[{timestamp}] {file_path} flagged: {' | '.join(reasons)}"
+        self.results.append(log)
+        self.quarantine.submit(file_path, reasons, score)
+
+    def close(self, timeout=None):
+        """
+        Finishes pending quarantine moves.
+        """
+        self.quarantine.close(timeout)
+
+    def get_results(self):
+        return [record.message for record in self.results]
+
+    def results_since(self, seq=0, limit=None):
+        """
+        Returns the LogRecords logged after seq; pass the last seen
+        record's seq to fetch only new lines.
+        """
+        return self.results.since(seq, limit)
+
+   
+    def export_report_pdf(self, export_path, db_logger=None, start=None, end=None,
+                          min_score=None, max_score=None, progress=None):
+        """
+        Exports a PDF report, written page by page in constant memory.
+
+        Args:
+            export_path (str): Path to save the PDF.
+            db_logger (DatabaseLogger): Report the scans stored there,
+                streamed in batches; without it the in-memory results are used.
+            start, end, min_score, max_score: Filters for the database
+                rows, see DatabaseLogger.iter_logs.
+            progress (callable): Called as progress(done, total) every 1000 lines.
+        Returns:
+            tuple: (bool success, str message)
+        """
+        # imported here so headless scanning never loads the PDF writer
+        from .pdf_report import PDFReportWriter
+
+        try:
+            if db_logger is not None:
+                total = db_logger.count_logs(start, end, min_score, max_score)
+                lines = (f"[{row[6]}] {row[1]} | Score: {row[2]} | Reasons: {row[5]}"
+                         for row in db_logger.iter_logs(start, end, min_score, max_score))
+            else:
+                entries = self.get_results()
+                total = len(entries)
+                lines = iter(entries)
+
+            with PDFReportWriter(export_path, "=== Smart File Behavior Analyzer Report ===",
+                                 f"Exported at: {time.strftime('%Y-%m-%d %H:%M:%S')}") as pdf:
+                for line in lines:
+                    pdf.add_line(line)
+                    if progress and pdf.lines_written % 1000 == 0:
+                        progress(pdf.lines_written, total)
+            if progress:
+                progress(pdf.lines_written, total)
+            return True, "PDF report exported successfully."
+        except Exception as e:
+            return False, f"Failed to export PDF report: {e}"
@@ -0,0 +1,280 @@
+"""
+Retention for the scan log database.
+
+Rows older than a maximum age, or beyond a maximum row count, are moved
+out of scan_logs into gzip-compressed JSON Lines files, one per batch and
+month (scan_logs-YYYY-MM-<first id>.jsonl.gz, by UTC scan time), which
+Retention.iter_archive reads back with the same filters as
+DatabaseLogger.iter_logs. The hourly and daily rollups are kept, so
+dashboards still cover archived months. Month files from earlier versions
+(scan_logs-YYYY-MM.jsonl.gz) are still read.
+"""
+import glob
+import gzip
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from .database import LOG_COLUMNS, MATCH_COLUMNS, to_epoch
+
+ARCHIVE_PATTERN = "scan_logs-*.jsonl.gz"
+
+
+def archive_name(scanned_at, first_id=None):
+    """
+    Returns:
+        str: Name of the archive file of the batch starting at row
+        first_id, for rows scanned at epoch scanned_at; without first_id,
+        that of the whole month as earlier versions wrote it.
+    """
+    month = archive_month(scanned_at)
+    if first_id is None:
+        return f"scan_logs-{month}.jsonl.gz"
+    return f"scan_logs-{month}-{first_id:012d}.jsonl.gz"
+
+
+def archive_month(scanned_at):
+    """
+    Returns:
+        str: "YYYY-MM" of epoch scanned_at, in UTC.
+    """
+    return time.strftime("%Y-%m", time.gmtime(scanned_at or 0))
+
+
+def _split_name(name):
+    # ("YYYY-MM", the rest) of an archive file name
+    start = len("scan_logs-")
+    return name[start:start + 7], name[start + 7:]
+
+
+def _sync_dir(path):
+    # Makes a rename in directory path durable, where the OS allows it
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Retention:
+    """
+    Age and row-count policy for scan_logs, applied in batches.
+
+    Each batch is one short transaction, so the logger's writer thread
+    waits for at most one batch. A batch's archive files are written
+    under a temporary name, synced and renamed before its rows are
+    deleted, so a crash never leaves a truncated archive behind, and a
+    batch interrupted before its rows were deleted is archived again on
+    the next run, under the same name. After
+    deleting, freed pages are returned to the filesystem by incremental
+    vacuum, a few pages per statement. That needs auto_vacuum=INCREMENTAL,
+    which DatabaseLogger sets on new databases; an older database keeps
+    reusing its free pages but only shrinks after a one-off
+    "PRAGMA auto_vacuum=INCREMENTAL; VACUUM".
+
+    Args:
+        max_age (float): Seconds a row is kept; None keeps rows forever.
+        max_rows (int): Rows kept at most, the newest; None for no limit.
+        archive_dir (str): Directory of the archive files; None
+            deletes expired rows without archiving them.
+        interval (float): Seconds between runs of the background thread.
+        batch_size (int): Rows archived and deleted per transaction.
+        vacuum_pages (int): Pages freed per incremental vacuum statement.
+    """
+
+    def __init__(self, max_age=None, max_rows=None, archive_dir=None, interval=3600.0, batch_size=5000,
+                 vacuum_pages=256):
+        self.max_age = max_age
+        self.max_rows = max_rows
+        self.archive_dir = archive_dir
+        self.interval = interval
+        self.batch_size = batch_size
+        self.vacuum_pages = vacuum_pages
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self, db_name, metrics=None):
+        """
+        Applies the policy every interval seconds on a daemon thread,
+        starting now, until stop().
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, args=(db_name, metrics), daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Stops the background thread after its current batch.
+        """
+        thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._stop.set()
+        thread.join(timeout)
+        if not thread.is_alive():
+            self._stop.clear()
+
+    def _loop(self, db_name, metrics):
+        while not self._stop.is_set():
+            try:
+                self.run(db_name, metrics)
+            except (sqlite3.Error, OSError) as e:
+                print(f"Log retention failed: {e}")
+            self._stop.wait(self.interval)
+
+    def run(self, db_name, metrics=None):
+        """
+        Archives and deletes every row outside the policy, then vacuums.
+
+        Args:
+            db_name (str): Scan log database.
+            metrics (Metrics): Counts the rows removed as logs_expired.
+        Returns:
+            int: Rows removed.
+        """
+        conn = sqlite3.connect(db_name, timeout=30)
+        try:
+            conn.execute("PRAGMA synchronous=NORMAL")
+            cutoff = self._cutoff(conn)
+            removed = 0
+            while cutoff is not None and not self._stop.is_set():
+                batch = self._expire_batch(conn, cutoff)
+                if not batch:
+                    break
+                removed += batch
+                if metrics is not None:
+                    metrics.incr("logs_expired", batch)
+            if removed:
+                self._vacuum(conn)
+            return removed
+        finally:
+            conn.close()
+
+    def _cutoff(self, conn):
+        # Highest id outside the policy, or None; ids grow with scan time,
+        # so everything up to it is expired
+        cutoffs = []
+        if self.max_age is not None:
+            row = conn.execute("SELECT MAX(id) FROM scan_logs WHERE scanned_at < ?",
+                               (time.time() - self.max_age,)).fetchone()
+            cutoffs.append(row[0])
+        if self.max_rows is not None:
+            row = conn.execute("SELECT id FROM scan_logs ORDER BY id DESC LIMIT 1 OFFSET ?",
+                               (self.max_rows,)).fetchone()
+            cutoffs.append(row[0] if row else None)
+        cutoffs = [cutoff for cutoff in cutoffs if cutoff is not None]
+        return max(cutoffs) if cutoffs else None
+
+    def _expire_batch(self, conn, cutoff):
+        rows = conn.execute(f"SELECT {', '.join(LOG_COLUMNS)} FROM scan_logs WHERE id <= ? ORDER BY id LIMIT ?",
+                            (cutoff, self.batch_size)).fetchall()
+        if not rows:
+            return 0
+        first, last = rows[0][0], rows[-1][0]
+        if self.archive_dir is not None:
+            matches = {}
+            for row in conn.execute(f"SELECT {', '.join(MATCH_COLUMNS)} FROM scan_matches "
+                                    "WHERE log_id BETWEEN ? AND ? ORDER BY rowid", (first, last)):
+                matches.setdefault(row[0], []).append(list(row[1:]))
+            self._archive(rows, matches)
+        with conn:
+            conn.execute("DELETE FROM scan_matches WHERE log_id BETWEEN ? AND ?", (first, last))
+            conn.execute("DELETE FROM scan_logs WHERE id BETWEEN ? AND ?", (first, last))
+        return len(rows)
+
+    def _archive(self, rows, matches):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        scanned_at = LOG_COLUMNS.index("scanned_at")
+        files = {}  # month: (file name, lines); named after the month's first row
+        for row in rows:
+            record = dict(zip(LOG_COLUMNS, row))
+            record["matches"] = matches.get(row[0], [])
+            month = archive_month(row[scanned_at])
+            if month not in files:
+                files[month] = (archive_name(row[scanned_at], row[0]), [])
+            files[month][1].append(json.dumps(record))
+        for name, lines in files.values():
+            path = os.path.join(self.archive_dir, name)
+            with open(path + ".tmp", "wb") as f:
+                with gzip.GzipFile(fileobj=f, mode="wb") as gz:
+                    gz.write(("\n".join(lines) + "\n").encode())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(path + ".tmp", path)
+        _sync_dir(self.archive_dir)
+
+    def _vacuum(self, conn):
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:  # not INCREMENTAL
+            return
+        while not self._stop.is_set() and conn.execute("PRAGMA freelist_count").fetchone()[0]:
+            conn.execute(f"PRAGMA incremental_vacuum({self.vacuum_pages})").fetchall()
+
+    def archive_files(self, start=None, end=None):
+        """
+        Returns:
+            list: Paths of the archive files, oldest first, that may hold
+            rows scanned between start and end.
+        """
+        if self.archive_dir is None:
+            return []
+        first = archive_month(to_epoch(start)) if start is not None else None
+        last = archive_month(to_epoch(end)) if end is not None else None
+        archives = []
+        for path in glob.glob(os.path.join(self.archive_dir, ARCHIVE_PATTERN)):
+            name = os.path.basename(path)
+            month, batch = _split_name(name)
+            if (first is None or month >= first) and (last is None or month <= last):
+                # an earlier version's month file holds the month's oldest rows
+                archives.append((month, batch != ".jsonl.gz", name, path))
+        return [path for *_, path in sorted(archives)]
+
+    def iter_archive(self, start=None, end=None, min_score=None, max_score=None, path=None, digest=None,
+                     extension=None, label=None, members=True):
+        """
+        Yields archived rows oldest first, reading only the months in
+        range, with the filters of DatabaseLogger.query.
+
+        Yields:
+            tuple: Values of LOG_COLUMNS.
+        """
+        start = to_epoch(start) if start is not None else None
+        end = to_epoch(end) if end is not None else None
+        extension = extension.lower() if extension is not None else None
+        month, seen = None, set()
+        for archive in self.archive_files(start, end):
+            # rows archived twice in a month, by an interrupted run before
+            # an upgrade or with another batch size, are read once
+            if _split_name(os.path.basename(archive))[0] != month:
+                month, seen = _split_name(os.path.basename(archive))[0], set()
+            with gzip.open(archive, "rt") as f:
+                for line in f:
+                    record = json.loads(line)
+                    if record["id"] in seen:
+                        continue
+                    seen.add(record["id"])
+                    scanned_at = record["scanned_at"]
+                    if start is not None and (scanned_at is None or scanned_at < start):
+                        continue
+                    if end is not None and (scanned_at is None or scanned_at >= end):
+                        continue
+                    if min_score is not None and (record["score"] or 0) < min_score:
+                        continue
+                    if max_score is not None and (record["score"] or 0) > max_score:
+                        continue
+                    if path is not None and record["path"] != path:
+                        continue
+                    if digest is not None and record["digest"] != digest:
+                        continue
+                    if extension is not None and record["extension"] != extension:
+                        continue
+                    if label is not None and all(match[0] != label for match in record["matches"]):
+                        continue
+                    if not members and record["parent_id"] is not None:
+                        continue
+                    yield tuple(record[column] for column in LOG_COLUMNS)
@@ -0,0 +1,406 @@
+"""
+Declarative scoring rules.
+
+A rule file, in JSON, TOML or YAML, holds the quarantine threshold, the
+matching options and a list of rules. Every rule whose conditions all
+hold adds its weight to a file's score:
+
+    {
+        "threshold": 4,
+        "options": {"case_insensitive": false, "utf16": false},
+        "rules": [
+            {"name": "bad_extension", "weight": 1, "extensions": [".exe", ".bat", ".js"],
+             "reason": "Bad file extension"},
+            {"name": "suspicious_strings", "weight": 2, "strings": ["powershell", {"hex": "4d5a9000"}],
+             "reason": "Suspicious strings: {found}"},
+            {"name": "encoded_command", "weight": 3, "extensions": [".bat", ".cmd"],
+             "regex": "powershell(\\\\.exe)?\\\\s+-e(nc|ncodedcommand)?\\\\s"}
+        ]
+    }
+
+Conditions:
+    extensions       the file name ends in one of these (any case)
+    strings          any of these occurs; {"hex": "..."} gives raw bytes
+    regex            a bytes regular expression matches; a match spanning
+                     two chunks is found if it is at most REGEX_OVERLAP long
+    entropy_above    whole-file entropy is above this (bits per byte)
+    entropy_at_most  whole-file entropy is at most this
+    high_blocks      at least this many blocks of the entropy profile are
+                     above the scanner's block_entropy_threshold
+    min_blocks       the entropy profile has at least this many blocks
+    low_variance_at_most
+                     the entropy of the other blocks, those at or below
+                     block_entropy_threshold, has at most this variance:
+                     the rest of the file is uniform, like text
+    archive_limit    true: the file is an archive that exceeded an
+                     unpacking limit (depth, members or expansion ratio)
+    archive_unreadable
+                     true: the file is an archive with members that could
+                     not be read, being encrypted or corrupt
+
+Entropy conditions never hold for archives, whose compressed bytes are
+random by nature; their members are scored instead, and an archive
+scores at least as high as its worst member. A file that starts like an
+archive but does not unpack is not one, and entropy conditions apply.
+
+A weight may be negative, for allowlist rules that lower the score of
+known-good files. Reading a file can only stop early while every rule
+that applies to it has a non-negative weight, so a file whose extension
+brings a negative rule into play is always read to the end.
+
+reason is a format string with the fields name, entropy, blocks,
+high_blocks, max_entropy, archive_limit, unreadable (the number of
+unreadable members) and found (the strings this
+rule matched); it defaults to the rule name. Regex rules with an
+optional cost are tried cheapest first.
+"""
+import hashlib
+import json
+import os
+import re
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+try:
+    import yaml
+except ImportError:  # PyYAML is optional, only YAML rule files need it
+    yaml = None
+
+from .matcher import Match, PatternMatcher
+
+DEFAULT_THRESHOLD = 4  # scores at or above this are flagged
+REGEX_OVERLAP = 4096  # bytes of the previous chunk a regex match may start in
+REGEX_LABEL = "re:"  # prefix of the labels regex rules record in ScanResult.matches
+LOW_VARIANCE = 0.25  # block entropy variance of text; executables are well above
+
+CONDITIONS = ("extensions", "strings", "regex", "entropy_above", "entropy_at_most", "high_blocks", "min_blocks",
+              "low_variance_at_most", "archive_limit", "archive_unreadable")
+ENTROPY_CONDITIONS = ("entropy_above", "entropy_at_most", "high_blocks", "min_blocks", "low_variance_at_most")
+
+
+class RuleError(ValueError):
+    """A rule file that cannot be loaded."""
+
+
+def default_rules(strings, extensions, entropy_threshold):
+    """
+    Returns:
+        dict: The rule file equivalent of the scanner's built-in heuristics.
+    """
+    return {
+        "threshold": DEFAULT_THRESHOLD,
+        "rules": [
+            {"name": "bad_extension", "weight": 1, "extensions": list(extensions),
+             "reason": "Bad file extension"},
+            {"name": "high_entropy", "weight": 2, "entropy_above": entropy_threshold,
+             "reason": "High entropy: {entropy:.2f}"},
+            # a packed payload inside an otherwise uniform file; executables
+            # mix code, tables and compressed sections, so their blocks vary
+            {"name": "high_entropy_blocks", "weight": 2, "entropy_at_most": entropy_threshold,
+             "min_blocks": 2, "high_blocks": 1, "low_variance_at_most": LOW_VARIANCE,
+             "reason": "High-entropy blocks: {high_blocks} of {blocks}, max {max_entropy:.2f}"},
+            {"name": "suspicious_strings", "weight": 2, "strings": list(strings),
+             "reason": "Suspicious strings: {found}"},
+            {"name": "archive_limit", "weight": 2, "archive_limit": True,
+             "reason": "Archive not fully unpacked: {archive_limit}"},
+            {"name": "archive_unreadable", "weight": 2, "archive_unreadable": True,
+             "reason": "Unreadable archive members: {unreadable}"},
+        ],
+    }
+
+
+def _pattern(name, item):
+    # (label, pattern) for one entry of a strings condition
+    if isinstance(item, str) and item:
+        return item, item
+    if isinstance(item, dict) and set(item) == {"hex"}:
+        try:
+            return "hex:" + item["hex"].lower(), bytes.fromhex(item["hex"])
+        except (AttributeError, ValueError):
+            pass
+    raise RuleError(f"Rule {name}: bad string pattern {item!r}")
+
+
+class Rule:
+    """
+    One compiled rule. Conditions are checked cheapest first: extension,
+    entropy profile, string matches, then regex.
+    """
+
+    def __init__(self, spec, case_insensitive=False):
+        if not isinstance(spec, dict) or not spec.get("name"):
+            raise RuleError(f"Every rule needs a name: {spec!r}")
+        self.name = str(spec["name"])
+        unknown = set(spec) - set(CONDITIONS) - {"name", "weight", "reason", "cost"}
+        if unknown:
+            raise RuleError(f"Rule {self.name}: unknown keys {', '.join(sorted(unknown))}")
+        if not any(key in spec for key in CONDITIONS):
+            raise RuleError(f"Rule {self.name}: no conditions")
+        self.weight = spec.get("weight", 1)
+        self.cost = spec.get("cost", 0)
+        for key in ("weight", "cost") + ENTROPY_CONDITIONS:
+            value = spec.get(key, 0)
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise RuleError(f"Rule {self.name}: {key} must be a number")
+        self.reason = str(spec.get("reason", self.name))
+
+        for key in ("extensions", "strings"):
+            if key in spec and not isinstance(spec[key], list):
+                raise RuleError(f"Rule {self.name}: {key} must be a list")
+        extensions = spec.get("extensions")
+        if extensions is not None and not all(isinstance(e, str) for e in extensions):
+            raise RuleError(f"Rule {self.name}: extensions must be strings")
+        if "regex" in spec and not isinstance(spec["regex"], str):
+            raise RuleError(f"Rule {self.name}: regex must be a string")
+        self.extensions = None if extensions is None else frozenset(e.lower() for e in extensions)
+        self.patterns = [_pattern(self.name, item) for item in spec.get("strings", [])]
+        self.labels = frozenset(label for label, _ in self.patterns)
+        self.regex = None
+        self.regex_label = REGEX_LABEL + self.name
+        if "regex" in spec:
+            try:
+                self.regex = re.compile(spec["regex"].encode(), re.IGNORECASE if case_insensitive else 0)
+            except re.error as e:
+                raise RuleError(f"Rule {self.name}: bad regex: {e}") from e
+        self.entropy = {key: spec[key] for key in ENTROPY_CONDITIONS if key in spec}
+        self.archive_limit = bool(spec.get("archive_limit", False))
+        self.archive_unreadable = bool(spec.get("archive_unreadable", False))
+
+        try:
+            self.describe_values(0.0, {"blocks": 0, "high_blocks": 0, "max": 0.0}, [])
+        except (KeyError, IndexError, ValueError) as e:
+            raise RuleError(f"Rule {self.name}: bad reason {self.reason!r}: {e}") from e
+
+    def holds(self, ext, labels, result=None):
+        """
+        Whether every condition holds for a file with extension ext whose
+        matches have the given labels. Entropy conditions need the final
+        result; without one, a rule that has any is never counted.
+        """
+        if self.extensions is not None and ext not in self.extensions:
+            return False
+        if self.entropy:
+            if result is None or result.container or not self._entropy_holds(result):
+                return False
+        if self.archive_limit and (result is None or not result.archive_limit):
+            return False
+        if self.archive_unreadable and (result is None or not result.unreadable):
+            return False
+        if self.labels and self.labels.isdisjoint(labels):
+            return False
+        return self.regex is None or self.regex_label in labels
+
+    def _entropy_holds(self, result):
+        entropy = self.entropy
+        profile = result.profile or {}
+        if "entropy_above" in entropy and not result.entropy > entropy["entropy_above"]:
+            return False
+        if "entropy_at_most" in entropy and not result.entropy <= entropy["entropy_at_most"]:
+            return False
+        if profile.get("blocks", 0) < entropy.get("min_blocks", 0):
+            return False
+        if profile.get("low_variance", 0.0) > entropy.get("low_variance_at_most", float("inf")):
+            return False
+        return profile.get("high_blocks", 0) >= entropy.get("high_blocks", 0)
+
+    def describe(self, result):
+        found = [label for label in result.found if label in self.labels or label == self.regex_label]
+        return self.describe_values(result.entropy, result.profile or {}, found, result.archive_limit,
+                                    result.unreadable)
+
+    def describe_values(self, entropy, profile, found, archive_limit=None, unreadable=0):
+        return self.reason.format(name=self.name, entropy=entropy, blocks=profile.get("blocks", 0),
+                                  high_blocks=profile.get("high_blocks", 0), max_entropy=profile.get("max", 0.0),
+                                  found=", ".join(found), archive_limit=archive_limit or "", unreadable=unreadable)
+
+
+class RuleSet:
+    """
+    Rules compiled into an evaluation plan.
+
+    The strings of every rule go into one PatternMatcher, so the file is
+    matched in a single pass however many rules there are. While a file
+    is read, a RuleStream keeps the running total of the rules already
+    certain to hold and the scanner stops reading once it reaches the
+    threshold, see HeuristicScanner.scan_file.
+
+    Args:
+        spec (dict): Parsed rule file, see the module docstring.
+        source (str): Where the rules were loaded from, for messages.
+        case_insensitive, utf16 (bool): Matching options, unless the
+            rule file sets them.
+    """
+
+    def __init__(self, spec, source=None, case_insensitive=False, utf16=False):
+        if not isinstance(spec, dict) or not isinstance(spec.get("rules"), list):
+            raise RuleError("A rule file needs a list of rules")
+        options = spec.get("options") or {}
+        if not isinstance(options, dict):
+            raise RuleError("options must be a table of matching options")
+        self.source = source
+        self.case_insensitive = bool(options.get("case_insensitive", case_insensitive))
+        self.utf16 = bool(options.get("utf16", utf16))
+        self.threshold = spec.get("threshold", DEFAULT_THRESHOLD)
+        if isinstance(self.threshold, bool) or not isinstance(self.threshold, (int, float)):
+            raise RuleError("threshold must be a number")
+
+        self.rules = [Rule(rule, self.case_insensitive) for rule in spec["rules"]]  # reasons follow this order
+        names = [rule.name for rule in self.rules]
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            raise RuleError(f"Duplicate rule names: {', '.join(duplicates)}")
+        self.matcher = PatternMatcher([p for rule in self.rules for p in rule.patterns],
+                                      self.case_insensitive, self.utf16)
+        self.regex_rules = sorted((rule for rule in self.rules if rule.regex is not None), key=lambda r: r.cost)
+
+        canonical = json.dumps([spec["rules"], self.threshold, self.case_insensitive, self.utf16],
+                               sort_keys=True, default=str)
+        self.fingerprint = hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest()
+
+    @classmethod
+    def load(cls, path, case_insensitive=False, utf16=False):
+        """
+        Loads a rule file; the format follows the extension (.toml,
+        .yaml/.yml, anything else is JSON).
+
+        Raises:
+            RuleError: The file cannot be parsed or holds invalid rules.
+            OSError: The file cannot be read.
+        """
+        ext = os.path.splitext(path)[1].lower()
+        with open(path, 'rb') as f:
+            data = f.read()
+        if ext == ".toml" and tomllib is None:
+            raise RuleError(f"{path}: TOML rule files need Python 3.11 or the tomli package")
+        if ext in (".yaml", ".yml") and yaml is None:
+            raise RuleError(f"{path}: YAML rule files need the PyYAML package")
+        try:
+            if ext == ".toml":
+                spec = tomllib.loads(data.decode("utf-8"))
+            elif ext in (".yaml", ".yml"):
+                spec = yaml.safe_load(data)
+            else:
+                spec = json.loads(data)
+        except Exception as e:
+            raise RuleError(f"{path}: {e}") from e
+        try:
+            return cls(spec, path, case_insensitive, utf16)
+        except RuleError as e:
+            raise RuleError(f"{path}: {e}") from e
+
+    def stream(self, path, threshold=None):
+        """
+        Returns a RuleStream for one file, stopping at threshold (by
+        default the rule file's).
+        """
+        return RuleStream(self, path, self.threshold if threshold is None else threshold)
+
+    def evaluate(self, result):
+        """
+        Scores a result from its path, entropy profile and matches, and
+        lists the reason of every rule that holds. If the scan stopped
+        early (result.partial), rules on entropy are not counted. An
+        archive takes the score of its worst member if that is higher.
+        """
+        result.score = 0
+        result.reasons = []
+        result.found = [m.label for m in result.matches]
+        ext = os.path.splitext(result.path)[1].lower()
+        labels = set(result.found)
+        complete = None if result.partial else result
+        for rule in self.rules:
+            if rule.holds(ext, labels, complete):
+                result.score += rule.weight
+                result.reasons.append(rule.describe(result))
+        if result.members:
+            worst = max(result.members, key=lambda member: member.score)
+            if worst.score > result.score:
+                result.score = worst.score
+                result.reasons.append(f"Archive member {worst.member}: " + ", ".join(worst.reasons))
+
+
+class RuleStream:
+    """
+    Matching state for one file while it is read: the shared string
+    matcher plus the regexes of rules its extension does not rule out.
+
+    feed() returns True once the rules certain to hold, whatever the
+    rest of the file holds, add up to the threshold. That is never the
+    case while a rule with a negative weight applies: it could still
+    match later in the file and lower the score. Regexes are tried
+    cheapest first and each one stops being searched after its first
+    match.
+    """
+
+    def __init__(self, ruleset, path, threshold):
+        self.ruleset = ruleset
+        self.threshold = threshold
+        self.ext = os.path.splitext(path)[1].lower()
+        self.rules = [rule for rule in ruleset.rules if rule.extensions is None or self.ext in rule.extensions]
+        self.can_stop = all(rule.weight >= 0 for rule in self.rules)
+        self.strings = ruleset.matcher.stream()
+        self._regexes = [rule for rule in ruleset.regex_rules if rule in self.rules]
+        self._regex_hits = []
+        self._string_hits = 0
+        self._labels = set()
+        self._tail = b""
+
+    def score(self):
+        """
+        Total weight of the rules certain to hold.
+        """
+        return sum(rule.weight for rule in self.rules if rule.holds(self.ext, self._labels))
+
+    def reached(self):
+        return self.can_stop and self.score() >= self.threshold
+
+    def feed(self, data, start=0, end=None):
+        """
+        Matches data[start:end], the next bytes of the file; see
+        MatchStream.feed.
+        """
+        if end is None:
+            end = len(data)
+        if not hasattr(data, "find"):
+            data, start, end = bytes(data[start:end]), 0, end - start  # a memoryview
+        position = self.strings.position
+        self.strings.feed(data, start, end)
+        hits = self.strings.matches()
+        changed = len(hits) != self._string_hits
+        if changed:
+            self._string_hits = len(hits)
+            self._labels.update(m.label for m in hits)
+        if self._regexes:
+            changed = self._feed_regexes(data, start, end, position) or changed
+        return changed and self.reached()
+
+    def _feed_regexes(self, data, start, end, position):
+        tail = self._tail
+        boundary = tail + data[start:min(end, start + REGEX_OVERLAP)] if tail else None
+        hit = False
+        for rule in list(self._regexes):
+            match, offset = None, position
+            if boundary is not None:
+                match, offset = rule.regex.search(boundary), position - len(tail)
+            if match is None:
+                match, offset = rule.regex.search(data, start, end), position - start
+            if match is None:
+                continue
+            self._regexes.remove(rule)
+            found = Match(rule.regex_label, offset + match.start())
+            found.count = 1
+            self._regex_hits.append(found)
+            self._labels.add(rule.regex_label)
+            hit = True
+            if self.reached():
+                break  # the remaining, costlier regexes cannot change the verdict
+        self._tail = (tail + data[max(start, end - REGEX_OVERLAP):end])[-REGEX_OVERLAP:]
+        return hit
+
+    def matches(self):
+        return self.strings.matches() + self._regex_hits
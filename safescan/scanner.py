@@ -0,0 +1,403 @@
+import io
+import os
+import hashlib
+import mmap
+import time
+from collections import Counter
+from contextlib import nullcontext
+from .archive import MAX_DEPTH, MAX_MEMBERS, MAX_RATIO, scan_archive
+from .cache import new_hasher
+from .entropy import BLOCK_SIZE, HIGH_ENTROPY, ByteHistogram, EntropyProfile, shannon_entropy
+from .matcher import Match
+from .rules import RuleError, RuleSet, default_rules
+
+
+CHUNK_SIZE = 1024 * 1024  # bytes read per chunk by the streaming scan
+SCANNER_VERSION = 4  # bump when scanning logic changes so cached verdicts are dropped
+MMAP_THRESHOLD = 64 * 1024 * 1024  # larger files are memory-mapped instead of read
+WINDOW_SIZE = 1024 * 1024  # bytes fed per step from a mapped file
+
+
+class ScanResult:
+    """
+    Outcome of scanning one file: everything process_queue and the
+    database logger need, gathered in a single read of the file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.size = 0
+        self.entropy = 0
+        self.found = []
+        self.matches = []
+        self.score = 0
+        self.reasons = []
+        self.error = None
+        self.digest = None
+        self.inode = None
+        self.mtime_ns = None
+        # per-block entropy summary (see EntropyProfile.summary) and the
+        # (offset, length, entropy) of the most random blocks, highest first
+        self.profile = None
+        self.hot_regions = []
+        # seconds spent per stage: read, entropy, strings, hash, and scan
+        # for the whole call including cache lookups
+        self.timings = {}
+        # None for a fresh scan, "file" if the path was unchanged since it
+        # was scanned, "content" if the same bytes were scanned under another name
+        self.cached = None
+        # True if reading stopped once the score reached the quarantine
+        # score: size is the file's, but entropy and profile cover only
+        # what was read, and there is no digest
+        self.partial = False
+        # for archives: "zip", "tar", "gzip", "bz2" or "xz", the results of
+        # the members, the unpacking limit hit, if any, and the number of
+        # members that could not be read (encrypted or corrupt)
+        self.container = None
+        self.members = []
+        self.archive_limit = None
+        self.unreadable = 0
+        # for an archive member: its name inside the archive
+        self.member = None
+
+
+class HeuristicScanner:
+    """
+    Scores files with a RuleSet: the built-in heuristics below, or the
+    rule file at rules_path, which is reloaded when it changes (checked
+    at most every reload_interval seconds).
+
+    Raises:
+        RuleError: rules_path cannot be loaded.
+    """
+
+    def __init__(self, case_insensitive=False, utf16=False, rules_path=None):
+        self.suspicious_strings = ["powershell", "cmd.exe", "eval", "exec"]
+        self.bad_ext = [".exe", ".bat", ".js"]
+        self.entropy_threshold = 7.5
+        self.block_size = BLOCK_SIZE  # bytes per block of the entropy profile
+        self.block_entropy_threshold = HIGH_ENTROPY
+        self.quarantine_score = 4  # scores at or above this are flagged
+        self.mmap_threshold = MMAP_THRESHOLD  # None disables memory mapping
+        self.window_size = WINDOW_SIZE
+        self.case_insensitive = case_insensitive
+        self.utf16 = utf16
+        self.early_exit = True  # stop reading a file once its score reaches quarantine_score
+        self.scan_archives = True  # score the members of zip/tar/gzip/bz2/xz files, see scan_archive
+        self.archive_depth = MAX_DEPTH
+        self.archive_members = MAX_MEMBERS
+        self.archive_ratio = MAX_RATIO
+        self.archive_workers = 4
+        self.rules_path = rules_path
+        self.reload_interval = 1.0
+        self._rules = None  # (key, RuleSet)
+        self._rules_checked = 0.0
+        if rules_path is not None:
+            self.reload_rules()
+
+    @property
+    def rules(self):
+        """
+        The compiled RuleSet. Without a rules file it is built from
+        suspicious_strings, bad_ext and entropy_threshold, and rebuilt
+        whenever they or the matching options change.
+        """
+        if self.rules_path is not None:
+            if time.monotonic() - self._rules_checked >= self.reload_interval:
+                self.reload_rules()
+            return self._rules[1]
+        key = (tuple(self.suspicious_strings), tuple(self.bad_ext), self.entropy_threshold,
+               self.case_insensitive, self.utf16)
+        if self._rules is None or self._rules[0] != key:
+            spec = default_rules(self.suspicious_strings, self.bad_ext, self.entropy_threshold)
+            self._rules = (key, RuleSet(spec, None, self.case_insensitive, self.utf16))
+        return self._rules[1]
+
+    def reload_rules(self):
+        """
+        Loads rules_path if it changed since it was last loaded, and
+        takes quarantine_score from it. If the new file is invalid, the
+        error is printed and the rules in use are kept until it changes
+        again.
+
+        Returns:
+            bool: True if new rules were loaded.
+        """
+        self._rules_checked = time.monotonic()
+        loaded = self._rules is not None
+        try:
+            st = os.stat(self.rules_path)
+            key = (st.st_mtime_ns, st.st_size)
+            if loaded and self._rules[0] == key:
+                return False
+            rules = RuleSet.load(self.rules_path, self.case_insensitive, self.utf16)
+        except (OSError, RuleError) as e:
+            if not loaded:
+                raise RuleError(f"Cannot load rules: {e}") from e
+            if self._rules[0] != "failed":
+                print(f"Keeping the current rules, cannot reload {self.rules_path}: {e}")
+                self._rules = ("failed", self._rules[1])
+            return False
+        self._rules = (key, rules)
+        self.quarantine_score = rules.threshold
+        if loaded:
+            print(f"Reloaded rules from {self.rules_path}")
+        return True
+
+    @property
+    def matcher(self):
+        """
+        The PatternMatcher shared by the strings of every rule.
+        """
+        return self.rules.matcher
+
+    def rules_fingerprint(self):
+        """
+        Short hash of everything that decides a verdict; cached results
+        carrying a different fingerprint are not reused.
+        """
+        config = repr((SCANNER_VERSION, self.rules.fingerprint, self.block_size, self.block_entropy_threshold))
+        return hashlib.blake2b(config.encode(), digest_size=16).hexdigest()
+
+    @staticmethod
+    def check_entropy(data):
+        if not data:
+            return 0
+        if isinstance(data, str):
+            # text is measured per character, as it always has been
+            return shannon_entropy(Counter(data).values(), len(data))
+        return ByteHistogram.from_bytes(data).entropy()
+
+    def check_strings(self, data):
+        if isinstance(data, str):
+            data = data.encode(errors='ignore')
+        return self.matcher.found(data)
+
+    def scan_file(self, file_path, chunk_size=CHUNK_SIZE):
+        """
+        Scans a file in a single pass of fixed-size chunks.
+
+        The entropy profile and string matches are built incrementally, so
+        memory use is bounded by chunk_size regardless of file size.
+        Keywords spanning a chunk boundary are still found, see MatchStream.
+        Files larger than mmap_threshold are memory-mapped instead, see
+        _scan_mapped. With early_exit, reading stops as soon as the rules
+        already matched reach quarantine_score, see ScanResult.partial.
+
+        Returns:
+            ScanResult: score, reasons, entropy and found strings.
+        """
+        safe_path = os.path.abspath(file_path)
+        try:
+            size = os.path.getsize(safe_path)
+        except OSError:
+            size = 0  # let open() report the problem
+        mapped = self.mmap_threshold is not None and size > self.mmap_threshold
+        return self._scan(safe_path, lambda: open(safe_path, 'rb'), size, chunk_size, mapped)
+
+    def scan_stream(self, f, name, size=0, chunk_size=CHUNK_SIZE):
+        """
+        Scans a readable binary stream, such as an archive member, like a
+        file. The stream is not closed.
+
+        Args:
+            name (str): Path reported in the result; extension rules
+                look at it.
+            size (int): Full size, if known, reported when the scan stops
+                early.
+        """
+        return self._scan(name, lambda: nullcontext(f), size, chunk_size, False)
+
+    def _scan(self, path, open_file, size, chunk_size, mapped, digest=None):
+        # digest, if given, is that of the bytes open_file yields, which
+        # are then not hashed again
+        result = ScanResult(path)
+        profile = EntropyProfile(self.block_size, self.block_entropy_threshold)
+        stream = self.rules.stream(path, self.quarantine_score)
+        hasher = new_hasher() if digest is None else None
+        timings = result.timings
+        timings.update(read=0.0, entropy=0.0, strings=0.0, hash=0.0)
+        clock = time.perf_counter
+        try:
+            with open_file() as f:
+                if self.early_exit and stream.reached():
+                    result.partial = True  # the file name alone is enough
+                elif mapped:
+                    self._scan_mapped(f, result, profile, stream, hasher)
+                else:
+                    while True:
+                        started = clock()
+                        chunk = f.read(chunk_size)
+                        read_done = clock()
+                        timings['read'] += read_done - started
+                        if not chunk:
+                            break
+                        result.size += len(chunk)
+                        profile.update(chunk)
+                        entropy_done = clock()
+                        reached = stream.feed(chunk)
+                        strings_done = clock()
+                        if hasher is not None:
+                            hasher.update(chunk)
+                        timings['entropy'] += entropy_done - read_done
+                        timings['strings'] += strings_done - entropy_done
+                        timings['hash'] += clock() - strings_done
+                        if reached and self.early_exit:
+                            result.partial = True
+                            break
+        except Exception as e:
+            result.error = e
+            result.reasons.append(f"Error scanning: {e}")
+            return result
+
+        if result.partial:
+            result.size = max(result.size, size)
+        else:
+            result.digest = digest or hasher.hexdigest()
+        profile.finish()
+        result.entropy = profile.histogram.entropy()
+        result.profile = profile.summary()
+        result.hot_regions = profile.hot_regions()
+        result.matches = stream.matches()
+        self.evaluate(result)
+        return result
+
+    def _scan_mapped(self, f, result, profile, stream, hasher):
+        # Scans a memory-mapped file through memoryview windows: each
+        # window goes through the profile, the hash and the matcher while
+        # it is still in the CPU cache (the matcher searches the same bytes
+        # through the mmap, which find() and re accept with bounds, so no
+        # window is copied), and the matcher carries its state
+        # from one window to the next, so the file is read once. Page
+        # faults are timed as part of the profile, the stage that touches
+        # a page first; there is no separate read.
+        timings = result.timings
+        clock = time.perf_counter
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            result.size = len(mm)
+            view = memoryview(mm)
+            try:
+                for offset in range(0, len(mm), self.window_size):
+                    window = view[offset:offset + self.window_size]
+                    started = clock()
+                    profile.update(window)
+                    entropy_done = clock()
+                    hasher.update(window)
+                    hash_done = clock()
+                    reached = stream.feed(mm, offset, offset + len(window))
+                    timings['entropy'] += entropy_done - started
+                    timings['hash'] += hash_done - entropy_done
+                    timings['strings'] += clock() - hash_done
+                    window.release()
+                    if reached and self.early_exit:
+                        result.partial = True
+                        break
+            finally:
+                view.release()
+
+    def evaluate(self, result):
+        """
+        Scores a result from its extension, entropy and matches, see
+        RuleSet.evaluate.
+
+        With the built-in rules, a file whose overall entropy is
+        unremarkable still scores for entropy if any of its blocks looks
+        compressed or encrypted, which is how a small packed payload
+        inside a large file shows up.
+        """
+        self.rules.evaluate(result)
+
+    def scan(self, file_path, cache=None):
+        """
+        Scans a file, reusing a cached verdict where possible.
+
+        A path whose inode, size and mtime are unchanged is answered from
+        the cache without reading it. Otherwise files up to
+        cache.prehash_limit are read into memory and hashed, so content
+        already scanned under another name is not rescanned, and on a
+        miss the same bytes are scanned without hashing them again;
+        larger files go straight to the single-pass scan, which computes
+        the digest as it reads. Either way the file is read once.
+
+        The file is stat'ed before it is read, so result.inode and
+        result.mtime_ns describe the state that was scanned.
+
+        Archives are unpacked and their members scanned too, unless the
+        archive alone already reached quarantine_score. Their verdicts
+        are not cached.
+
+        Returns:
+            ScanResult: result.cached tells whether it came from the cache.
+        """
+        started = time.perf_counter()
+        safe_path = os.path.abspath(file_path)
+        try:
+            st = os.stat(safe_path)
+        except OSError:
+            st = None  # scan_file reports the error
+        entry = None
+        data = None
+        if cache is not None and st is not None:
+            rules = self.rules_fingerprint()
+            try:
+                cached, entry = "file", cache.lookup_file(safe_path, st, rules)
+                if entry is None and st.st_size <= cache.prehash_limit:
+                    read_started = time.perf_counter()
+                    with open(safe_path, 'rb') as f:
+                        data = f.read()
+                    hash_started = time.perf_counter()
+                    hasher = new_hasher()
+                    hasher.update(data)
+                    digest = hasher.hexdigest()
+                    prehash = {'read': hash_started - read_started, 'hash': time.perf_counter() - hash_started}
+                    cached, entry = "content", cache.lookup_digest(digest, rules)
+            except OSError:
+                entry = None
+
+        if entry is None:
+            if data is not None:
+                result = self._scan(safe_path, lambda: io.BytesIO(data), len(data), CHUNK_SIZE, False, digest)
+                for stage, seconds in prehash.items():
+                    result.timings[stage] += seconds
+            else:
+                result = self.scan_file(safe_path)
+            if self.scan_archives and result.error is None and result.score < self.quarantine_score:
+                scan_archive(self, result)
+        else:
+            result = ScanResult(safe_path)
+            result.cached = cached
+            result.digest = entry['digest']
+            result.size = entry['size']
+            result.entropy = entry['entropy']
+            result.profile = entry['profile']
+            result.matches = []
+            for label, offset, count in entry['matches']:
+                match = Match(label, offset)
+                match.count = count
+                result.matches.append(match)
+            self.evaluate(result)
+        if st is not None:
+            result.inode = st.st_ino
+            result.mtime_ns = st.st_mtime_ns
+        result.timings['scan'] = time.perf_counter() - started
+        return result
+
+    def risk_score(self, file_path):
+        result = self.scan_file(file_path)
+        return result.score, result.reasons
+
+
+# Per-process scanner and cache for worker pools, set by init_worker
+# so they are pickled once per worker instead of once per file.
+_worker_scanner = None
+_worker_cache = None
+
+
+def init_worker(scanner, cache):
+    global _worker_scanner, _worker_cache
+    _worker_scanner = scanner
+    _worker_cache = cache
+
+
+def scan_in_worker(file_path):
+    return _worker_scanner.scan(file_path, _worker_cache)
@@ -0,0 +1,215 @@
+import heapq
+import itertools
+import os
+import time
+from queue import Queue
+
+SIZE_RATE = 50 * 1024 * 1024  # bytes of file size that count as one second of waiting in ScanQueue
+
+
+class _Pending:
+    __slots__ = ("first_seen", "due", "state", "stable_since", "closed", "st", "seq")
+
+    def __init__(self, now, st, closed, seq):
+        self.seq = seq
+        self.first_seen = now
+        self.due = now
+        self.state = (st.st_size, st.st_mtime_ns)
+        self.stable_since = now
+        self.closed = closed
+        self.st = st
+
+
+class Debouncer:
+    """
+    Holds watcher events back until the file they are about has stopped
+    changing, so a file is not scanned halfway through a copy.
+
+    A file is released once its size and mtime have stayed the same for
+    quiet seconds, checked with one stat per file every quiet seconds.
+    A close-write or move-in event (closed=True) is trusted: the file is
+    released after coalesce seconds unless it changed again meanwhile.
+    Events for a path already pending are merged into one, and a file
+    modified more than quiet seconds ago is taken as stable right away.
+    A file that never settles, such as a growing log, is released after
+    max_wait seconds anyway.
+
+    Args:
+        quiet (float): Seconds without a change that make a file stable.
+        coalesce (float): Delay after a close-write event, so a burst of
+            events for one file ends in one scan.
+        max_wait (float): Longest a file is held back; None waits forever.
+        metrics (Metrics): Counts merged events as events_coalesced.
+    """
+
+    def __init__(self, quiet=2.0, coalesce=0.25, max_wait=600.0, metrics=None):
+        self.quiet = quiet
+        self.coalesce = coalesce
+        self.max_wait = max_wait
+        self.metrics = metrics
+        self._pending = {}  # oldest first
+        self._heap = []  # (due, path); stale when the path's due changed since
+        self._added = 0
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, path, closed=False, st=None):
+        """
+        Records an event for path.
+
+        Args:
+            closed (bool): The writer has closed the file, or it was
+                moved in complete.
+            st (os.stat_result): A fresh stat of path, if there is one.
+        """
+        now = time.monotonic()
+        entry = self._pending.get(path)
+        if entry is not None:
+            if self.metrics is not None:
+                self.metrics.incr("events_coalesced")
+            if closed:
+                entry.closed = True
+                self._schedule(path, entry, now + self.coalesce)
+            return
+        try:
+            st = st or os.stat(path)
+        except OSError:
+            return  # gone already
+        entry = self._pending[path] = _Pending(now, st, closed, self._added)
+        self._added += 1
+        if closed:
+            due = now + self.coalesce
+        elif time.time() - st.st_mtime_ns / 1e9 >= self.quiet:
+            entry.closed = True  # nothing has written to it for a while
+            due = now
+        else:
+            due = now + self.quiet
+        self._schedule(path, entry, due)
+
+    def checkpoint(self):
+        """
+        Returns:
+            int: A token for passed().
+        """
+        return self._added
+
+    def passed(self, token):
+        """
+        Returns:
+            bool: True once every file pending when checkpoint() returned
+            token has been released or dropped.
+        """
+        for entry in self._pending.values():
+            return entry.seq >= token
+        return True
+
+    def _schedule(self, path, entry, due):
+        entry.due = due
+        heapq.heappush(self._heap, (due, path))
+
+    def next_due(self):
+        """
+        Returns:
+            float: Seconds until the next file may be released, or None
+            if nothing is pending.
+        """
+        while self._heap:
+            due, path = self._heap[0]
+            entry = self._pending.get(path)
+            if entry is not None and entry.due == due:
+                return max(0.0, due - time.monotonic())
+            heapq.heappop(self._heap)
+        return None
+
+    def ready(self):
+        """
+        Stats the files whose check is due and releases the stable ones.
+
+        Returns:
+            list: (path, stat) of the released files, smallest first.
+        """
+        now = time.monotonic()
+        released = []
+        while self._heap and self._heap[0][0] <= now:
+            due, path = heapq.heappop(self._heap)
+            entry = self._pending.get(path)
+            if entry is None or entry.due != due:
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                del self._pending[path]  # deleted or moved away while settling
+                continue
+            state = (st.st_size, st.st_mtime_ns)
+            if state != entry.state:
+                # still being written: wait for it to settle, or for the next close
+                entry.state = state
+                entry.stable_since = now
+                entry.closed = False
+            entry.st = st
+            stable = entry.closed or now - entry.stable_since >= self.quiet
+            if stable or (self.max_wait is not None and now - entry.first_seen >= self.max_wait):
+                del self._pending[path]
+                released.append((path, st))
+            else:
+                self._schedule(path, entry, entry.stable_since + self.quiet)
+        released.sort(key=lambda item: item[1].st_size)
+        return released
+
+    def flush(self):
+        """
+        Releases every pending file as it is now, smallest first.
+        """
+        released = [(path, entry.st) for path, entry in self._pending.items()]
+        self._pending.clear()
+        self._heap = []
+        released.sort(key=lambda item: item[1].st_size)
+        return released
+
+
+class ScanQueue(Queue):
+    """
+    Queue of paths to scan that hands out small files first.
+
+    A path is ordered by the time it was queued plus its size divided by
+    size_rate, so small files overtake large ones queued shortly before
+    them, while a large file is never held back more than size /
+    size_rate seconds by a steady stream of small ones. Anything that is
+    not a path, such as a shutdown sentinel, goes after every file.
+    """
+
+    def __init__(self, maxsize=0, size_rate=SIZE_RATE):
+        self.size_rate = size_rate
+        self._counter = itertools.count()
+        super().__init__(maxsize)
+
+    def put(self, item, block=True, timeout=None, size=None):
+        if isinstance(item, str):
+            if size is None:
+                try:
+                    size = os.path.getsize(item)
+                except OSError:
+                    size = 0
+            priority = time.monotonic() + size / self.size_rate
+        else:
+            priority = float("inf")
+        super().put((priority, next(self._counter), item), block, timeout)
+
+    def _init(self, maxsize):
+        self._heap = []
+
+    def _qsize(self):
+        return len(self._heap)
+
+    def _put(self, entry):
+        heapq.heappush(self._heap, entry)
+
+    def _get(self):
+        return heapq.heappop(self._heap)[2]
+
+    @property
+    def queue(self):
+        """The queued items, next first."""
+        with self.mutex:
+            return [entry[2] for entry in sorted(self._heap)]
@@ -0,0 +1,202 @@
+import os
+import sqlite3
+import threading
+import time
+
+
+class SeenIndex:
+    """
+    Persistent record of the files a monitor has scanned, kept in the
+    scan_logs database as one (path, inode, size, mtime_ns) row per file.
+
+    On start, reconcile() compares a listing of the watched folder with
+    the index: files that are new or modified in place are returned for
+    scanning, rows of deleted files are dropped, and a file whose inode,
+    size and mtime match the row of a path that disappeared is taken to
+    be renamed, so its row moves instead of the file being rescanned.
+    While running, check() applies the same rules to each watcher event
+    and forget() drops deleted paths. Nothing is held in memory besides
+    the marks not yet committed, so millions of churned files cost disk
+    space only.
+
+    mark() is meant for the single result writer and commits in batches
+    of commit_every rows or every commit_interval seconds; lookups may
+    run on any thread (each gets its own connection), and commit the
+    pending marks first, so a file scanned just before a quiet spell is
+    still recognised when it is renamed.
+    """
+
+    def __init__(self, db_name="scan_logs.db", commit_every=500, commit_interval=1.0):
+        self.db_name = db_name
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+        self._local = threading.local()
+        self._marks = []
+        self._marks_lock = threading.Lock()
+        self._last_commit = time.monotonic()
+        conn = self._conn()
+        with conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS seen_files (
+                    path TEXT PRIMARY KEY,
+                    inode INTEGER,
+                    size INTEGER,
+                    mtime_ns INTEGER
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_seen_files_inode ON seen_files (inode)")
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_name, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def mark(self, path, inode, size, mtime_ns):
+        """
+        Records that path was scanned in this state.
+        """
+        with self._marks_lock:
+            self._marks.append((path, inode, size, mtime_ns))
+            due = (len(self._marks) >= self.commit_every
+                   or time.monotonic() - self._last_commit >= self.commit_interval)
+        if due:
+            self.flush()
+
+    def flush(self):
+        """
+        Commits the pending marks.
+        """
+        with self._marks_lock:
+            marks, self._marks = self._marks, []
+            self._last_commit = time.monotonic()
+        if not marks:
+            return
+        conn = self._conn()
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO seen_files (path, inode, size, mtime_ns) VALUES (?, ?, ?, ?)",
+                             marks)
+
+    def check(self, path, st=None):
+        """
+        Decides whether a file reported by the watcher needs scanning.
+
+        Returns:
+            bool: False if path is indexed in its current state, or was
+            renamed from an indexed path that no longer exists (the row is
+            moved to the new name); True otherwise.
+        """
+        try:
+            st = st or os.stat(path)
+        except OSError:
+            return False  # gone already
+        state = (st.st_ino, st.st_size, st.st_mtime_ns)
+        if self._marks:
+            self.flush()
+        conn = self._conn()
+        row = conn.execute("SELECT inode, size, mtime_ns FROM seen_files WHERE path = ?", (path,)).fetchone()
+        if row == state:
+            return False
+        if row is None:
+            candidates = conn.execute("SELECT path FROM seen_files WHERE inode = ? AND size = ? AND mtime_ns = ?",
+                                      state).fetchall()
+            for (old_path,) in candidates:
+                if not os.path.lexists(old_path):
+                    with conn:
+                        conn.execute("UPDATE seen_files SET path = ? WHERE path = ?", (path, old_path))
+                    return False
+        return True
+
+    def forget(self, paths):
+        """
+        Drops the rows of deleted files, and of every file below a
+        deleted directory.
+        """
+        if not paths:
+            return
+        self.flush()  # a pending mark must not bring a forgotten row back
+        conn = self._conn()
+        with conn:
+            for path in paths:
+                prefix = os.path.join(path, "")
+                conn.execute("DELETE FROM seen_files WHERE path = ? OR substr(path, 1, ?) = ?",
+                             (path, len(prefix), prefix))
+
+    def reconcile(self, root, paths, recursive=False):
+        """
+        Brings the index in line with a fresh listing of root.
+
+        Args:
+            root (str): The watched folder.
+            paths (iterable): Absolute paths of the files now under root.
+            recursive (bool): Whether paths covers subdirectories; if not,
+                rows of files in subdirectories are left alone.
+        Returns:
+            list: Paths that are new or changed since they were scanned.
+        """
+        self.flush()
+        prefix = os.path.join(os.path.abspath(root), "")
+        scope = {"n": len(prefix), "prefix": prefix, "sep": os.sep}
+
+        def in_scope(column):
+            # SQL condition: column is a path under root (directly, unless recursive)
+            condition = f"substr({column}, 1, :n) = :prefix"
+            if not recursive:
+                condition += f" AND instr(substr({column}, :n + 1), :sep) = 0"
+            return condition
+
+        def listing():
+            for path in paths:
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield path, st.st_ino, st.st_size, st.st_mtime_ns
+
+        conn = self._conn()
+        with conn:
+            conn.execute("""
+                CREATE TEMP TABLE IF NOT EXISTS listing (
+                    path TEXT PRIMARY KEY, inode INTEGER, size INTEGER, mtime_ns INTEGER
+                )
+            """)
+            conn.execute("DELETE FROM listing")
+            conn.executemany("INSERT OR REPLACE INTO listing VALUES (?, ?, ?, ?)", listing())
+
+            # renames: a row whose path is gone, matching a listed file that has no row
+            renames = conn.execute(f"""
+                SELECT s.path, l.path FROM seen_files s
+                JOIN listing l ON l.inode = s.inode AND l.size = s.size AND l.mtime_ns = s.mtime_ns
+                WHERE {in_scope('s.path')}
+                  AND s.path NOT IN (SELECT path FROM listing)
+                  AND l.path NOT IN (SELECT path FROM seen_files)
+            """, scope).fetchall()
+            moved_from, moved_to = set(), set()
+            for old_path, new_path in renames:
+                if old_path not in moved_from and new_path not in moved_to:
+                    conn.execute("UPDATE seen_files SET path = ? WHERE path = ?", (new_path, old_path))
+                    moved_from.add(old_path)
+                    moved_to.add(new_path)
+
+            conn.execute(f"DELETE FROM seen_files WHERE {in_scope('path')} AND path NOT IN (SELECT path FROM listing)",
+                         scope)
+            changed = [row[0] for row in conn.execute("""
+                SELECT l.path FROM listing l LEFT JOIN seen_files s ON s.path = l.path
+                WHERE s.path IS NULL OR s.inode != l.inode OR s.size != l.size OR s.mtime_ns != l.mtime_ns
+            """)]
+            conn.execute("DELETE FROM listing")
+        return changed
+
+    def __len__(self):
+        self.flush()
+        return self._conn().execute("SELECT COUNT(*) FROM seen_files").fetchone()[0]
+
+    def close(self):
+        self.flush()
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,290 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import time
+
+# inotify(7) constants
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+
+_EVENT = struct.Struct("iIII")
+
+
+def walk_files(folder, recursive=False):
+    """
+    Yields (path, stat) for the regular files under folder using os.scandir,
+    which gets file types from the directory listing instead of one
+    stat call per entry.
+    """
+    pending = [folder]
+    while pending:
+        current = pending.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_file(follow_symlinks=False):
+                            yield os.path.abspath(entry.path), entry.stat(follow_symlinks=False)
+                        elif recursive and entry.is_dir(follow_symlinks=False):
+                            pending.append(entry.path)
+                    except OSError:
+                        continue  # vanished between listing and stat
+        except OSError:
+            continue
+
+
+class PollingWatcher:
+    """
+    Portable watcher that rescans the tree every interval seconds and
+    reports files whose mtime is new or has changed, which includes
+    files still being written.
+    """
+
+    reports_closed = False  # events do not mean the writer is done
+
+    def __init__(self, folder, recursive=False, interval=2.0):
+        self.folder = folder
+        self.recursive = recursive
+        self.interval = interval
+        self.mtimes = {}
+        self._removed = []
+        self._last_scan = 0
+
+    def _scan(self):
+        changed = []
+        current = {}
+        for path, st in walk_files(self.folder, self.recursive):
+            current[path] = st.st_mtime_ns
+            if self.mtimes.get(path) != st.st_mtime_ns:
+                changed.append(path)
+        if self.mtimes:
+            self._removed.extend(path for path in self.mtimes if path not in current)
+        self.mtimes = current  # deleted files drop out here
+        self._last_scan = time.monotonic()
+        return changed
+
+    def pop_removed(self):
+        """
+        Returns the paths deleted or moved away since the last call.
+        """
+        removed, self._removed = self._removed, []
+        return removed
+
+    def pop_listed(self):
+        """
+        Returns nothing: everything this watcher finds is by listing and
+        comes from read_events, which does not claim the writer is done.
+        """
+        return []
+
+    def existing_files(self):
+        return self._scan()
+
+    def read_events(self, timeout=1.0):
+        """
+        Returns paths created or modified since the last call, waiting
+        at most timeout seconds.
+        """
+        remaining = self._last_scan + self.interval - time.monotonic()
+        if remaining > 0:
+            time.sleep(min(timeout, remaining))
+            if self._last_scan + self.interval > time.monotonic():
+                return []
+        return self._scan()
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """
+    Linux watcher built on inotify through ctypes.
+
+    Reports files on IN_CLOSE_WRITE (finished writing) and IN_MOVED_TO
+    (renamed into the tree), so nothing is polled and files are not
+    picked up half-written. With recursive=True, subdirectories,
+    including ones created later, get their own watch. Files and
+    directories deleted or moved away are collected for pop_removed(),
+    and files found by listing a directory for pop_listed().
+
+    Directories that cannot get a watch once the inotify watch limit
+    (fs.inotify.max_user_watches) is reached are polled every
+    POLL_INTERVAL seconds instead.
+    """
+
+    reports_closed = True  # events mean the file was closed or moved in
+
+    FILE_MASK = (IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF | IN_MOVE_SELF
+                 | IN_DELETE | IN_MOVED_FROM)
+    POLL_INTERVAL = 2.0
+
+    def __init__(self, folder, recursive=False):
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.folder = folder
+        self.recursive = recursive
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self.dirs = {}  # watch descriptor -> directory
+        self._removed = []
+        self._listed = []
+        self._unwatched = {}  # directory without a watch -> {path: mtime_ns}
+        self._last_poll = 0
+        self._add_watch(os.path.abspath(folder))
+
+    def _add_watch(self, directory):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), self.FILE_MASK | IN_ONLYDIR)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err in (errno.ENOENT, errno.ENOTDIR):
+                return
+            if err == errno.ENOSPC and self.dirs:
+                # out of watches: poll this directory rather than stop
+                # watching the rest; with no watch at all, the caller
+                # falls back to a PollingWatcher
+                if not self._unwatched:
+                    print(f"inotify watch limit reached, polling {directory} and further new directories")
+                self._unwatched[directory] = {}
+                return
+            raise OSError(err, os.strerror(err), directory)
+        self.dirs[wd] = directory
+
+    def _watch_tree(self, directory):
+        # Watches directory and, if recursive, every directory below it, and
+        # returns the files already there: they may have been written before
+        # the watch existed.
+        self._add_watch(directory)
+        files = []
+        mtimes = self._unwatched.get(directory)
+        for path, st in walk_files(directory, recursive=False):
+            files.append(path)
+            if mtimes is not None:
+                mtimes[path] = st.st_mtime_ns
+        if self.recursive:
+            try:
+                with os.scandir(directory) as entries:
+                    subdirs = [e.path for e in entries if e.is_dir(follow_symlinks=False)]
+            except OSError:
+                subdirs = []
+            for subdir in subdirs:
+                files.extend(self._watch_tree(os.path.abspath(subdir)))
+        return files
+
+    def existing_files(self):
+        # the watches are in place before each directory is listed, so
+        # nothing written meanwhile can slip through
+        return self._watch_tree(os.path.abspath(self.folder))
+
+    def read_events(self, timeout=1.0):
+        """
+        Returns paths that finished writing or were moved in, waiting
+        at most timeout seconds for the first event.
+        """
+        if self._unwatched:
+            timeout = max(0, min(timeout, self._last_poll + self.POLL_INTERVAL - time.monotonic()))
+        paths = []
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if readable:
+            paths = self._read()
+        if self._unwatched and time.monotonic() >= self._last_poll + self.POLL_INTERVAL:
+            self._poll_unwatched()
+        return paths
+
+    def _read(self):
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        paths = []
+        offset = 0
+        while offset < len(buf):
+            wd, mask, _, length = _EVENT.unpack_from(buf, offset)
+            offset += _EVENT.size
+            name = os.fsdecode(buf[offset:offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                # the kernel dropped events; fall back to a full listing
+                self._listed.extend(path for path, _ in walk_files(self.folder, self.recursive))
+                continue
+            if mask & (IN_IGNORED | IN_DELETE_SELF | IN_MOVE_SELF):
+                self.dirs.pop(wd, None)
+                continue
+            directory = self.dirs.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, name)
+            if mask & (IN_DELETE | IN_MOVED_FROM):
+                self._removed.append(path)
+            elif mask & IN_ISDIR:
+                if self.recursive and mask & (IN_CREATE | IN_MOVED_TO):
+                    self._listed.extend(self._watch_tree(path))
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                paths.append(path)
+        return paths
+
+    def _poll_unwatched(self):
+        # Rescans the directories left without a watch, like PollingWatcher
+        for directory, mtimes in list(self._unwatched.items()):
+            current = {path: st.st_mtime_ns for path, st in walk_files(directory, recursive=False)}
+            self._listed.extend(path for path, mtime in current.items() if mtimes.get(path) != mtime)
+            self._removed.extend(path for path in mtimes if path not in current)
+            if os.path.isdir(directory):
+                self._unwatched[directory] = current
+            else:
+                del self._unwatched[directory]
+        self._last_poll = time.monotonic()
+
+    def pop_removed(self):
+        """
+        Returns the paths deleted or moved away since the last call; a
+        directory stands for everything that was below it.
+        """
+        removed, self._removed = self._removed, []
+        return removed
+
+    def pop_listed(self):
+        """
+        Returns the paths found since the last call by listing a
+        directory rather than by an event: after the kernel dropped
+        events, in directories created or moved in, and in directories
+        polled for lack of a watch. Their writers may not be done yet.
+        """
+        listed, self._listed = self._listed, []
+        return listed
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def create_watcher(folder, recursive=False, interval=2.0):
+    """
+    Returns an InotifyWatcher on Linux, or a PollingWatcher where inotify
+    is unavailable (other platforms, or the inotify watch limit reached).
+    """
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(folder, recursive)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(folder, recursive, interval)
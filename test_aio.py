@@ -0,0 +1,88 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+
+from safescan.aio import AsyncFileMonitor
+
+
+def write(path, data):
+    with open(path, "w") as f:
+        f.write(data)
+
+
+class TestAsyncFileMonitor(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.workdir = tempfile.mkdtemp()
+        os.chdir(self.workdir)
+        os.makedirs("watch")
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.workdir)
+
+    def test_concurrent_scans_are_bounded(self):
+        paths = []
+        for i in range(20):
+            paths.append(os.path.join(self.workdir, f"upload{i}.txt"))
+            write(paths[-1], f"upload {i} eval(x)")
+
+        async def main():
+            monitor = AsyncFileMonitor(workers=8, max_concurrent=3)
+            running, peak = set(), []
+            scan = monitor._scan
+
+            def tracked(path):
+                running.add(path)
+                peak.append(len(running))
+                try:
+                    return scan(path)
+                finally:
+                    running.discard(path)
+
+            monitor._scan = tracked
+            results = await asyncio.gather(*(monitor.scan_file(path) for path in paths))
+            self.assertTrue(await monitor.stop())
+            return monitor, results, max(peak)
+
+        monitor, results, peak = asyncio.run(main())
+        self.assertLessEqual(peak, 3)
+        self.assertEqual([result.path for result in results], paths)
+        self.assertTrue(all(result.found == ["eval"] for result in results))
+        self.assertEqual(monitor.db_logger.count_logs(label="eval"), 20)
+        self.assertEqual(monitor.metrics_snapshot()["counters"]["files_scanned"], 20)
+
+    def test_watched_files_are_yielded_until_stop(self):
+        flagged = os.path.join("watch", "dropper.exe")
+
+        async def main():
+            monitor = AsyncFileMonitor("watch", settle=0.2)
+            received = []
+            async with monitor:
+                async def consume():
+                    async for result in monitor.results():
+                        received.append(result)
+
+                consumer = asyncio.create_task(consume())
+                await asyncio.sleep(0.1)
+                write(os.path.join("watch", "notes.txt"), "hello")
+                with open(flagged, "wb") as f:
+                    f.write(b"powershell -enc " + os.urandom(64 * 1024))
+                for _ in range(100):
+                    if len(received) == 2:
+                        break
+                    await asyncio.sleep(0.05)
+            await asyncio.wait_for(consumer, 5)
+            return received
+
+        received = asyncio.run(main())
+        self.assertEqual(sorted(os.path.basename(result.path) for result in received), ["dropper.exe", "notes.txt"])
+        self.assertFalse(os.path.exists(flagged))
+        self.assertEqual(len(os.listdir("quarantine")), 2)  # the file and its sidecar
+
+
+if __name__ == '__main__':
+    unittest.main()
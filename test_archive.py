@@ -0,0 +1,151 @@
+import gzip
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+import zipfile
+
+from safescan import archive
+from safescan.database import DatabaseLogger
+from safescan.scanner import HeuristicScanner
+
+
+def zip_bytes(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+    return buffer.getvalue()
+
+
+def mark_encrypted(data, name):
+    # Sets the encryption flag of member name, which zipfile cannot write
+    data = bytearray(data)
+    with zipfile.ZipFile(io.BytesIO(bytes(data))) as zf:
+        data[zf.getinfo(name).header_offset + 6] |= 0x1
+    central = data.find(b"PK\x01\x02")
+    while data[central + 46:central + 46 + len(name)] != name.encode():
+        central = data.find(b"PK\x01\x02", central + 4)
+    data[central + 8] |= 0x1
+    return bytes(data)
+
+
+def tar_bytes(members):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tf:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+class TestArchiveScanning(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.scanner = HeuristicScanner()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write(self, name, data):
+        path = os.path.join(self.tmp, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_worst_member_scores_the_zip(self):
+        path = self.write("bundle.zip", zip_bytes({"readme.txt": b"hello",
+                                                   "tools/run.bat": b"cmd.exe /c powershell"}))
+        result = self.scanner.scan(path)
+        self.assertEqual(result.container, "zip")
+        self.assertEqual([m.member for m in result.members], ["readme.txt", "tools/run.bat"])
+        self.assertEqual([m.path for m in result.members],
+                         [path + "!readme.txt", path + "!tools/run.bat"])
+        self.assertEqual(result.members[1].score, 3)
+        self.assertEqual(result.score, 3)
+        self.assertEqual(result.reasons,
+                         ["Archive member tools/run.bat: Bad file extension, Suspicious strings: powershell, cmd.exe"])
+
+    def test_tar_gz_and_nested_zip(self):
+        inner = zip_bytes({"evil.js": b"eval(atob(x))"})
+        path = self.write("drop.tgz", gzip.compress(tar_bytes({"docs/a.txt": b"plain", "inner.zip": inner})))
+        result = self.scanner.scan(path)
+        self.assertEqual(result.container, "gzip")
+        self.assertEqual([m.member for m in result.members], ["drop.tar/docs/a.txt", "drop.tar/inner.zip/evil.js"])
+        self.assertGreater(result.members[1].score, 0)
+        self.assertEqual(result.score, result.members[1].score)
+
+    def test_depth_limit(self):
+        data = b"cmd.exe"
+        for _ in range(4):
+            data = gzip.compress(data)
+        self.scanner.archive_depth = 2
+        result = self.scanner.scan(self.write("deep.gz", data))
+        self.assertEqual(len(result.members), 1)
+        self.assertTrue(any("nested deeper than 2 levels" in reason for reason in result.reasons))
+
+    def test_expansion_limit_stops_a_zip_bomb(self):
+        path = self.write("bomb.zip", zip_bytes({f"zeros{i}.bin": b"\x00" * (8 * 1024 * 1024) for i in range(4)}))
+        self.scanner.archive_ratio = 1
+        self.scanner.archive_workers = 1
+        limit, archive.MIN_EXPANSION = archive.MIN_EXPANSION, 1024 * 1024
+        try:
+            result = self.scanner.scan(path)
+        finally:
+            archive.MIN_EXPANSION = limit
+        self.assertIn("unpacks to more than", result.archive_limit)
+        self.assertLessEqual(len(result.members), 1)
+        self.assertIn(f"Archive not fully unpacked: {result.archive_limit}", result.reasons)
+
+    def test_corrupt_archive_is_reported(self):
+        data = zip_bytes({"a.txt": b"x" * 1000})
+        result = self.scanner.scan(self.write("broken.zip", data[:len(data) // 2]))
+        self.assertIsNone(result.container)
+        self.assertEqual(result.members, [])
+        self.assertTrue(any(reason.startswith("Cannot unpack broken.zip") for reason in result.reasons))
+        self.assertIsNone(result.error)
+
+    def test_random_bytes_behind_archive_magic_score_for_entropy(self):
+        payload = os.urandom(256 * 1024)
+        for magic in (b"BZh9", b"\x1f\x8b", b"PK\x05\x06"):
+            result = self.scanner.scan(self.write("payload.bin", magic + payload))
+            self.assertIsNone(result.container, magic)
+            self.assertEqual(result.score, 2, magic)
+            self.assertIn("High entropy: 8.00", result.reasons)
+
+    def test_encrypted_and_corrupt_members_add_weight(self):
+        data = mark_encrypted(zip_bytes({"readme.txt": b"hello", "payload.bin": b"x" * 100,
+                                         "broken.gz": b"\x1f\x8b" + b"\xff" * 100}), "payload.bin")
+        result = self.scanner.scan(self.write("locked.zip", data))
+        self.assertEqual(result.container, "zip")
+        self.assertEqual([m.member for m in result.members], ["readme.txt"])
+        self.assertEqual(result.unreadable, 2)
+        self.assertEqual(result.score, 2)
+        self.assertEqual(result.reasons[0], "Unreadable archive members: 2")
+        self.assertIn("Cannot unpack payload.bin: encrypted", result.reasons)
+        self.assertTrue(any(reason.startswith("Cannot unpack broken.gz") for reason in result.reasons))
+
+    def test_members_are_logged_under_the_archive(self):
+        path = self.write("bundle.zip", zip_bytes({"a.txt": b"hello", "b.bat": b"cmd.exe"}))
+        result = self.scanner.scan(path)
+        logger = DatabaseLogger(os.path.join(self.tmp, "scan_logs.db"))
+        try:
+            logger.insert_result(result)
+            logger.insert_log("other.txt", 0, 1.0, [], [])
+            rows = logger.fetch_logs()
+            self.assertEqual(len(rows), 4)
+            parent = next(row for row in rows if row[1] == "bundle.zip")
+            self.assertIsNone(parent[12])
+            members = logger.fetch_members(parent[0])
+            self.assertEqual([(row[1], row[13]) for row in members], [("a.txt", "a.txt"), ("b.bat", "b.bat")])
+            self.assertEqual(members[1][2], result.members[1].score)
+        finally:
+            logger.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
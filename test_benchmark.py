@@ -0,0 +1,68 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stderr
+from io import StringIO
+
+from safescan import benchmark
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_corpus_is_reproducible_and_reused(self):
+        first = benchmark.generate_corpus(os.path.join(self.tmp, "a"), "pe", seed=3, scale=0.02)
+        second = benchmark.generate_corpus(os.path.join(self.tmp, "b"), "pe", seed=3, scale=0.02)
+        names = sorted(os.listdir(os.path.join(first, "files")))
+        self.assertEqual(len(names), 3)
+        for name in names:
+            with open(os.path.join(first, "files", name), "rb") as f, \
+                    open(os.path.join(second, "files", name), "rb") as g:
+                data = f.read()
+                self.assertEqual(data, g.read())
+            self.assertEqual(len(data), 128 * 1024)
+            self.assertTrue(data.startswith(b"MZ"))
+        mtime = os.path.getmtime(os.path.join(first, "files", names[0]))
+        benchmark.generate_corpus(os.path.join(self.tmp, "a"), "pe", seed=3, scale=0.02)
+        self.assertEqual(os.path.getmtime(os.path.join(first, "files", names[0])), mtime)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(benchmark.percentile(values, 50), 50)
+        self.assertEqual(benchmark.percentile(values, 99), 99)
+        self.assertEqual(benchmark.percentile([7], 99), 7)
+        self.assertIsNone(benchmark.percentile([], 50))
+
+    def test_compare_reports_slowdowns(self):
+        baseline = {"results": [{"benchmark": "risk_score", "corpus": "text", "files_per_s": 100.0},
+                                {"benchmark": "check_strings", "corpus": "text", "files_per_s": 100.0}]}
+        current = {"results": [{"benchmark": "risk_score", "corpus": "text", "files_per_s": 95.0},
+                               {"benchmark": "check_strings", "corpus": "text", "files_per_s": 50.0}]}
+        self.assertEqual(benchmark.compare(current, baseline),
+                         [("check_strings", "text", 100.0, 50.0, 0.5)])
+
+    def test_main_writes_json(self):
+        out = os.path.join(self.tmp, "results.json")
+        with redirect_stderr(StringIO()):
+            code = benchmark.main(["--out", out, "--corpus", "text", "--scale", "0.01", "--in-process",
+                                   "--workers", "2", "--pool", "thread", "--timeout", "60"])
+        self.assertEqual(code, 0)
+        with open(out) as f:
+            report = json.load(f)
+        self.assertEqual([r["benchmark"] for r in report["results"]], list(benchmark.BENCHMARKS))
+        for result in report["results"]:
+            self.assertEqual(result["files"], 5)
+            self.assertEqual(result["bytes"], 5 * 32 * 1024)
+            self.assertGreater(result["files_per_s"], 0)
+            self.assertLessEqual(result["latency_ms"]["p50"], result["latency_ms"]["p99"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from safescan.scanner import HeuristicScanner
+from safescan.cache import ScanCache
+
+
+class TestScanCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cache = ScanCache(os.path.join(self.tmp, "scan_logs.db"), max_entries=10)
+        self.scanner = HeuristicScanner()
+        self.rules = self.scanner.rules_fingerprint()
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.tmp)
+
+    def scan_new_file(self, name, content):
+        path = os.path.join(self.tmp, name)
+        with open(path, "wb") as f:
+            f.write(content)
+        result = self.scanner.scan(path, self.cache)
+        self.cache.store(result, self.rules)
+        return path, result
+
+    def test_modified_file_is_rescanned(self):
+        path, _ = self.scan_new_file("a.txt", b"eval(x)")
+        with open(path, "ab") as f:
+            f.write(b" and more")
+        result = self.scanner.scan(path, self.cache)
+        self.assertIsNone(result.cached)
+        self.assertEqual(result.found, ["eval"])
+
+    def test_lru_eviction_caps_entries(self):
+        for i in range(25):
+            self.scan_new_file(f"f{i}.txt", f"content {i}".encode())
+        self.assertLessEqual(self.cache._entries, 10)
+        # the most recent entries survive, the oldest are gone
+        _, last = self.scan_new_file("again24.txt", b"content 24")
+        _, first = self.scan_new_file("again0.txt", b"content 0")
+        self.assertEqual(last.cached, "content")
+        self.assertIsNone(first.cached)
+
+    def test_file_hit_refreshes_lru_position(self):
+        path, first = self.scan_new_file("a.txt", b"hello")
+        conn = self.cache._conn()
+        with conn:
+            conn.execute("UPDATE scan_cache SET last_used = 0")
+            conn.execute("UPDATE scan_cache_files SET last_used = 0")
+        result = self.scanner.scan(path, self.cache)
+        self.assertEqual(result.cached, "file")
+        self.cache.touch(result)
+        self.assertGreater(conn.execute("SELECT last_used FROM scan_cache").fetchone()[0], 0)
+        self.assertGreater(conn.execute("SELECT last_used FROM scan_cache_files").fetchone()[0], 0)
+
+    def test_paths_are_pruned(self):
+        self.cache.max_files = 5
+        for i in range(12):
+            self.scan_new_file(f"copy{i}.txt", b"the same bytes")
+        count = self.cache._conn().execute("SELECT COUNT(*) FROM scan_cache_files").fetchone()[0]
+        self.assertLessEqual(count, 5)
+        self.assertEqual(self.scanner.scan(os.path.join(self.tmp, "copy11.txt"), self.cache).cached, "file")
+        self.assertEqual(self.scanner.scan(os.path.join(self.tmp, "copy0.txt"), self.cache).cached, "content")
+
+    def test_new_file_is_read_once(self):
+        path = os.path.join(self.tmp, "new.txt")
+        with open(path, "wb") as f:
+            f.write(b"eval(x) " * 1000)
+        self.scanner.scan_archives = False  # scan_archive only reads the first bytes again
+        with patch("builtins.open", wraps=open) as opened:
+            result = self.scanner.scan(path, self.cache)
+        self.assertEqual([call.args[0] for call in opened.call_args_list], [path])
+        self.assertIsNone(result.cached)
+        self.assertEqual(result.found, ["eval"])
+        _, copy = self.scan_new_file("copy.txt", b"eval(x) " * 1000)
+        self.assertEqual(copy.digest, result.digest)
+
+    def test_rules_change_purges_old_entries(self):
+        path, _ = self.scan_new_file("a.txt", b"hello")
+        self.scanner.entropy_threshold = 7.0
+        result = self.scanner.scan(path, self.cache)
+        self.assertIsNone(result.cached)
+        self.cache.store(result, self.scanner.rules_fingerprint())
+        self.assertEqual(self.cache._entries, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from safescan.cli import Checkpoint, main, walk_tree
+
+
+class TestCli(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.root = os.path.join(self.tmp, "share")
+        for rel, content in {
+            "a.txt": b"hello",
+            "run.bat": b"powershell -enc AAAA",
+            "sub/b.js": b"eval(x)",
+            "sub/big.bin": b"x" * 5000,
+            "node_modules/skip.js": b"exec",
+        }.items():
+            path = os.path.join(self.root, rel)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(content)
+        self.db = os.path.join(self.tmp, "scan_logs.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def run_cli(self, *args):
+        out = io.StringIO()
+        code = main(["--db", self.db, "--pool", "thread", "-j", "2", *args, self.root], out=out)
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+        return code, {os.path.relpath(r["path"], self.root).replace(os.sep, "/"): r for r in records}
+
+    def test_walk_filters(self):
+        paths = walk_tree([self.root], exclude=["node_modules"], max_size=1000)
+        rel = sorted(os.path.relpath(p, self.root).replace(os.sep, "/") for p in paths)
+        self.assertEqual(rel, ["a.txt", "run.bat", "sub/b.js"])
+        paths = walk_tree([self.root], include=["*.js"], walkers=1)
+        self.assertEqual(len(list(paths)), 2)
+
+    def test_scans_tree_to_jsonl(self):
+        code, records = self.run_cli("--exclude", "node_modules")
+        self.assertEqual(sorted(records), ["a.txt", "run.bat", "sub/b.js", "sub/big.bin"])
+        self.assertEqual(records["run.bat"]["found"], ["powershell"])
+        self.assertEqual(records["run.bat"]["score"], 3)
+        self.assertEqual(code, 0)
+
+    def test_resumes_from_checkpoint(self):
+        checkpoint_path = os.path.join(self.tmp, "sweep.ckpt")
+        checkpoint = Checkpoint(checkpoint_path)
+        checkpoint.mark(os.path.abspath(os.path.join(self.root, "a.txt")))
+        checkpoint.close()
+
+        _, records = self.run_cli("--checkpoint", checkpoint_path, "--no-cache")
+        self.assertNotIn("a.txt", records)
+        self.assertEqual(len(records), 4)
+        # a completed sweep removes its checkpoint
+        self.assertFalse(os.path.exists(checkpoint_path))
+
+    def test_process_pool(self):
+        out = io.StringIO()
+        main(["--no-db", "-j", "2", "--include", "*.bat", self.root], out=out)
+        record = json.loads(out.getvalue())
+        self.assertEqual(record["found"], ["powershell"])
+
+
+if __name__ == "__main__":
+    unittest.main()
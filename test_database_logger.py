@@ -0,0 +1,197 @@
+import csv
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import unittest
+
+from safescan.database import LOG_COLUMNS, DatabaseLogger
+from safescan.matcher import Match
+from safescan.scanner import ScanResult
+
+
+class TestDatabaseLogger(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.db_name = os.path.join(self.tmp, "scan_logs.db")
+        self.logger = DatabaseLogger(self.db_name, batch_size=10, flush_interval=0.05)
+
+    def tearDown(self):
+        self.logger.close()
+        shutil.rmtree(self.tmp)
+
+    def count_rows(self):
+        conn = sqlite3.connect(self.db_name)
+        try:
+            return conn.execute("SELECT COUNT(*) FROM scan_logs").fetchone()[0]
+        finally:
+            conn.close()
+
+    def test_flush_commits_queued_inserts(self):
+        for i in range(25):
+            self.logger.insert_log(f"/tmp/file{i}.txt", i % 5, 1.5, ["eval"], ["Suspicious strings: eval"])
+        self.assertTrue(self.logger.flush(timeout=10))
+        self.assertEqual(self.count_rows(), 25)
+
+    def test_close_flushes_and_insert_restarts_writer(self):
+        self.logger.insert_log("a.bat", 1, 0.5, [], ["Bad file extension"])
+        self.logger.close(timeout=10)
+        self.assertEqual(self.count_rows(), 1)
+        self.logger.insert_log("b.bat", 1, 0.5, [], ["Bad file extension"])
+        self.logger.flush(timeout=10)
+        self.assertEqual(self.count_rows(), 2)
+
+    def test_entropy_profile_columns(self):
+        profile = {'blocks': 4, 'max': 7.9, 'mean': 4.5, 'variance': 2.25, 'high_blocks': 1}
+        self.logger.insert_log("a.txt", 2, 5.1, [], ["High-entropy blocks: 1 of 4, max 7.90"], profile)
+        self.logger.insert_log("b.txt", 0, 1.0, [], [])
+        rows = self.logger.fetch_logs()
+        self.assertEqual(rows[1][7:12], (4, 7.9, 4.5, 2.25, 1))
+        self.assertEqual(rows[0][7:12], (None,) * 5)
+
+    def test_adds_profile_columns_to_existing_table(self):
+        old_db = os.path.join(self.tmp, "old.db")
+        conn = sqlite3.connect(old_db)
+        conn.execute("""CREATE TABLE scan_logs (id INTEGER PRIMARY KEY AUTOINCREMENT, filename TEXT,
+                        score INTEGER, entropy REAL, suspicious_strings TEXT, reasons TEXT, timestamp TEXT)""")
+        conn.execute("INSERT INTO scan_logs (filename, score) VALUES ('old.exe', 1)")
+        conn.commit()
+        conn.close()
+        logger = DatabaseLogger(old_db)
+        logger.insert_log("new.exe", 3, 7.0, [], [], {'blocks': 1, 'max': 7.0, 'mean': 7.0,
+                                                      'variance': 0.0, 'high_blocks': 0})
+        rows = logger.fetch_logs()
+        logger.close()
+        self.assertEqual([(row[1], row[7]) for row in rows], [("new.exe", 1), ("old.exe", None)])
+
+    def test_wal_mode_and_indexes(self):
+        conn = sqlite3.connect(self.db_name)
+        try:
+            self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+            indexes = {row[1] for row in conn.execute("PRAGMA index_list(scan_logs)")}
+        finally:
+            conn.close()
+        self.assertTrue({"idx_scan_logs_filename", "idx_scan_logs_timestamp", "idx_scan_logs_score"} <= indexes)
+
+    def test_fetch_logs_pages_newest_first(self):
+        for i in range(5):
+            self.logger.insert_log(f"file{i}.txt", i, 1.0, [], [])
+        page = self.logger.fetch_logs(limit=2)
+        self.assertEqual([row[1] for row in page], ["file4.txt", "file3.txt"])
+        older = self.logger.fetch_logs(before_id=page[-1][0], limit=10)
+        self.assertEqual([row[1] for row in older], ["file2.txt", "file1.txt", "file0.txt"])
+
+    def test_fetch_logs_before_time(self):
+        self.logger.insert_log("old.txt", 0, 1.0, [], [])
+        self.assertEqual(self.logger.fetch_logs(before_time=time.time() - 3600), [])
+        self.assertEqual(len(self.logger.fetch_logs(before_time=time.time() + 3600)), 1)
+
+    def test_iter_logs_filters_and_streams(self):
+        for i in range(2500):
+            self.logger.insert_log(f"f{i}.txt", i % 6, 1.0, [], [])
+        rows = self.logger.iter_logs(min_score=4, batch_size=100)
+        self.assertEqual(sum(1 for _ in rows), 832)
+        self.assertEqual(self.logger.count_logs(min_score=2, max_score=3), 834)
+        self.assertEqual(self.logger.count_logs(end=time.time() - 3600), 0)
+        self.assertEqual(self.logger.count_logs(start="2000-01-01 00:00:00"), 2500)
+
+    def test_export_to_csv_reports_progress(self):
+        for i in range(2500):
+            self.logger.insert_log(f"f{i}.txt", i % 6, 1.0, [], [])
+        calls = []
+        success, _ = self.logger.export_to_csv(os.path.join(self.tmp, "logs.csv"), min_score=1,
+                                               progress=lambda done, total: calls.append((done, total)))
+        self.assertTrue(success)
+        self.assertEqual(calls[0], (1000, 2083))
+        self.assertEqual(calls[-1], (2083, 2083))
+
+    def test_export_to_csv_includes_pending_rows(self):
+        self.logger.insert_log("c.js", 3, 7.9, ["exec"], ["High entropy: 7.90"])
+        export_path = os.path.join(self.tmp, "logs.csv")
+        success, _ = self.logger.export_to_csv(export_path)
+        self.assertTrue(success)
+        with open(export_path, newline="") as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[1][1:4], ["c.js", "3", "7.9"])
+
+    def scan_result(self, path, score, size=10, matches=()):
+        result = ScanResult(path)
+        result.score = score
+        result.size = size
+        result.digest = f"digest-{os.path.basename(path)}"
+        for label, offset in matches:
+            match = Match(label, offset)
+            match.count = 1
+            result.matches.append(match)
+            result.found.append(label)
+        return result
+
+    def test_query_filters_and_pages(self):
+        for i in range(6):
+            self.logger.insert_result(self.scan_result(f"/srv/in/f{i}.{'EXE' if i % 2 else 'txt'}", i,
+                                                       matches=[("eval", 7)] if i < 2 else []))
+        rows = self.logger.query(extension=".exe", limit=2)
+        self.assertEqual([row[1] for row in rows], ["f5.EXE", "f3.EXE"])
+        self.assertEqual([row[1] for row in self.logger.query(extension=".EXE", before_id=rows[-1][0])],
+                         ["f1.EXE"])
+        columns = dict(zip(LOG_COLUMNS, rows[0]))
+        self.assertEqual((columns["path"], columns["digest"], columns["size"], columns["extension"]),
+                         ("/srv/in/f5.EXE", "digest-f5.EXE", 10, ".exe"))
+        self.assertAlmostEqual(columns["scanned_at"], time.time(), delta=60)
+
+        self.assertEqual([row[1] for row in self.logger.query(label="eval")], ["f1.EXE", "f0.txt"])
+        self.assertEqual(self.logger.fetch_matches(self.logger.query(path="/srv/in/f0.txt")[0][0]), [("eval", 7, 1)])
+        self.assertEqual(len(self.logger.query(digest="digest-f2.txt", min_score=2, max_score=2)), 1)
+        self.assertEqual(self.logger.count_logs(min_score=3, extension=".txt"), 1)
+        self.assertEqual(self.logger.query(end=time.time() - 3600), [])
+
+    def test_rollups_are_maintained_as_rows_are_written(self):
+        for i in range(10):
+            self.logger.insert_result(self.scan_result(f"f{i}.{'js' if i < 7 else 'exe'}", 4 if i % 3 == 0 else 0))
+        self.logger.flush()
+        self.logger.insert_result(self.scan_result("late.js", 4, size=100))
+        hour = int(time.time()) // 3600 * 3600
+        self.assertEqual(self.logger.rollup("hour", by=("bucket", "score")), [(hour, 0, 6, 60), (hour, 4, 5, 140)])
+        self.assertEqual(self.logger.rollup("day", by=("extension",), min_score=4, start=time.time() - 7 * 86400),
+                         [(".js", 4, 130), (".exe", 1, 10)])
+        self.assertEqual(self.logger.rollup("day", by=()), [(11, 200)])
+        self.assertEqual(self.logger.rollup("hour", end=hour), [])
+        with self.assertRaises(ValueError):
+            self.logger.rollup("week")
+        with self.assertRaises(ValueError):
+            self.logger.rollup(by=("filename",))
+
+    def test_migrates_rows_of_the_old_schema(self):
+        old_db = os.path.join(self.tmp, "old.db")
+        conn = sqlite3.connect(old_db)
+        conn.execute("""CREATE TABLE scan_logs (id INTEGER PRIMARY KEY AUTOINCREMENT, filename TEXT,
+                        score INTEGER, entropy REAL, suspicious_strings TEXT, reasons TEXT, timestamp TEXT)""")
+        conn.executemany("INSERT INTO scan_logs (filename, score, suspicious_strings, timestamp) VALUES (?, ?, ?, ?)",
+                         [("a.EXE", 4, "eval, exec", "2024-03-01 10:15:00"),
+                          ("b.txt", 0, "", "2024-03-01 10:45:00"),
+                          ("c.exe", 4, "eval", "2024-03-02 09:00:00")])
+        conn.commit()
+        conn.close()
+        logger = DatabaseLogger(old_db)
+        try:
+            first = time.mktime(time.strptime("2024-03-01 10:15:00", "%Y-%m-%d %H:%M:%S"))
+            rows = logger.query(label="eval")
+            self.assertEqual([row[1] for row in rows], ["c.exe", "a.EXE"])
+            self.assertEqual(rows[1][LOG_COLUMNS.index("scanned_at")], first)
+            self.assertEqual(rows[1][LOG_COLUMNS.index("extension")], ".exe")
+            self.assertEqual(logger.fetch_matches(rows[1][0]), [("eval", None, None), ("exec", None, None)])
+            self.assertEqual(logger.count_logs(start="2024-03-01 10:30:00", end="2024-03-02 00:00:00"), 1)
+            self.assertEqual(logger.rollup("day", by=("extension", "score")), [(".exe", 4, 2, 0), (".txt", 0, 1, 0)])
+        finally:
+            logger.close()
+        # opening it again does not migrate twice
+        logger = DatabaseLogger(old_db)
+        self.assertEqual(logger.rollup("day", by=()), [(3, 0)])
+        self.assertEqual(len(logger.fetch_matches(rows[1][0])), 2)
+        logger.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
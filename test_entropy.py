@@ -0,0 +1,100 @@
+import math
+import os
+import unittest
+from collections import Counter
+from unittest.mock import patch
+
+from safescan import entropy
+from safescan.entropy import ByteHistogram, EntropyProfile
+
+
+def reference_entropy(data):
+    counter = Counter(data)
+    total = len(data)
+    return -sum((count / total) * math.log2(count / total) for count in counter.values())
+
+
+class TestByteHistogram(unittest.TestCase):
+
+    def setUp(self):
+        self.data = os.urandom(4096) + b"A" * 1000 + bytes(range(256))
+
+    def test_matches_reference(self):
+        self.assertAlmostEqual(ByteHistogram.from_bytes(self.data).entropy(),
+                               reference_entropy(self.data))
+
+    def test_pure_python_fallback_matches_reference(self):
+        with patch.object(entropy, "np", None):
+            histogram = ByteHistogram.from_bytes(self.data)
+            self.assertIsInstance(histogram.counts, list)
+            self.assertAlmostEqual(histogram.entropy(), reference_entropy(self.data))
+
+    def test_merged_chunks_equal_whole(self):
+        merged = ByteHistogram()
+        for i in range(0, len(self.data), 1000):
+            merged.merge(ByteHistogram.from_bytes(memoryview(self.data)[i:i + 1000]))
+        self.assertEqual(merged.total, len(self.data))
+        self.assertAlmostEqual(merged.entropy(), reference_entropy(self.data))
+
+    def test_empty(self):
+        histogram = ByteHistogram.from_bytes(b"")
+        self.assertEqual(histogram.entropy(), 0)
+
+
+class TestEntropyProfile(unittest.TestCase):
+
+    def setUp(self):
+        # a small random payload appended to text
+        self.data = b"plain text, nothing to see here. " * 400 + os.urandom(4096) + b"tail"
+
+    def profile(self, chunk_size, block_size=1024):
+        profile = EntropyProfile(block_size)
+        for i in range(0, len(self.data), chunk_size):
+            profile.update(self.data[i:i + chunk_size])
+        return profile.finish()
+
+    def test_blocks_match_reference(self):
+        profile = self.profile(len(self.data))
+        blocks = [self.data[i:i + 1024] for i in range(0, len(self.data), 1024)]
+        entropies = [reference_entropy(block) for block in blocks]
+        mean = sum(entropies) / len(entropies)
+        self.assertEqual(profile.blocks, len(blocks))
+        self.assertAlmostEqual(profile.max, max(entropies))
+        self.assertAlmostEqual(profile.mean, mean)
+        self.assertAlmostEqual(profile.variance, sum((e - mean) ** 2 for e in entropies) / len(entropies))
+        self.assertEqual(profile.high_blocks, sum(e > profile.high_threshold for e in entropies))
+        low = [e for e in entropies if e <= profile.high_threshold]
+        low_mean = sum(low) / len(low)
+        self.assertAlmostEqual(profile.low_mean, low_mean)
+        self.assertAlmostEqual(profile.low_variance, sum((e - low_mean) ** 2 for e in low) / len(low))
+        self.assertAlmostEqual(profile.histogram.entropy(), reference_entropy(self.data))
+        self.assertEqual(profile.histogram.total, len(self.data))
+        # the global value stays low while the payload blocks stand out
+        self.assertLess(profile.histogram.entropy(), 7.5)
+        self.assertGreaterEqual(profile.high_blocks, 3)
+        # the hottest blocks all overlap the payload
+        for offset, length, entropy in profile.hot_regions()[:3]:
+            self.assertGreater(offset + length, 400 * 33)
+
+    def test_chunking_does_not_change_profile(self):
+        whole = self.profile(len(self.data)).summary()
+        for chunk_size in (1, 333, 1024, 5000):
+            summary = self.profile(chunk_size).summary()
+            for key, value in whole.items():
+                self.assertAlmostEqual(summary[key], value, msg=(chunk_size, key))
+
+    def test_pure_python_fallback_matches(self):
+        expected = self.profile(700).summary()
+        with patch.object(entropy, "np", None):
+            summary = self.profile(700).summary()
+        for key, value in expected.items():
+            self.assertAlmostEqual(summary[key], value)
+
+    def test_empty(self):
+        self.assertEqual(EntropyProfile().finish().summary(),
+                         {'blocks': 0, 'max': 0.0, 'mean': 0.0, 'variance': 0.0, 'high_blocks': 0,
+                          'low_mean': 0.0, 'low_variance': 0.0})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,13 @@
 import unittest
 import os
 import shutil
+import subprocess
+import sys
+import tempfile
+import time
 from unittest.mock import patch, mock_open
-from file_monitor import HeuristicScanner, ReportManager, FileMonitor
+from database_logger import DatabaseLogger
+from file_monitor import HeuristicScanner, ReportManager, ResultStore, FileMonitor
 
 class TestHeuristicScanner(unittest.TestCase):
 
@@ -31,6 +36,67 @@ class TestHeuristicScanner(unittest.TestCase):
         self.assertIn("Bad file extension", reasons)
         self.assertTrue(any("Suspicious strings" in r for r in reasons))
 
+    def test_scan_file_streams_in_chunks(self):
+        data = os.urandom(5000) + b"cmd.exe" + b"a" * 3000
+        with tempfile.NamedTemporaryFile(suffix=".exe", delete=False) as f:
+            f.write(data)
+        try:
+            # "cmd.exe" straddles the boundary between the first two chunks
+            result = self.scanner.scan_file(f.name, chunk_size=5003)
+        finally:
+            os.remove(f.name)
+        self.assertEqual(result.size, len(data))
+        self.assertEqual(result.found, ["cmd.exe"])
+        self.assertAlmostEqual(result.entropy, self.scanner.check_entropy(data))
+        self.assertIn("Bad file extension", result.reasons)
+        # the random first block stands out although the file as a whole does not
+        self.assertTrue(any(r.startswith("High-entropy blocks: 1 of 2") for r in result.reasons))
+        self.assertEqual(result.score, 5)
+
+    def test_scan_file_maps_large_files(self):
+        data = b"a" * 8192 + os.urandom(4096) + b"b" * 6000 + b"powershell"
+        with tempfile.NamedTemporaryFile(suffix=".txt", delete=False) as f:
+            f.write(data)
+        try:
+            streamed = self.scanner.scan_file(f.name)
+            self.scanner.mmap_threshold = 1024
+            self.scanner.window_size = 4096
+            for case_insensitive in (False, True):
+                self.scanner.case_insensitive = case_insensitive
+                mapped = self.scanner.scan_file(f.name)
+                self.assertEqual(mapped.size, len(data))
+                self.assertEqual(mapped.digest, streamed.digest)
+                self.assertAlmostEqual(mapped.entropy, streamed.entropy)
+                self.assertEqual(mapped.found, ["powershell"])
+        finally:
+            os.remove(f.name)
+        self.assertEqual(mapped.profile, streamed.profile)
+        self.assertEqual(mapped.hot_regions, streamed.hot_regions)
+        offset, length, entropy = mapped.hot_regions[0]
+        self.assertEqual(offset, 8192)
+        self.assertEqual(length, 4096)
+        self.assertGreater(entropy, 7)
+        self.assertEqual(mapped.hot_regions[-1][2], 0)
+
+    def test_mapped_windows_keep_matches_across_boundaries(self):
+        # the matcher is fed one window at a time, like the profile
+        data = b"x" * 4092 + b"powershell" + b"y" * 5000 + b"cmd.exe"
+        with tempfile.NamedTemporaryFile(suffix=".txt", delete=False) as f:
+            f.write(data)
+        try:
+            self.scanner.mmap_threshold = 1024
+            self.scanner.window_size = 4096
+            mapped = self.scanner.scan_file(f.name)
+        finally:
+            os.remove(f.name)
+        self.assertEqual([(m.label, m.offset) for m in mapped.matches], [("powershell", 4092), ("cmd.exe", 9102)])
+
+    def test_scan_file_missing_file(self):
+        result = self.scanner.scan_file("does_not_exist.bin")
+        self.assertEqual(result.score, 0)
+        self.assertIsNotNone(result.error)
+        self.assertTrue(result.reasons[0].startswith("Error scanning"))
+
 
 
 class TestReportManager(unittest.TestCase):
@@ -43,6 +109,7 @@ class TestReportManager(unittest.TestCase):
             f.write("dummy content")
 
     def tearDown(self):
+        self.report.close(timeout=10)
         if os.path.exists(self.test_file):
             os.remove(self.test_file)
         if os.path.exists("quarantine"):
@@ -65,9 +132,74 @@ class TestReportManager(unittest.TestCase):
         if os.path.exists("test_report.pdf"):
             os.remove("test_report.pdf")
 
+class TestResultStore(unittest.TestCase):
+
+    def test_capacity_and_cursor(self):
+        store = ResultStore(capacity=5)
+        for i in range(8):
+            store.append(f"line {i}")
+        self.assertEqual(len(store), 5)
+        self.assertEqual(store.last_seq, 8)
+        self.assertEqual([r.message for r in store.since(6)], ["line 6", "line 7"])
+        self.assertEqual([r.seq for r in store.since(0)], [4, 5, 6, 7, 8])
+        self.assertEqual([r.seq for r in store.since(4, limit=2)], [5, 6])
+        self.assertEqual(store.since(8), [])
+
+    def test_report_manager_is_bounded(self):
+        report = ReportManager(capacity=3)
+        for i in range(10):
+            report.results.append(f"Scanned: {i}")
+        self.assertEqual(report.get_results(), ["Scanned: 7", "Scanned: 8", "Scanned: 9"])
+        self.assertEqual([r.message for r in report.results_since(9)], ["Scanned: 9"])
+        shutil.rmtree("quarantine", ignore_errors=True)
+
+
+class TestHeadlessImport(unittest.TestCase):
+
+    def test_headless_entry_point_skips_gui_and_pdf_modules(self):
+        code = ("import sys, file_monitor; "
+                "print(sorted(m for m in ('tkinter', 'safescan.pdf_report') if m in sys.modules))")
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout
+        self.assertEqual(out.strip(), "[]")
+
+
+class TestReportExport(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp)
+        self.report = ReportManager()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmp)
+
+    def test_export_report_pdf_streams_from_database(self):
+        db_logger = DatabaseLogger("scan_logs.db")
+        for i in range(300):
+            db_logger.insert_log(f"file{i}.exe", i % 6, 7.0, [], ["Bad file extension"])
+        calls = []
+        success, msg = self.report.export_report_pdf("report.pdf", db_logger, min_score=5,
+                                                     progress=lambda done, total: calls.append((done, total)))
+        db_logger.close()
+        self.assertTrue(success, msg)
+        self.assertEqual(calls[-1], (50, 50))
+        with open("report.pdf", "rb") as f:
+            data = f.read()
+        self.assertTrue(data.startswith(b"%PDF-1.4"))
+        self.assertIn(b"/Count 2", data)  # 50 lines over two pages
+        self.assertTrue(data.rstrip().endswith(b"%%EOF"))
+
+
 class TestFileMonitor(unittest.TestCase):
 
     def setUp(self):
+        # keep the monitor's scan_logs.db and quarantine out of the source tree
+        self.cwd = os.getcwd()
+        self.workdir = tempfile.mkdtemp()
+        os.chdir(self.workdir)
         self.test_folder = "test_watch_folder"
         os.makedirs(self.test_folder, exist_ok=True)
         self.test_file = os.path.join(self.test_folder, "suspicious.bat")
@@ -79,6 +211,8 @@ class TestFileMonitor(unittest.TestCase):
             shutil.rmtree(self.test_folder)
         if os.path.exists("quarantine"):
             shutil.rmtree("quarantine")
+        os.chdir(self.cwd)
+        shutil.rmtree(self.workdir)
 
     @patch("time.sleep", return_value=None)
     def test_watch_folder_queues_existing_files(self, _):
@@ -100,11 +234,96 @@ class TestFileMonitor(unittest.TestCase):
             monitor.report.results.append(log_entry)
             if score >= 4:
                 monitor.report.log_result(file_path, reasons)
+        monitor.report.close(timeout=10)  # let the quarantine worker finish
 
         results = monitor.report.get_results()
         self.assertTrue(any("Scanned" in r for r in results))
         if score >= 4:
             self.assertTrue(any("flagged" in r for r in results))
 
+    def _run_pool(self, pool):
+        db_dir = tempfile.mkdtemp()
+        monitor = FileMonitor(self.test_folder, workers=2, pool=pool)
+        monitor.db_logger = DatabaseLogger(os.path.join(db_dir, "scan_logs.db"))
+        for i in range(5):
+            with open(os.path.join(self.test_folder, f"clean_{i}.txt"), "w") as f:
+                f.write("nothing to see here")
+        try:
+            monitor.start()
+            deadline = time.time() + 30
+            while time.time() < deadline:
+                scanned = [r for r in monitor.report.get_results() if r.startswith("Scanned")]
+                if len(scanned) == 6:
+                    break
+                time.sleep(0.05)
+        finally:
+            self.assertTrue(monitor.stop(timeout=30))
+            shutil.rmtree(db_dir)
+        self.assertEqual(len(scanned), 6)
+        self.assertTrue(any("suspicious.bat | Score: 3" in r for r in scanned))
+
+    def test_thread_pool_scans_all_files(self):
+        self._run_pool("thread")
+
+    def test_process_pool_scans_all_files(self):
+        self._run_pool("process")
+
+    def _stopped_monitor(self, drain, **kwargs):
+        db_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, db_dir)
+        monitor = FileMonitor(self.test_folder, **kwargs)
+        monitor.db_logger = DatabaseLogger(os.path.join(db_dir, "scan_logs.db"))
+        handle_result = monitor.handle_result
+
+        def slow_handle_result(*args):
+            time.sleep(0.05)
+            handle_result(*args)
+
+        monitor.handle_result = slow_handle_result
+        monitor.start()
+        monitor.queue.join()  # initial file scanned and logged
+        os.makedirs("pending", exist_ok=True)  # outside the watched folder
+        for i in range(20):
+            path = os.path.join("pending", f"pending_{i}.txt")
+            with open(path, "w") as f:
+                f.write(f"pending file {i}")
+            monitor.queue.put(path)
+        self.assertTrue(monitor.stop(timeout=30, drain=drain))
+        self.assertEqual(monitor.queue.unfinished_tasks, 0)
+        return [r for r in monitor.report.get_results() if r.startswith("Scanned")]
+
+    def test_stop_drains_pending_files(self):
+        self.assertEqual(len(self._stopped_monitor(drain=True)), 21)
+
+    def test_stop_without_drain_discards_pending_files(self):
+        self.assertLess(len(self._stopped_monitor(drain=False)), 21)
+
+    def test_stop_drains_pool(self):
+        scanned = self._stopped_monitor(drain=True, workers=2, pool="thread")
+        self.assertEqual(len(scanned), 21)
+
+
+    def test_cache_skips_unchanged_and_duplicate_files(self):
+        monitor = FileMonitor(self.test_folder)
+        scanner = monitor.scanner
+        first = scanner.scan(self.test_file, monitor.cache)
+        self.assertIsNone(first.cached)
+        monitor.handle_result(self.test_file, first)
+
+        self.assertEqual(scanner.scan(self.test_file, monitor.cache).cached, "file")
+
+        copy = os.path.join(self.test_folder, "copy.txt")
+        shutil.copy(self.test_file, copy)
+        duplicate = scanner.scan(copy, monitor.cache)
+        self.assertEqual(duplicate.cached, "content")
+        # the verdict is re-evaluated for the new name: no bad extension
+        self.assertEqual(duplicate.score, first.score - 1)
+        self.assertEqual(duplicate.found, ["powershell"])
+
+        scanner.suspicious_strings.append("suspicious")
+        self.assertIsNone(scanner.scan(self.test_file, monitor.cache).cached)
+        monitor.stop()
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,67 @@
+import random
+import unittest
+
+from safescan.matcher import PatternMatcher
+
+
+def naive_counts(patterns, data):
+    counts = {}
+    for p in patterns:
+        raw = p.encode()
+        hits = [i for i in range(len(data)) if data.startswith(raw, i)]
+        if hits:
+            counts[p] = (hits[0], len(hits))
+    return counts
+
+
+class TestPatternMatcher(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(7)
+        self.patterns = ["exec", "exe", "xec", "cmd.exe", "eval", "powershell", "he", "she", "hers"]
+        alphabet = b"abcdehlmorsvwx.xe"
+        self.data = bytes(rng.choice(alphabet) for _ in range(20000)) + b"ushers cmd.exe"
+
+    def assertCounts(self, matches, expected):
+        self.assertEqual({m.label: (m.offset, m.count) for m in matches}, expected)
+
+    def test_automaton_and_find_agree_with_naive(self):
+        expected = naive_counts(self.patterns, self.data)
+        for automaton in (True, False):
+            matcher = PatternMatcher(self.patterns, automaton=automaton)
+            self.assertCounts(matcher.search(self.data), expected)
+
+    def test_matches_across_chunk_boundaries(self):
+        expected = naive_counts(self.patterns, self.data)
+        for automaton in (True, False):
+            stream = PatternMatcher(self.patterns, automaton=automaton).stream()
+            for i in range(0, len(self.data), 7):
+                stream.feed(self.data[i:i + 7])
+            self.assertCounts(stream.matches(), expected)
+
+    def test_windows_of_a_buffer_are_matched_in_place(self):
+        data = self.data.upper()
+        expected = naive_counts(self.patterns, self.data)
+        for automaton in (True, False):
+            stream = PatternMatcher(self.patterns, case_insensitive=True, automaton=automaton).stream()
+            for i in range(0, len(data), 7):
+                stream.feed(data, i, min(i + 7, len(data)))
+            self.assertEqual(stream.position, len(data))
+            self.assertCounts(stream.matches(), expected)
+
+    def test_case_insensitive_and_utf16(self):
+        data = b"run PowerShell now" + "CMD.EXE".encode("utf-16-le")
+        matcher = PatternMatcher(["powershell", "cmd.exe"], case_insensitive=True, utf16=True)
+        self.assertEqual(matcher.found(data), ["powershell", "cmd.exe"])
+        self.assertEqual(PatternMatcher(["powershell", "cmd.exe"]).found(data), [])
+
+    def test_large_rule_set_uses_automaton(self):
+        iocs = [f"ioc-{i:05d}" for i in range(2000)]
+        matcher = PatternMatcher(iocs)
+        self.assertTrue(matcher.use_automaton)
+        matches = matcher.search(b"xx ioc-01234 yy ioc-01234 ioc-00007")
+        self.assertCounts(matches, {"ioc-00007": (26, 1), "ioc-01234": (3, 2)})
+
+
+if __name__ == "__main__":
+    unittest.main()
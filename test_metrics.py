@@ -0,0 +1,110 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import urllib.request
+
+from safescan.metrics import Metrics, MetricsServer
+from safescan.monitor import FileMonitor
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_threads_count_into_their_own_shards(self):
+        metrics = Metrics()
+
+        def work():
+            for _ in range(10000):
+                metrics.incr("files_scanned")
+                metrics.observe("read", 0.001)
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot["counters"]["files_scanned"], 40000)
+        self.assertEqual(snapshot["stages"]["read"]["count"], 40000)
+        self.assertAlmostEqual(snapshot["stages"]["read"]["seconds"], 40.0)
+        self.assertAlmostEqual(snapshot["stages"]["read"]["avg_ms"], 1.0)
+        self.assertEqual(snapshot["stages"]["scan"]["count"], 0)
+
+    def test_timer_and_gauges(self):
+        metrics = Metrics()
+        with metrics.timer("db_write"):
+            time.sleep(0.01)
+        metrics.gauge("queue_depth", lambda: 7)
+        metrics.gauge("broken", lambda: 1 / 0)
+        snapshot = metrics.snapshot()
+        self.assertGreaterEqual(snapshot["stages"]["db_write"]["max_ms"], 10)
+        self.assertEqual(snapshot["gauges"], {"queue_depth": 7, "broken": None})
+
+    def test_prometheus_text_and_endpoint(self):
+        metrics = Metrics()
+        metrics.incr("errors", 2)
+        metrics.observe("quarantine", 0.5)
+        metrics.gauge("queue_depth", lambda: 3)
+        server = MetricsServer(metrics, port=0)
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics", timeout=10) as response:
+                self.assertTrue(response.headers["Content-Type"].startswith("text/plain"))
+                text = response.read().decode()
+        finally:
+            server.close()
+        self.assertIn("# TYPE safescan_errors_total counter\nsafescan_errors_total 2\n", text)
+        self.assertIn('safescan_stage_seconds_sum{stage="quarantine"} 0.500000\n', text)
+        self.assertIn('safescan_stage_seconds_count{stage="quarantine"} 1\n', text)
+        self.assertIn("safescan_queue_depth 3\n", text)
+
+
+class TestFileMonitorMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.workdir = tempfile.mkdtemp()
+        os.chdir(self.workdir)
+        os.makedirs("watch")
+        with open(os.path.join("watch", "dropper.bat"), "w") as f:
+            f.write("powershell -enc AAAA")
+        with open(os.path.join("watch", "notes.txt"), "w") as f:
+            f.write("nothing to see here")
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.workdir)
+
+    def test_stages_and_counters_are_recorded(self):
+        monitor = FileMonitor("watch", cache=False, metrics_port=0)
+        monitor.scanner.quarantine_score = 3  # extension and strings flag dropper.bat
+        monitor.start()
+        try:
+            deadline = time.time() + 30
+            while monitor.metrics_snapshot()["counters"]["quarantined"] < 1 and time.time() < deadline:
+                time.sleep(0.05)
+            port = monitor.metrics_server.port
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=10) as response:
+                text = response.read().decode()
+        finally:
+            self.assertTrue(monitor.stop())
+        self.assertIsNone(monitor.metrics_server)
+        self.assertIn("safescan_files_scanned_total 2\n", text)
+
+        snapshot = monitor.metrics_snapshot()
+        counters, stages = snapshot["counters"], snapshot["stages"]
+        self.assertEqual(counters["files_queued"], 2)
+        self.assertEqual(counters["files_scanned"], 2)
+        self.assertEqual(counters["files_flagged"], 1)
+        self.assertEqual(counters["quarantined"], 1)
+        self.assertEqual(counters["db_rows"], 2)
+        self.assertEqual(counters["bytes_scanned"], 39)
+        for stage in ("queue_wait", "scan", "read", "entropy", "strings", "hash", "quarantine"):
+            self.assertGreaterEqual(stages[stage]["count"], 1, stage)
+        self.assertGreaterEqual(stages["db_write"]["count"], 1)
+        self.assertEqual(snapshot["gauges"]["queue_depth"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
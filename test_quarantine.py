@@ -0,0 +1,92 @@
+import errno
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from safescan import quarantine
+from safescan.cache import hash_file
+from safescan.quarantine import Quarantine
+
+
+class TestQuarantine(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.messages = []
+        self.quarantine = Quarantine(os.path.join(self.tmp, "quarantine"), log=self.messages.append)
+
+    def tearDown(self):
+        self.quarantine.close(timeout=10)
+        shutil.rmtree(self.tmp)
+
+    def make_file(self, name, data=b"powershell -enc AAAA"):
+        path = os.path.join(self.tmp, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def sidecar(self, digest):
+        with open(os.path.join(self.quarantine.directory, digest + ".json"), encoding="utf-8") as f:
+            return json.load(f)
+
+    def test_stores_by_digest_with_sidecar(self):
+        first = self.make_file("a.bat")
+        second = self.make_file("b.js")
+        digest = hash_file(first)
+        self.quarantine.submit(first, ["Bad file extension"], 5)
+        self.quarantine.submit(second, ["Suspicious strings: powershell"], 4)
+        self.assertTrue(self.quarantine.flush(timeout=10))
+
+        self.assertFalse(os.path.exists(first) or os.path.exists(second))
+        self.assertEqual(sorted(os.listdir(self.quarantine.directory)), [digest, digest + ".json"])
+        metadata = self.sidecar(digest)
+        self.assertEqual(metadata["size"], 20)
+        self.assertEqual([s["path"] for s in metadata["sources"]], [first, second])
+        self.assertEqual(metadata["sources"][0]["reasons"], ["Bad file extension"])
+        self.assertEqual(metadata["sources"][1]["score"], 4)
+        self.assertEqual(self.messages, [f"Quarantined {first} as {digest}", f"Quarantined {second} as {digest}"])
+
+    def test_cross_device_move_copies_then_unlinks(self):
+        path = self.make_file("payload.exe", os.urandom(3 * 1024 * 1024))
+        digest = hash_file(path)
+        with patch.object(quarantine.os, "rename", side_effect=OSError(errno.EXDEV, "Invalid cross-device link")):
+            self.quarantine.submit(path, ["High entropy: 8.00"])
+            self.assertTrue(self.quarantine.flush(timeout=10))
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(hash_file(os.path.join(self.quarantine.directory, digest)), digest)
+        self.assertEqual(self.quarantine.failed_count, 0)
+
+    def test_failed_moves_are_retried_together(self):
+        paths = [self.make_file(f"locked{i}.bat", bytes([i]) * 10) for i in range(3)]
+        with patch.object(quarantine.os, "rename", side_effect=PermissionError(13, "Permission denied")):
+            for path in paths:
+                self.quarantine.submit(path, ["Bad file extension"])
+            self.assertTrue(self.quarantine.flush(timeout=10))
+        self.assertEqual(self.quarantine.failed_count, 3)
+        self.assertTrue(all(os.path.exists(path) for path in paths))
+
+        os.remove(paths[0])
+        self.quarantine.retry_failed()
+        self.assertTrue(self.quarantine.flush(timeout=10))
+        self.assertEqual(self.quarantine.failed_count, 0)
+        self.assertFalse(any(os.path.exists(path) for path in paths))
+        self.assertIn(f"Not quarantining {paths[0]}: file no longer exists", self.messages)
+        self.assertEqual(sum(m.startswith("Quarantined") for m in self.messages), 2)
+
+    def test_gives_up_after_max_attempts(self):
+        self.quarantine.max_attempts = 2
+        path = self.make_file("stuck.bat")
+        with patch.object(quarantine.os, "rename", side_effect=PermissionError(13, "Permission denied")):
+            self.quarantine.submit(path, [])
+            self.quarantine.retry_failed()
+            self.assertTrue(self.quarantine.flush(timeout=10))
+        self.assertEqual(self.quarantine.failed_count, 0)
+        self.assertTrue(self.messages[-1].endswith("giving up"))
+        self.assertTrue(os.path.exists(path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from safescan.database import LOG_COLUMNS, DatabaseLogger
+from safescan.retention import Retention, archive_name
+
+DAY = 86400
+
+
+class TestRetention(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.db_name = os.path.join(self.tmp, "scan_logs.db")
+        self.archive_dir = os.path.join(self.tmp, "archive")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def log(self, logger, ages, found=()):
+        for i, age in enumerate(ages):
+            logger.insert_log(f"/in/f{i}.txt", i % 5, 1.0, list(found), [])
+        logger.flush()
+        # backdate the rows, oldest first
+        conn = sqlite3.connect(self.db_name)
+        with conn:
+            now = time.time()
+            for row_id, age in zip(range(1, len(ages) + 1), ages):
+                conn.execute("UPDATE scan_logs SET scanned_at = ? WHERE id = ?", (now - age, row_id))
+        conn.close()
+
+    def test_old_rows_are_archived_by_month(self):
+        retention = Retention(max_age=30 * DAY, archive_dir=self.archive_dir, batch_size=7)
+        logger = DatabaseLogger(self.db_name)
+        ages = [400 * DAY] * 10 + [40 * DAY] * 10 + [DAY] * 5
+        self.log(logger, ages, found=["eval"])
+        self.assertEqual(retention.run(self.db_name), 20)
+        self.assertEqual(logger.count_logs(), 5)
+        self.assertEqual(logger.query(label="eval", min_score=0, limit=100)[-1][0], 21)
+        conn = sqlite3.connect(self.db_name)
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM scan_matches").fetchone()[0], 5)
+        conn.close()
+
+        now = time.time()
+        # batches of 7 rows, split where the month changes
+        self.assertEqual(sorted(os.listdir(self.archive_dir)),
+                         sorted([archive_name(now - 400 * DAY, 1), archive_name(now - 400 * DAY, 8),
+                                 archive_name(now - 40 * DAY, 11), archive_name(now - 40 * DAY, 15)]))
+        rows = list(retention.iter_archive())
+        self.assertEqual([row[0] for row in rows], list(range(1, 21)))
+        self.assertEqual(rows[0][LOG_COLUMNS.index("path")], "/in/f0.txt")
+        self.assertEqual(len(list(retention.iter_archive(start=now - 100 * DAY, min_score=4, label="eval"))), 2)
+        self.assertEqual(retention.archive_files(start=now - 100 * DAY),
+                         [os.path.join(self.archive_dir, archive_name(now - 40 * DAY, first)) for first in (11, 15)])
+        with gzip.open(retention.archive_files()[0], "rt") as f:
+            self.assertEqual(json.loads(f.readline())["matches"], [["eval", None, None]])
+        # the rollups still count archived rows
+        self.assertEqual(logger.rollup("day", by=()), [(25, 0)])
+        logger.close()
+
+    def test_row_limit_and_interrupted_batch(self):
+        retention = Retention(max_rows=4, archive_dir=self.archive_dir)
+        logger = DatabaseLogger(self.db_name)
+        self.log(logger, [DAY] * 10)
+        # a batch archived but not deleted before a crash is archived again
+        rows = logger.iter_logs()
+        retention._archive([next(rows)], {})
+        rows.close()
+        self.assertEqual(retention.run(self.db_name), 6)
+        self.assertEqual([row[0] for row in logger.iter_logs()], [7, 8, 9, 10])
+        self.assertEqual([row[0] for row in retention.iter_archive()], [1, 2, 3, 4, 5, 6])
+        self.assertEqual(retention.run(self.db_name), 0)
+        logger.close()
+
+    def test_crash_while_archiving_leaves_readable_archives(self):
+        retention = Retention(max_rows=0, archive_dir=self.archive_dir, batch_size=4)
+        logger = DatabaseLogger(self.db_name)
+        self.log(logger, [DAY] * 10)
+        # row 1 went into a month file of an earlier version, which then
+        # crashed before deleting it
+        os.makedirs(self.archive_dir)
+        rows = logger.iter_logs()
+        record = dict(zip(LOG_COLUMNS, next(rows)), matches=[])
+        rows.close()
+        with gzip.open(os.path.join(self.archive_dir, archive_name(record["scanned_at"])), "wt") as f:
+            f.write(json.dumps(record) + "\n")
+        # the second batch is cut short by a crash halfway through writing
+        renames = []
+
+        def replace(src, dst):
+            renames.append(dst)
+            if len(renames) > 1:
+                raise OSError("power lost")
+            os.rename(src, dst)
+
+        with patch("safescan.retention.os.replace", side_effect=replace):
+            with self.assertRaises(OSError):
+                retention.run(self.db_name)
+        partial = os.path.join(self.archive_dir, archive_name(record["scanned_at"], 5)) + ".tmp"
+        self.assertEqual(os.listdir(self.archive_dir).count(os.path.basename(partial)), 1)
+        with open(partial, "r+b") as f:
+            f.truncate(os.path.getsize(partial) // 2)
+        # nothing committed so far is unreadable, and the next run finishes the job
+        self.assertEqual([row[0] for row in retention.iter_archive()], [1, 2, 3, 4])
+        self.assertEqual(logger.count_logs(), 6)
+        self.assertEqual(retention.run(self.db_name), 6)
+        self.assertEqual([row[0] for row in retention.iter_archive()], list(range(1, 11)))
+        self.assertFalse(any(name.endswith(".tmp") for name in os.listdir(self.archive_dir)))
+        logger.close()
+
+    def test_background_deletion_and_incremental_vacuum(self):
+        retention = Retention(max_age=DAY, interval=0.05, vacuum_pages=8)
+        logger = DatabaseLogger(self.db_name, batch_size=1000, retention=retention)
+        self.log(logger, [2 * DAY] * 3000, found=["x" * 200])
+        conn = sqlite3.connect(self.db_name)
+        try:
+            self.assertEqual(conn.execute("PRAGMA auto_vacuum").fetchone()[0], 2)
+            deadline = time.time() + 10
+            while time.time() < deadline:
+                if not logger.count_logs() and not conn.execute("PRAGMA freelist_count").fetchone()[0]:
+                    break
+                time.sleep(0.05)
+            self.assertEqual(logger.count_logs(), 0)
+            self.assertEqual(conn.execute("PRAGMA freelist_count").fetchone()[0], 0)
+        finally:
+            conn.close()
+            logger.close()
+        self.assertFalse(os.path.exists(self.archive_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
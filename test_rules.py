@@ -0,0 +1,179 @@
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+from safescan.benchmark import _compressed_bytes, _pe_bytes, _text_bytes
+from safescan.rules import RuleError, RuleSet, tomllib
+from safescan.scanner import HeuristicScanner
+
+
+RULES = {
+    "threshold": 5,
+    "rules": [
+        {"name": "script", "weight": 1, "extensions": [".bat", ".ps1"]},
+        {"name": "mz_header", "weight": 2, "strings": [{"hex": "4D5A9000"}], "reason": "PE header: {found}"},
+        {"name": "encoded_powershell", "weight": 3, "extensions": [".bat", ".ps1"],
+         "regex": "powershell(\\.exe)?\\s+-enc\\s"},
+        {"name": "packed", "weight": 2, "entropy_above": 7.5, "reason": "High entropy: {entropy:.2f}"},
+    ],
+}
+
+
+class TestRules(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.rules_path = self.path("rules.json")
+        self.write_rules(RULES)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def path(self, name):
+        return os.path.join(self.tmp, name)
+
+    def write(self, name, data):
+        with open(self.path(name), "wb") as f:
+            f.write(data)
+        return self.path(name)
+
+    def write_rules(self, spec):
+        with open(self.rules_path, "w") as f:
+            json.dump(spec, f)
+
+    def test_default_rules_score_like_the_builtin_heuristics(self):
+        scanner = HeuristicScanner()
+        result = scanner.scan_file(self.write("DROPPER.BAT", b"cmd.exe /c powershell"))
+        self.assertEqual(result.score, 3)
+        self.assertEqual(result.reasons, ["Bad file extension", "Suspicious strings: powershell, cmd.exe"])
+
+    def test_high_entropy_blocks_spare_executables(self):
+        # a compressed resource among the code of an executable is normal,
+        # the same bytes inside text are not
+        rng = random.Random(0)
+        resource = _compressed_bytes(rng, 8 * 1024)
+        pe = _pe_bytes(rng, 512 * 1024)
+        text = _text_bytes(rng, 512 * 1024)
+        scanner = HeuristicScanner()
+        binary = scanner.scan_file(self.write("tool", pe[:256 * 1024] + resource + pe[256 * 1024:]))
+        self.assertEqual(binary.profile["high_blocks"], 2)
+        self.assertFalse(any(reason.startswith("High-entropy blocks") for reason in binary.reasons))
+        self.assertLess(binary.score, scanner.quarantine_score)
+        notes = scanner.scan_file(self.write("notes.txt", text[:256 * 1024] + resource + text[256 * 1024:]))
+        self.assertTrue(notes.reasons[0].startswith("High-entropy blocks: 2 of 130"))
+
+    def test_rule_file_conditions(self):
+        scanner = HeuristicScanner(rules_path=self.rules_path)
+        self.assertEqual(scanner.quarantine_score, 5)
+        scanner.early_exit = False
+        # the command straddles the boundary between the first two chunks
+        data = b"\x00" * 100 + b"\x4d\x5a\x90\x00" + b"x" * (1024 * 1024 - 110) + b"powershell -enc abc"
+        result = scanner.scan_file(self.write("run.bat", data))
+        self.assertEqual(result.reasons, ["script", "PE header: hex:4d5a9000", "encoded_powershell"])
+        self.assertEqual(result.score, 6)
+        self.assertEqual([(m.label, m.offset) for m in result.matches],
+                         [("hex:4d5a9000", 100), ("re:encoded_powershell", 1024 * 1024 - 6)])
+
+        # the regex only applies to scripts
+        result = scanner.scan_file(self.write("notes.txt", b"powershell -enc abc"))
+        self.assertEqual((result.score, result.reasons), (0, []))
+
+    def test_reading_stops_once_the_threshold_is_reached(self):
+        scanner = HeuristicScanner(rules_path=self.rules_path)
+        data = b"\x4d\x5a\x90\x00 powershell -enc abc " + os.urandom(3 * 1024 * 1024)
+        path = self.write("run.ps1", data)
+        result = scanner.scan_file(path, chunk_size=64 * 1024)
+        self.assertTrue(result.partial)
+        self.assertEqual(result.size, len(data))
+        self.assertIsNone(result.digest)
+        self.assertLess(result.profile["blocks"] * 4096, len(data))
+        # entropy rules are not counted on a partial read
+        self.assertEqual(result.reasons, ["script", "PE header: hex:4d5a9000", "encoded_powershell"])
+
+        scanner.early_exit = False
+        result = scanner.scan_file(path, chunk_size=64 * 1024)
+        self.assertFalse(result.partial)
+        self.assertEqual(result.score, 8)
+        self.assertIsNotNone(result.digest)
+
+    def test_negative_weights_disable_early_exit(self):
+        spec = dict(RULES, rules=RULES["rules"] + [
+            {"name": "signed_build", "weight": -4, "extensions": [".ps1"], "strings": ["# SIG # Begin signature"]}])
+        self.write_rules(spec)
+        scanner = HeuristicScanner(rules_path=self.rules_path)
+        data = b"\x4d\x5a\x90\x00 powershell -enc abc " + b"x" * (2 * 1024 * 1024) + b"# SIG # Begin signature"
+        result = scanner.scan_file(self.write("run.ps1", data), chunk_size=64 * 1024)
+        self.assertFalse(result.partial)
+        self.assertEqual(result.score, 2)
+        self.assertEqual(result.reasons[-1], "signed_build")
+
+        # the allowlist does not apply to .bat files, so those still stop early
+        result = scanner.scan_file(self.write("run.bat", data), chunk_size=64 * 1024)
+        self.assertTrue(result.partial)
+
+    def test_hot_reload(self):
+        scanner = HeuristicScanner(rules_path=self.rules_path)
+        scanner.reload_interval = 0
+        path = self.write("notes.txt", b"call eval(x)")
+        fingerprint = scanner.rules_fingerprint()
+        self.assertEqual(scanner.scan_file(path).score, 0)
+
+        self.write_rules({"threshold": 3, "rules": [{"name": "eval", "weight": 3, "strings": ["eval("]}]})
+        with redirect_stdout(io.StringIO()):
+            self.assertEqual(scanner.scan_file(path).score, 3)
+        self.assertEqual(scanner.quarantine_score, 3)
+        self.assertNotEqual(scanner.rules_fingerprint(), fingerprint)
+
+        # a broken edit is reported and the loaded rules stay in force
+        with open(self.rules_path, "w") as f:
+            f.write('{"rules": [')
+        out = io.StringIO()
+        with redirect_stdout(out):
+            self.assertEqual(scanner.scan_file(path).score, 3)
+            self.assertEqual(scanner.scan_file(path).score, 3)
+        self.assertEqual(out.getvalue().count("Keeping the current rules"), 1)
+
+        # so is an edit that parses but has conditions of the wrong type
+        self.write_rules({"threshold": 5, "rules": [{"name": "evil", "weight": 5, "strings": "evil"},
+                                                    {"name": "ext", "extensions": [1]}]})
+        with redirect_stdout(io.StringIO()):
+            result = scanner.scan_file(self.write("hello.txt", b"hello world"))
+        self.assertEqual((result.score, result.error), (0, None))
+        self.assertEqual(scanner.scan_file(path).score, 3)
+
+    @unittest.skipIf(tomllib is None, "no TOML parser")
+    def test_toml_rule_file(self):
+        path = self.path("rules.toml")
+        with open(path, "w") as f:
+            f.write('threshold = 2\n\n[[rules]]\nname = "eval"\nweight = 2\nstrings = ["eval"]\n')
+        rules = RuleSet.load(path)
+        self.assertEqual(rules.threshold, 2)
+        self.assertEqual(rules.matcher.labels, ["eval"])
+
+    def test_invalid_rules_are_rejected(self):
+        for spec in ({"rules": [{"name": "x"}]},
+                     {"rules": [{"name": "x", "regex": "("}]},
+                     {"rules": [{"name": "x", "strings": ["a"], "colour": "red"}]},
+                     {"rules": [{"name": "x", "strings": ["a"], "reason": "{missing}"}]},
+                     {"rules": [{"name": "x", "strings": ["a"]}, {"name": "x", "strings": ["b"]}]},
+                     # a scalar would be read one character at a time
+                     {"rules": [{"name": "x", "strings": "evil"}]},
+                     {"rules": [{"name": "x", "extensions": ".exe"}]},
+                     {"rules": [{"name": "x", "extensions": [1]}]},
+                     {"rules": [{"name": "x", "strings": 5}]},
+                     {"rules": [{"name": "x", "regex": ["a"]}]},
+                     {"options": ["utf16"], "rules": [{"name": "x", "strings": ["a"]}]}):
+            with self.assertRaises(RuleError):
+                RuleSet(spec)
+        os.remove(self.rules_path)
+        with self.assertRaises(RuleError):
+            HeuristicScanner(rules_path=self.rules_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
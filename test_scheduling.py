@@ -0,0 +1,164 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from safescan.monitor import FileMonitor
+from safescan.scheduling import Debouncer, ScanQueue
+
+
+def write(path, data, mode="w"):
+    with open(path, mode) as f:
+        f.write(data)
+
+
+class TestDebouncer(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.debouncer = Debouncer(quiet=0.2, coalesce=0.05)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def path(self, name):
+        return os.path.join(self.tmp, name)
+
+    def wait_ready(self, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            released = self.debouncer.ready()
+            if released:
+                return [path for path, _ in released]
+            time.sleep(min(self.debouncer.next_due() or 0.01, 0.05))
+        return []
+
+    def test_file_is_held_until_it_stops_growing(self):
+        path = self.path("upload.bin")
+        write(path, "x")
+        self.debouncer.add(path)
+        for _ in range(5):
+            time.sleep(0.1)
+            write(path, "x", "a")
+            self.assertEqual(self.debouncer.ready(), [])
+        started = time.monotonic()
+        self.assertEqual(self.wait_ready(), [path])
+        self.assertGreaterEqual(time.monotonic() - started, 0.1)
+        self.assertEqual(len(self.debouncer), 0)
+
+    def test_close_events_are_coalesced(self):
+        path = self.path("doc.txt")
+        write(path, "done")
+        for _ in range(3):
+            self.debouncer.add(path, closed=True)
+        self.assertEqual(len(self.debouncer), 1)
+        self.assertEqual(self.wait_ready(timeout=0.15), [path])
+
+    def test_old_files_and_deleted_files(self):
+        old, gone = self.path("old.txt"), self.path("gone.txt")
+        write(old, "old")
+        os.utime(old, (time.time() - 60, time.time() - 60))
+        write(gone, "gone")
+        self.debouncer.add(old)
+        self.debouncer.add(gone)
+        self.assertEqual([path for path, _ in self.debouncer.ready()], [old])
+        os.remove(gone)
+        self.assertEqual(self.wait_ready(timeout=0.5), [])
+        self.assertEqual(len(self.debouncer), 0)
+
+    def test_released_smallest_first(self):
+        paths = [self.path(f"{size}.bin") for size in (300, 1, 20)]
+        for path in paths:
+            write(path, "x" * int(os.path.basename(path).split(".")[0]))
+            self.debouncer.add(path, closed=True)
+        time.sleep(0.1)
+        self.assertEqual([path for path, _ in self.debouncer.ready()], sorted(paths, key=os.path.getsize))
+
+    def test_max_wait(self):
+        self.debouncer.max_wait = 0.3
+        path = self.path("growing.log")
+        write(path, "x")
+        self.debouncer.add(path)
+        released = []
+        deadline = time.monotonic() + 5
+        while not released and time.monotonic() < deadline:
+            write(path, "x", "a")
+            time.sleep(0.05)
+            released = self.debouncer.ready()
+        self.assertEqual([p for p, _ in released], [path])
+
+    def test_checkpoint_passes_once_earlier_files_are_released(self):
+        first, later = self.path("first.txt"), self.path("later.txt")
+        write(first, "x")
+        write(later, "x")
+        self.debouncer.add(first, closed=True)
+        token = self.debouncer.checkpoint()
+        self.debouncer.add(later)
+        self.assertFalse(self.debouncer.passed(token))
+        time.sleep(0.1)
+        self.assertEqual([p for p, _ in self.debouncer.ready()], [first])
+        self.assertTrue(self.debouncer.passed(token))  # later.txt came after the checkpoint
+
+
+class TestScanQueue(unittest.TestCase):
+
+    def test_small_files_first_and_sentinels_last(self):
+        queue = ScanQueue(size_rate=1000)
+        stop = object()
+        queue.put("big", size=10 ** 6)
+        queue.put(stop)
+        queue.put("small", size=10)
+        queue.put("empty", size=0)
+        self.assertEqual(queue.queue, ["empty", "small", "big", stop])
+        self.assertEqual([queue.get() for _ in range(4)], ["empty", "small", "big", stop])
+
+    def test_large_files_are_not_starved(self):
+        queue = ScanQueue(size_rate=1000)
+        queue.put("big", size=50)  # counts as queued 0.05s later
+        time.sleep(0.1)
+        queue.put("small", size=0)
+        self.assertEqual(queue.get(), "big")
+
+
+class TestMonitorSettling(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.workdir = tempfile.mkdtemp()
+        os.chdir(self.workdir)
+        os.makedirs("watch")
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.workdir)
+
+    def test_file_written_in_bursts_is_scanned_once_complete(self):
+        monitor = FileMonitor("watch", cache=False, settle=0.5)
+        monitor.debouncer.coalesce = 0.5
+        sizes = []
+        handle_result = monitor.handle_result
+
+        def record_size(file_path, result):
+            sizes.append(result.size)
+            handle_result(file_path, result)
+
+        monitor.handle_result = record_size
+        monitor.start()
+        try:
+            time.sleep(0.2)
+            path = os.path.join("watch", "upload.txt")
+            for i in range(5):
+                write(path, f"part {i}\n", "a")
+                time.sleep(0.05)
+            deadline = time.time() + 30
+            while not sizes and time.time() < deadline:
+                time.sleep(0.05)
+            time.sleep(1.0)
+        finally:
+            self.assertTrue(monitor.stop(timeout=30))
+        self.assertEqual(sizes, [os.path.getsize(path)])
+
+
+if __name__ == '__main__':
+    unittest.main()
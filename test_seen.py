@@ -0,0 +1,141 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from safescan.monitor import FileMonitor
+from safescan.seen import SeenIndex
+
+
+def write(path, data="data"):
+    with open(path, "w") as f:
+        f.write(data)
+
+
+class TestSeenIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.folder = os.path.join(self.tmp, "watch")
+        os.makedirs(os.path.join(self.folder, "sub"))
+        self.index = SeenIndex(os.path.join(self.tmp, "scan_logs.db"), commit_every=2)
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.tmp)
+
+    def path(self, *parts):
+        return os.path.join(self.folder, *parts)
+
+    def mark(self, path):
+        st = os.stat(path)
+        self.index.mark(path, st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def listing(self):
+        return [os.path.join(root, name) for root, _, names in os.walk(self.folder) for name in names]
+
+    def test_reconcile_returns_only_new_and_changed_files(self):
+        for name in ("kept.txt", "modified.txt", "deleted.txt", "old_name.txt"):
+            write(self.path(name), name)
+            self.mark(self.path(name))
+        self.assertEqual(len(self.index), 4)
+
+        write(self.path("new.txt"))
+        write(self.path("modified.txt"), "changed in place")
+        os.remove(self.path("deleted.txt"))
+        os.rename(self.path("old_name.txt"), self.path("new_name.txt"))
+
+        changed = self.index.reconcile(self.folder, self.listing(), recursive=True)
+        self.assertEqual(sorted(changed), [self.path("modified.txt"), self.path("new.txt")])
+        for path in changed:
+            self.mark(path)
+        self.assertEqual(self.index.reconcile(self.folder, self.listing(), recursive=True), [])
+        self.assertEqual(len(self.index), 4)
+
+    def test_non_recursive_reconcile_keeps_subdirectory_rows(self):
+        write(self.path("sub", "nested.txt"))
+        self.mark(self.path("sub", "nested.txt"))
+        top_level = [p for p in self.listing() if os.path.dirname(p) == self.folder]
+        self.assertEqual(self.index.reconcile(self.folder, top_level, recursive=False), [])
+        self.assertEqual(len(self.index), 1)
+        self.assertFalse(self.index.check(self.path("sub", "nested.txt")))
+
+    def test_check_detects_changes_and_renames(self):
+        write(self.path("a.txt"))
+        self.mark(self.path("a.txt"))
+        self.index.flush()
+        self.assertFalse(self.index.check(self.path("a.txt")))
+
+        os.rename(self.path("a.txt"), self.path("b.txt"))
+        self.assertFalse(self.index.check(self.path("b.txt")))
+        self.assertFalse(self.index.check(self.path("b.txt")))  # the row moved with it
+
+        st = os.stat(self.path("b.txt"))
+        os.utime(self.path("b.txt"), ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+        self.assertTrue(self.index.check(self.path("b.txt")))
+        self.assertFalse(self.index.check(self.path("c.txt")))  # vanished before the check
+
+    def test_check_sees_marks_not_yet_committed(self):
+        self.index.commit_interval = 60
+        write(self.path("a.txt"))
+        self.mark(self.path("a.txt"))  # below commit_every, nothing committed
+        os.rename(self.path("a.txt"), self.path("b.txt"))
+        self.assertFalse(self.index.check(self.path("b.txt")))
+
+    def test_forget_drops_files_and_directories(self):
+        for path in (self.path("a.txt"), self.path("sub", "b.txt"), self.path("sub", "c.txt")):
+            write(path)
+            self.mark(path)
+        self.index.forget([self.path("a.txt"), self.path("sub")])
+        self.assertEqual(len(self.index), 0)
+
+
+class TestMonitorResume(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.workdir = tempfile.mkdtemp()
+        os.chdir(self.workdir)
+        os.makedirs("watch")
+        for i in range(3):
+            write(os.path.join("watch", f"file{i}.txt"), f"contents {i}")
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.workdir)
+
+    def run_monitor(self, expected):
+        # runs a monitor until expected files were scanned, returns how many were queued
+        monitor = FileMonitor("watch", cache=False)
+        monitor.start()
+        deadline = time.time() + 30
+        while monitor.metrics_snapshot()["counters"]["files_scanned"] < expected and time.time() < deadline:
+            time.sleep(0.05)
+        time.sleep(0.2)
+        self.assertTrue(monitor.stop())
+        return monitor.metrics_snapshot()["counters"]["files_queued"]
+
+    def test_restart_scans_only_what_changed(self):
+        self.assertEqual(self.run_monitor(3), 3)
+        self.assertEqual(self.run_monitor(0), 0)
+        write(os.path.join("watch", "file1.txt"), "modified while stopped")
+        os.rename(os.path.join("watch", "file2.txt"), os.path.join("watch", "renamed.txt"))
+        self.assertEqual(self.run_monitor(1), 1)
+
+    def test_rename_while_running_is_not_rescanned(self):
+        monitor = FileMonitor("watch", cache=False)  # the default settle delay
+        monitor.start()
+        try:
+            deadline = time.time() + 30
+            while monitor.metrics_snapshot()["counters"]["files_scanned"] < 3 and time.time() < deadline:
+                time.sleep(0.05)
+            os.rename(os.path.join("watch", "file0.txt"), os.path.join("watch", "moved.txt"))
+            time.sleep(3)
+        finally:
+            self.assertTrue(monitor.stop())
+        self.assertEqual(monitor.metrics_snapshot()["counters"]["files_queued"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
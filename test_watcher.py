@@ -0,0 +1,181 @@
+import errno
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from safescan.watcher import InotifyWatcher, PollingWatcher, create_watcher
+
+
+def write(path, data="data"):
+    with open(path, "w") as f:
+        f.write(data)
+
+
+def collect(watcher, expected, timeout=5):
+    # gathers events until all expected paths were seen or timeout expires
+    found = set()
+    deadline = time.time() + timeout
+    while time.time() < deadline and not expected <= found:
+        found.update(watcher.read_events(timeout=0.1))
+        found.update(watcher.pop_listed())
+    return found
+
+
+class WatcherTests:
+
+    def setUp(self):
+        self.folder = os.path.abspath(tempfile.mkdtemp())
+        os.makedirs(os.path.join(self.folder, "sub"))
+        write(os.path.join(self.folder, "a.txt"))
+        write(os.path.join(self.folder, "sub", "b.txt"))
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_existing_files_recursive(self):
+        watcher = self.make_watcher(recursive=True)
+        try:
+            self.assertEqual(sorted(watcher.existing_files()),
+                             [os.path.join(self.folder, "a.txt"), os.path.join(self.folder, "sub", "b.txt")])
+        finally:
+            watcher.close()
+
+    def test_existing_files_top_level_only(self):
+        watcher = self.make_watcher(recursive=False)
+        try:
+            self.assertEqual(watcher.existing_files(), [os.path.join(self.folder, "a.txt")])
+        finally:
+            watcher.close()
+
+    def test_new_files_in_new_subdirectory(self):
+        watcher = self.make_watcher(recursive=True)
+        try:
+            watcher.existing_files()
+            new_dir = os.path.join(self.folder, "sub", "new")
+            os.makedirs(new_dir)
+            expected = {os.path.join(self.folder, "c.txt"), os.path.join(new_dir, "d.txt")}
+            for path in expected:
+                write(path)
+            self.assertEqual(collect(watcher, expected), expected)
+        finally:
+            watcher.close()
+
+    def test_deleted_and_moved_away_files_are_removed(self):
+        watcher = self.make_watcher(recursive=True)
+        outside = tempfile.mkdtemp(dir=os.path.dirname(self.folder))
+        try:
+            watcher.existing_files()
+            deleted = os.path.join(self.folder, "a.txt")
+            moved = os.path.join(self.folder, "sub", "b.txt")
+            os.remove(deleted)
+            os.rename(moved, os.path.join(outside, "b.txt"))
+            removed = set()
+            deadline = time.time() + 5
+            while time.time() < deadline and not {deleted, moved} <= removed:
+                watcher.read_events(timeout=0.1)
+                removed.update(watcher.pop_removed())
+            self.assertEqual(removed, {deleted, moved})
+            self.assertEqual(watcher.pop_removed(), [])
+        finally:
+            watcher.close()
+            shutil.rmtree(outside)
+
+
+@unittest.skipUnless(sys.platform.startswith("linux"), "inotify is Linux only")
+class TestInotifyWatcher(WatcherTests, unittest.TestCase):
+
+    def make_watcher(self, recursive):
+        return InotifyWatcher(self.folder, recursive)
+
+    def test_moved_in_file_is_reported(self):
+        watcher = self.make_watcher(recursive=False)
+        outside = tempfile.mkdtemp(dir=os.path.dirname(self.folder))
+        try:
+            watcher.existing_files()
+            source = os.path.join(outside, "moved.bin")
+            write(source)
+            target = os.path.join(self.folder, "moved.bin")
+            os.rename(source, target)
+            self.assertEqual(collect(watcher, {target}), {target})
+        finally:
+            watcher.close()
+            shutil.rmtree(outside)
+
+    def test_files_of_moved_in_directory_are_listed(self):
+        watcher = self.make_watcher(recursive=True)
+        outside = tempfile.mkdtemp(dir=os.path.dirname(self.folder))
+        try:
+            watcher.existing_files()
+            write(os.path.join(outside, "c.txt"))
+            target = os.path.join(self.folder, "moved")
+            os.rename(outside, target)
+            listed, events = set(), set()
+            deadline = time.time() + 5
+            while time.time() < deadline and not listed:
+                events.update(watcher.read_events(timeout=0.1))
+                listed.update(watcher.pop_listed())
+            # found by listing the directory, so not reported as closed
+            self.assertEqual(listed, {os.path.join(target, "c.txt")})
+            self.assertEqual(events, set())
+        finally:
+            watcher.close()
+
+    def test_directories_past_the_watch_limit_are_polled(self):
+        watcher = self.make_watcher(recursive=True)
+        watcher.POLL_INTERVAL = 0.05
+        add_watch = watcher._libc.inotify_add_watch
+
+        class Libc:
+            # the root keeps its watch, every further one fails with ENOSPC
+            def inotify_add_watch(self, fd, directory, mask):
+                if os.fsdecode(directory) == watcher.folder:
+                    return add_watch(fd, directory, mask)
+                return -1
+
+        watcher._libc = Libc()
+        sub = os.path.join(self.folder, "sub")
+        try:
+            with patch("safescan.watcher.ctypes.get_errno", return_value=errno.ENOSPC):
+                self.assertIn(os.path.join(sub, "b.txt"), watcher.existing_files())
+            self.assertIn(sub, watcher._unwatched)
+            new = os.path.join(sub, "c.txt")
+            write(new)
+            os.remove(os.path.join(sub, "b.txt"))
+            self.assertEqual(collect(watcher, {new}), {new})
+            self.assertIn(os.path.join(sub, "b.txt"), watcher.pop_removed())
+        finally:
+            watcher.close()
+
+
+class TestPollingWatcher(WatcherTests, unittest.TestCase):
+
+    def make_watcher(self, recursive):
+        return PollingWatcher(self.folder, recursive, interval=0.05)
+
+    def test_modified_and_recreated_files_are_reported(self):
+        watcher = self.make_watcher(recursive=False)
+        watcher.existing_files()
+        path = os.path.join(self.folder, "a.txt")
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+        self.assertEqual(collect(watcher, {path}), {path})
+
+        os.remove(path)
+        time.sleep(0.1)
+        watcher.read_events(timeout=0.1)
+        self.assertNotIn(path, watcher.mtimes)
+
+
+class TestCreateWatcher(unittest.TestCase):
+
+    def test_falls_back_to_polling(self):
+        with patch("safescan.watcher.InotifyWatcher", side_effect=OSError("no inotify")):
+            self.assertIsInstance(create_watcher(tempfile.gettempdir()), PollingWatcher)
+
+
+if __name__ == "__main__":
+    unittest.main()